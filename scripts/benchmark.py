@@ -0,0 +1,216 @@
+"""
+Benchmarks of the study stages on synthetic cohorts (see synthetic_cohort.py).
+
+Every stage is timed (wall and CPU) and memory-profiled (peak traced
+allocation, which includes NumPy buffers, and process peak RSS) at each
+scale (``SCALES``: 10 thousand to 10 million rows by default). Timing and
+memory come from two separate runs, since tracemalloc slows down
+allocation-heavy pandas code. Results are
+written as JSON, together with the git commit and library versions, so runs
+of different versions can be compared with ``compare_results``.
+"""
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import peak_rss_mb
+from synthetic_cohort import write_cohort
+
+SCALES = (10_000, 100_000, 1_000_000, 10_000_000)
+
+EXCLUSIONS = [
+    ('baseline_bp_systolic', "missing BP Systolic data", "Complete BP Systolic data"),
+    ('baseline_wbc', "missing WBC", "Complete WBC"),
+    ('pre_transfusion_hemoglobin', "missing pre transfusion hemoglobin", "Complete pre transfusion hemoglobin"),
+    ('post_transfusion_hemoglobin', "missing post transfusion hemoglobin", "Complete post transfusion hemoglobin"),
+    ('diuretic_type', "missing diuretic type", "Complete diuretic type"),
+]
+
+
+def measure(func, *args, memory=True, setup=None, **kwargs):
+    """
+    Run ``func``; returns (result, wall s, CPU s, peak traced MB). The timed
+    run is followed by a second, memory-profiled run (with ``memory``, else
+    the peak is None); ``setup()`` runs untimed before each run.
+    """
+    if setup is not None:
+        setup()
+    wall, cpu = time.perf_counter(), time.process_time()
+    result = func(*args, **kwargs)
+    wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+    peak = None
+    if memory:
+        if setup is not None:
+            setup()
+        tracemalloc.start()
+        try:
+            func(*args, **kwargs)
+            peak = tracemalloc.get_traced_memory()[1] / 2**20
+        finally:
+            tracemalloc.stop()
+    return result, wall, cpu, peak
+
+
+def _load_csv(path):
+    return pd.read_csv(path, low_memory=False)
+
+
+def _load_snapshot(path):
+    from cohort_loader import load_cohort
+    return load_cohort(path)
+
+
+def _recode(df):
+    from tableone_spec import prepare
+    return prepare(df.copy())
+
+
+def _exclusion_flow(df):
+    from cohort_flow import CohortFlow
+    flow = CohortFlow(df, initial_cohort_label="Initial Patient Cohort")
+    for keep, reason, label in EXCLUSIONS:
+        flow.add_exclusion(keep=keep, exclusion_reason=reason, new_cohort_label=label)
+    return flow.counts()
+
+
+def _tableone(df):
+    from tableone import TableOne
+    from tableone_spec import categorical, columns, groupby, nonnormal, rename
+    return TableOne(df, columns=columns, categorical=categorical, nonnormal=nonnormal,
+                    groupby=groupby, rename=rename, pval=True, missing=False, overall=True).tableone
+
+
+def _streaming_tableone(df):
+    from streaming_tableone import StreamingTableOne
+    from tableone_spec import categorical, columns, groupby, nonnormal, rename
+    return StreamingTableOne(columns, categorical, nonnormal, groupby, rename=rename).update(df).tableone
+
+
+def _key_plots(df, work_dir):
+    from figure_cache import render_panels
+    from key_plots import KEY_COLUMNS, compare_timing, key_panels
+    data = df[KEY_COLUMNS]
+    comparison = compare_timing(data)
+    return render_panels(key_panels(data, comparison), os.path.join(work_dir, 'key_plots.png'),
+                         layout=(2, 3), dpi=100, cache_dir=os.path.join(work_dir, 'figure_cache'),
+                         max_workers=1)
+
+
+def _model_fit(df, work_dir):
+    from sklearn.linear_model import LogisticRegression
+    from model_selection import bin_target
+    from preprocessing import build_features, feature_matrix
+    features = build_features(df, cache_dir=os.path.join(work_dir, 'feature_cache'), use_cache=False)
+    binned = bin_target(features.target.clip(min=0))
+    y = binned[max(binned)]
+    return LogisticRegression(max_iter=1000, class_weight='balanced').fit(feature_matrix(features), y)
+
+
+# Stage name -> (function, input): 'path' is the CSV, 'raw' the loaded frame,
+# 'recoded' the frame after recoding; 'work_dir' is passed where needed
+STAGES = {
+    'load_csv': (_load_csv, 'path'),
+    'load_snapshot': (_load_snapshot, 'path'),
+    'recode': (_recode, 'raw'),
+    'exclusion_flow': (_exclusion_flow, 'raw'),
+    'tableone': (_tableone, 'recoded'),
+    'streaming_tableone': (_streaming_tableone, 'recoded'),
+    'key_plots': (_key_plots, 'raw'),
+    'model_fit': (_model_fit, 'raw'),
+}
+
+# Stage name -> cache folder (under work_dir) removed before every run, so
+# each run does the full work: building the snapshot, rendering every panel
+FRESH_CACHE = {
+    'load_snapshot': '.cohort_cache',
+    'key_plots': 'figure_cache',
+}
+
+
+def _environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        commit = ''
+    return {
+        'commit': commit or None,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def run_benchmarks(scales=SCALES, stages=None, work_dir='.benchmark',
+                   seed=0, skip=None):
+    """
+    Time every stage at every scale; returns the results as a dict.
+
+    ``skip`` maps stage names to the largest scale they are run at (e.g.
+    {'tableone': 1_000_000}).
+    """
+    stages = stages or list(STAGES)
+    skip = skip or {}
+    os.makedirs(work_dir, exist_ok=True)
+    rows = []
+    for n in scales:
+        path = os.path.join(work_dir, f"synthetic_{n}.csv")
+        if not os.path.exists(path):
+            _, wall, cpu, peak = measure(write_cohort, path, n, seed=seed, memory=False)
+            rows.append({'scale': n, 'stage': 'generate', 'wall_s': wall, 'cpu_s': cpu, 'peak_mb': peak})
+
+        inputs = {'path': path}
+        for name in stages:
+            if n > skip.get(name, float('inf')):
+                continue
+            func, source = STAGES[name]
+            if source not in inputs:
+                if source == 'raw':
+                    inputs['raw'] = _load_snapshot(path)
+                elif source == 'recoded':
+                    inputs['recoded'] = _recode(inputs['raw'] if 'raw' in inputs else _load_snapshot(path))
+            args = (inputs[source], work_dir) if name in ('key_plots', 'model_fit') else (inputs[source],)
+            cache_dir = os.path.join(work_dir, FRESH_CACHE[name]) if name in FRESH_CACHE else None
+            setup = (lambda: shutil.rmtree(cache_dir, ignore_errors=True)) if cache_dir else None
+            _, wall, cpu, peak = measure(func, *args, setup=setup)
+            rss = peak_rss_mb()
+            rows.append({'scale': n, 'stage': name, 'wall_s': wall, 'cpu_s': cpu,
+                         'peak_mb': peak, 'process_peak_rss_mb': rss})
+            print(f"  {n:>10,} rows  {name:20s} {wall:8.2f} s  {peak:9.1f} MB")
+    return {'environment': _environment(), 'results': rows}
+
+
+def write_results(results, path):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(results, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def compare_results(baseline_path, current_path, tolerance=0.2):
+    """
+    Stage timings and peak memory of two result files; ``regression`` marks
+    stages more than ``tolerance`` slower or larger than the baseline
+    """
+    frames = []
+    for path in (baseline_path, current_path):
+        with open(path) as f:
+            frames.append(pd.DataFrame(json.load(f)['results']).set_index(['scale', 'stage']))
+    baseline, current = frames
+    table = baseline[['wall_s', 'peak_mb']].join(current[['wall_s', 'peak_mb']], lsuffix='_baseline',
+                                                  rsuffix='_current', how='inner')
+    table['time_ratio'] = table['wall_s_current'] / table['wall_s_baseline']
+    table['memory_ratio'] = table['peak_mb_current'] / table['peak_mb_baseline']
+    table['regression'] = (table['time_ratio'] > 1 + tolerance) | (table['memory_ratio'] > 1 + tolerance)
+    return table
@@ -0,0 +1,148 @@
+"""
+Command-line entry point for the study jobs.
+
+    python cli.py flow      --data transfusion_data.csv --out-dir results/flow [--diagram]
+    python cli.py tableone  --data transfusion_data.csv --out-dir results/tableone [--spec spec.json]
+    python cli.py plots     --data transfusion_data.csv --out-dir results/plots
+    python cli.py profile   --data transfusion_data.csv --out-dir results/profile
+    python cli.py train     --data transfusion_data.csv --out-dir results/train
+    python cli.py score     --model models/transfusion_logreg --data blood_transfusion.csv --output scores.parquet
+
+Each subcommand runs one stage of study_stages.py. Only the standard library
+is imported up front; pandas, scipy, matplotlib, tableone, equiflow and
+sklearn are imported by the subcommand that needs them, so ``--help`` and
+single jobs started from a scheduler do not pay for the rest.
+"""
+import argparse
+import json
+import os
+import sys
+
+DATA_PATH = 'transfusion_data.csv'
+OUTPUT_DIR = 'results'
+
+# EquiFlow diagram settings for ``flow --diagram`` (as in script_equiflow_blood_transfusion.py)
+EF_SETTINGS = dict(categorical=['gender', 'race'], normal=['age', 'sofa_score'], format_cat='%')
+PLOT_SETTINGS = dict(output_file="blood_transfusion_flow", plot_dists=True, smds=True, legend=True,
+                     box_width=3.5, box_height=1.5)
+
+
+def _read_json(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def _load(args, recode=False):
+    import study_stages as stages
+
+    os.makedirs(args.out_dir, exist_ok=True)
+    data = stages.load(args.out_dir, args.data)
+    return stages.recode(args.out_dir, data) if recode else data
+
+
+def flow(args):
+    import study_stages as stages
+
+    exclusions = [tuple(e) for e in _read_json(args.exclusions)] if args.exclusions else stages.EXCLUSIONS
+    counts = stages.exclusion_flow(args.out_dir, _load(args), exclusions, diagram=args.diagram,
+                                   ef_settings=EF_SETTINGS, plot_settings=PLOT_SETTINGS)
+    print(counts.to_string(index=False))
+
+
+def tableone(args):
+    import study_stages as stages
+
+    spec = _read_json(args.spec) if args.spec else None
+    table = stages.table_one(args.out_dir, _load(args, recode=True), formats=args.formats, spec=spec)
+    print(f"Table One: {len(table)} rows -> {', '.join(f'table_one.{ext}' for ext in args.formats)}")
+
+
+def plots(args):
+    import study_stages as stages
+
+    comparison = stages.key_plots(args.out_dir, _load(args), dpi=args.dpi)
+    print(comparison.to_string())
+
+
+def profile(args):
+    import study_stages as stages
+
+    alerts = stages.profile(args.out_dir, _load(args, recode=True), group=args.group)
+    for message in alerts or ["no alerts"]:
+        print(f"  • {message}")
+
+
+def train(args):
+    import study_stages as stages
+
+    summary = stages.train(args.out_dir, _load(args), C=args.C, test_size=args.test_size, seed=args.seed)
+    print(summary.to_string())
+
+
+def score(args):
+    from scoring import Scorer, score_csv, serve
+
+    scorer = Scorer(args.model)
+    if args.serve:
+        import asyncio
+        asyncio.run(serve(scorer, host=args.host, port=args.port))
+    else:
+        n_rows = score_csv(scorer, args.data, args.output, chunksize=args.chunksize)
+        print(f"Scored {n_rows:,} rows with {scorer.info['estimator']} -> {args.output}")
+
+
+def parser():
+    main = argparse.ArgumentParser(prog='cli.py', description="Transfusion timing study jobs")
+    main.add_argument('--trace', help="write stage timings to this file (.jsonl, or .json for a Chrome trace)")
+    commands = main.add_subparsers(dest='command', required=True)
+
+    def command(func, help, data=DATA_PATH, formats="CSV or Parquet"):
+        sub = commands.add_parser(func.__name__, help=help)
+        sub.add_argument('--data', default=data, help=f"input {formats} (default: {data})")
+        sub.add_argument('--out-dir', default=None, help=f"output folder (default: {OUTPUT_DIR}/{func.__name__})")
+        sub.set_defaults(func=func)
+        return sub
+
+    sub = command(flow, "cohort size after every exclusion step")
+    sub.add_argument('--exclusions', help="JSON list of [column, reason, label] exclusion steps")
+    sub.add_argument('--diagram', action='store_true', help="also draw the EquiFlow diagram")
+
+    sub = command(tableone, "Table One by transfusion timing")
+    sub.add_argument('--spec', help="JSON overriding columns, categorical, nonnormal, groupby or rename")
+    sub.add_argument('--formats', nargs='+', default=['csv', 'xlsx', 'tex'],
+                     help="output formats (csv xlsx tex md html png pdf svg)")
+
+    sub = command(plots, "Early vs Late statistics and key-plots figure")
+    sub.add_argument('--dpi', type=int, default=300)
+
+    sub = command(profile, "data profile report (HTML and JSON)")
+    sub.add_argument('--group', default='race_grouped', help="column to break missingness down by")
+
+    sub = command(train, "train and export the transfusion-count model")
+    sub.add_argument('--C', type=float, default=1.0, help="inverse regularization strength")
+    sub.add_argument('--test-size', type=float, default=0.2)
+    sub.add_argument('--seed', type=int, default=42)
+
+    sub = command(score, "score an extract with an exported model", data='blood_transfusion.csv', formats="CSV")
+    sub.add_argument('--model', default='models/transfusion_logreg', help="exported model folder")
+    sub.add_argument('--output', default='transfusion_scores.parquet')
+    sub.add_argument('--chunksize', type=int, default=100_000)
+    sub.add_argument('--serve', action='store_true', help="start the HTTP scoring service instead")
+    sub.add_argument('--host', default='127.0.0.1')
+    sub.add_argument('--port', type=int, default=8080)
+    return main
+
+
+def main(argv=None):
+    args = parser().parse_args(argv)
+    args.out_dir = args.out_dir or os.path.join(OUTPUT_DIR, args.command)
+
+    from instrumentation import configure, stage
+    if args.trace:
+        configure(trace=args.trace)
+    with stage(args.command):
+        args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,248 @@
+"""
+Standardized mean differences (SMDs) between the steps of a cohort flow.
+
+Shows whether the exclusions shift the cohort. Sufficient statistics of
+every step are computed once from the flow's masks as matrix products
+(step masks x values), a block of columns at a time:
+
+- continuous columns: non-missing count, sum and sum of squares per step
+  (values centered on the column mean first, for precision)
+- categorical columns: count per level per step, from one sparse one-hot
+  matrix of all levels
+
+Every pairwise SMD then follows from these small (steps x variables)
+arrays. The formulas are those of EquiFlow's drift table: Hedges-corrected
+(m2 - m1) / sqrt((s1² + s2²) / 2) for continuous columns, the binary or
+multinomial (Mahalanobis on the pooled covariance of the proportions)
+SMD for categorical ones. As in EquiFlow (``missingness=True``, its
+default), level proportions are shares of all rows of a step, so missing
+values lower every level's share without being a level themselves.
+"""
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+BLOCK_COLUMNS = 64
+
+
+def _hedges(n_a, n_b):
+    """
+    Small-sample correction factor 1 - 3 / (4 (n_a + n_b - 2) - 1)
+    """
+    dof = 4 * (n_a + n_b - 2) - 1
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(dof > 0, 1 - 3 / dof, 1.0)
+
+
+def _float_rows(data, columns):
+    """
+    ``columns`` as a (columns x rows) float64 array with NaN for missing (one
+    contiguous row per column, so stacking is a plain copy)
+    """
+    return np.vstack([pd.to_numeric(data[c], errors='coerce').to_numpy(dtype='float64', na_value=np.nan)
+                      for c in columns])
+
+
+class CohortDrift:
+    """
+    Per-step statistics and SMDs of ``continuous`` and ``categorical``
+    columns over the steps of a ``CohortFlow``. With ``missingness=False``
+    level proportions are taken among the non-missing values only.
+    """
+
+    def __init__(self, flow, continuous=(), categorical=(), missingness=True, block_columns=BLOCK_COLUMNS):
+        self.continuous = list(continuous)
+        self.categorical = list(categorical)
+        self.missingness = missingness
+        counts = flow.counts()
+        self.labels = list(counts['cohort'])
+        self.n = counts['n'].to_numpy(dtype=float)
+        masks = np.vstack([flow.mask(i) for i in range(len(flow) + 1)]).astype(np.float64)
+        data = flow.data
+
+        # Continuous: (steps x columns) count, sum and sum of squares
+        shape = (len(masks), len(self.continuous))
+        self.count, self.sum, self.sumsq = np.zeros(shape), np.zeros(shape), np.zeros(shape)
+        self.center = np.zeros(len(self.continuous))
+        for start in range(0, len(self.continuous), block_columns):
+            block = slice(start, start + block_columns)
+            x = _float_rows(data, self.continuous[block])
+            valid = ~np.isnan(x)
+            with np.errstate(invalid='ignore'):
+                center = np.nan_to_num(np.nanmean(x, axis=1))
+            x -= center[:, None]
+            x[~valid] = 0.0
+            self.center[block] = center
+            self.count[:, block] = masks @ valid.T.astype(np.float64)
+            self.sum[:, block] = masks @ x.T
+            self.sumsq[:, block] = masks @ (x * x).T
+
+        # Categorical: (steps x levels) counts from one sparse one-hot matrix
+        self.levels = []
+        rows, cols = [], []
+        for col in self.categorical:
+            cat = pd.Categorical(data[col])
+            present = np.flatnonzero(cat.codes >= 0)
+            rows.append(present)
+            cols.append(cat.codes[present].astype(np.int64) + len(self.levels))
+            self.levels.extend((col, level) for level in cat.categories)
+        rows = np.concatenate(rows) if rows else np.array([], dtype=int)
+        cols = np.concatenate(cols) if cols else np.array([], dtype=int)
+        onehot = sparse.csc_matrix((np.ones(len(rows)), (rows, cols)), shape=(len(data), len(self.levels)))
+        self.level_counts = np.asarray(onehot.T @ masks.T).T
+        self.level_index = pd.MultiIndex.from_tuples(self.levels, names=['variable', 'level'])
+
+    def moments(self):
+        """
+        Mean and SD per step (steps x continuous columns)
+        """
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = self.sum / self.count
+            var = (self.sumsq - self.count * mean ** 2) / (self.count - 1)
+        return mean + self.center, np.sqrt(np.clip(var, 0, None))
+
+    def proportions(self):
+        """
+        Share of every level among all rows (or the non-missing values
+        without ``missingness``), per step (steps x levels)
+        """
+        if self.missingness:
+            totals = np.repeat(self.n[:, None], len(self.levels), axis=1)
+        else:
+            totals = np.zeros_like(self.level_counts)
+            for col in self.categorical:
+                idx = self._level_slice(col)
+                totals[:, idx] = self.level_counts[:, idx].sum(axis=1, keepdims=True)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return self.level_counts / totals
+
+    def _level_slice(self, col):
+        idx = [i for i, (name, _) in enumerate(self.levels) if name == col]
+        return slice(idx[0], idx[-1] + 1) if idx else slice(0, 0)
+
+    def _pairs(self, reference):
+        steps = np.arange(1, len(self.labels))
+        if reference == 'previous':
+            return steps - 1, steps
+        if reference == 'initial':
+            return np.zeros_like(steps), steps
+        if reference == 'all':
+            return np.triu_indices(len(self.labels), k=1)
+        raise ValueError(f"Unknown reference '{reference}' (use 'previous', 'initial' or 'all')")
+
+    def smd(self, reference='previous'):
+        """
+        SMD of every variable for every pair of steps: each step against the
+        'previous' step or the 'initial' cohort, or 'all' pairs. Returns an
+        array (variables x pairs) and the (a, b) step pairs.
+        """
+        a, b = self._pairs(reference)
+        n_a, n_b = self.n[a], self.n[b]
+
+        mean, sd = self.moments()
+        with np.errstate(invalid='ignore', divide='ignore'):
+            denom = np.sqrt((sd[a] ** 2 + sd[b] ** 2) / 2)
+            cont = (mean[b] - mean[a]) / denom
+        cont = np.where(denom > 0, cont, np.nan) * _hedges(n_a, n_b)[:, None]
+
+        p = self.proportions()
+        cats = []
+        for col in self.categorical:
+            idx = self._level_slice(col)
+            cats.append(self._categorical_smd(p[a, idx], p[b, idx], self.level_counts[a, idx].sum(axis=1),
+                                              self.level_counts[b, idx].sum(axis=1)))
+        values = np.column_stack([cont] + cats) if cats else cont
+        return values.T, list(zip(a, b))
+
+    @staticmethod
+    def _categorical_smd(p_a, p_b, n_a, n_b):
+        """
+        Binary or multinomial SMD for a batch of step pairs (pairs x levels)
+        """
+        n_levels = p_a.shape[1]
+        valid = (n_a > 0) & (n_b > 0)
+        if n_levels < 2:
+            return np.full(len(p_a), np.nan)
+        if n_levels == 2:
+            pooled = (p_a[:, 0] * (1 - p_a[:, 0]) + p_b[:, 0] * (1 - p_b[:, 0])) / 2
+            with np.errstate(invalid='ignore', divide='ignore'):
+                out = np.abs(p_a[:, 0] - p_b[:, 0]) / np.sqrt(pooled)
+            out = np.where(pooled > 0, out, np.nan) * _hedges(n_a, n_b)
+        else:
+            def cov(p):
+                c = -p[:, :, None] * p[:, None, :]
+                c[:, np.arange(n_levels), np.arange(n_levels)] = p * (1 - p)
+                return c
+            pooled = (cov(np.nan_to_num(p_a)) + cov(np.nan_to_num(p_b))) / 2
+            diff = np.nan_to_num(p_b - p_a)[:, :, None]
+            sq = (diff.transpose(0, 2, 1) @ np.linalg.pinv(pooled) @ diff)[:, 0, 0]
+            out = np.sqrt(np.clip(sq, 0, None))
+        return np.where(valid, out, np.nan)
+
+    def matrix(self, reference='previous'):
+        """
+        SMDs as a (variables x steps) DataFrame, like EquiFlow's drift table
+        """
+        values, pairs = self.smd(reference)
+        columns = [f"{self.labels[a]} → {self.labels[b]}" if reference == 'all' else self.labels[b]
+                   for a, b in pairs]
+        return pd.DataFrame(values, index=self.continuous + self.categorical, columns=columns)
+
+    def pairwise(self):
+        """
+        SMD of every variable between every pair of steps (long format)
+        """
+        values, pairs = self.smd('all')
+        a, b = np.array(pairs).T
+        kinds = ['continuous'] * len(self.continuous) + ['categorical'] * len(self.categorical)
+        return pd.DataFrame({
+            'variable': np.repeat(self.continuous + self.categorical, len(pairs)),
+            'type': np.repeat(kinds, len(pairs)),
+            'step_a': np.tile(a, values.shape[0]),
+            'step_b': np.tile(b, values.shape[0]),
+            'smd': values.ravel(),
+        })
+
+    def proportion_deltas(self, reference='previous'):
+        """
+        Change in the percentage of every categorical level between steps,
+        as a ((variable, level) x steps) DataFrame
+        """
+        a, b = self._pairs(reference)
+        p = self.proportions() * 100
+        columns = [f"{self.labels[i]} → {self.labels[j]}" if reference == 'all' else self.labels[j]
+                   for i, j in zip(a, b)]
+        return pd.DataFrame((p[b] - p[a]).T, index=self.level_index, columns=columns)
+
+    def heatmap(self, path, reference='previous', threshold=0.1, rename=None, dpi=150):
+        """
+        Heatmap of |SMD| (variables x steps); cells above ``threshold`` are boxed
+        """
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
+
+        table = self.matrix(reference).abs()
+        rename = rename or {}
+        fig, ax = plt.subplots(figsize=(1.2 * table.shape[1] + 4, 0.25 * table.shape[0] + 2))
+        vmax = max(0.2, np.nanmax(table.to_numpy()) if table.size else 0)
+        im = ax.imshow(table.to_numpy(dtype=float), aspect='auto', cmap='Reds', vmin=0, vmax=vmax)
+        ax.set_xticks(range(table.shape[1]))
+        ax.set_xticklabels(table.columns, rotation=45, ha='right', fontsize=8)
+        ax.set_yticks(range(table.shape[0]))
+        ax.set_yticklabels([rename.get(v, v) for v in table.index], fontsize=8)
+        rows, cols = np.nonzero(table.to_numpy(dtype=float) > threshold)
+        ax.scatter(cols, rows, marker='s', s=(72 * 0.25 * 0.9) ** 2, facecolors='none',
+                   edgecolors='black', linewidths=1.2)
+        if table.size <= 400:
+            for (i, j), value in np.ndenumerate(table.to_numpy(dtype=float)):
+                if not np.isnan(value):
+                    ax.text(j, i, f"{value:.2f}", ha='center', va='center', fontsize=7)
+        fig.colorbar(im, ax=ax, label='|SMD|')
+        vs = 'previous step' if reference == 'previous' else 'initial cohort'
+        ax.set_title(f"Standardized mean differences vs {vs} (boxed: > {threshold:g})",
+                     fontsize=11, fontweight='bold')
+        fig.tight_layout()
+        fig.savefig(path, dpi=dpi, bbox_inches='tight')
+        plt.close(fig)
+        return path
@@ -0,0 +1,131 @@
+"""
+Mask-based exclusion cascade for the cohort flow diagram.
+
+The flow keeps one base frame and one boolean mask per exclusion step. Step
+counts come from a cumulative AND over the stacked masks, and a step's frame
+is only materialized when it is requested (for distributions or SMDs).
+Adding or removing a step only recomputes the cumulative masks after it.
+"""
+import numpy as np
+import pandas as pd
+
+
+class CohortFlow:
+    """
+    Exclusion cascade over a single base cohort.
+    """
+
+    def __init__(self, data, initial_cohort_label="Initial Cohort"):
+        self.data = data
+        self.initial_cohort_label = initial_cohort_label
+        self._steps = []
+        # Cumulative masks for the first len(self._cumulative) steps
+        self._cumulative = []
+        self._frames = {}
+
+    def __len__(self):
+        return len(self._steps)
+
+    def _as_mask(self, keep):
+        """
+        Boolean mask over the base frame. A column name keeps the rows where
+        that column is not missing.
+        """
+        if isinstance(keep, str):
+            return self.data[keep].notna().to_numpy()
+        if isinstance(keep, pd.Series):
+            keep = keep.reindex(self.data.index, fill_value=False)
+        mask = np.asarray(keep, dtype=bool)
+        if mask.shape != (len(self.data),):
+            raise ValueError(f"Mask has shape {mask.shape}, expected ({len(self.data)},)")
+        return mask
+
+    def _invalidate(self, index):
+        """
+        Forget cumulative masks and frames after the first ``index`` steps
+        """
+        del self._cumulative[index:]
+        self._frames = {i: df for i, df in self._frames.items() if i <= index}
+
+    def add_exclusion(self, keep, exclusion_reason=None, new_cohort_label=None, position=None):
+        """
+        Add an exclusion step keeping the rows where ``keep`` is True.
+
+        ``keep`` is a boolean mask aligned with the base frame or a column
+        name (rows with missing values are excluded). ``position`` inserts
+        the step as step number ``position`` (1-based) instead of appending it.
+        """
+        number = len(self._steps) + 1 if position is None else position
+        self._steps.insert(number - 1, {
+            'mask': self._as_mask(keep),
+            'exclusion_reason': exclusion_reason or f"Exclusion {number}",
+            'new_cohort_label': new_cohort_label or f"Cohort {number}",
+        })
+        self._invalidate(number - 1)
+        return self
+
+    def remove_exclusion(self, step):
+        """
+        Remove an exclusion step, by step number (1-based) or by its new
+        cohort label
+        """
+        if isinstance(step, str):
+            labels = [s['new_cohort_label'] for s in self._steps]
+            step = labels.index(step) + 1
+        del self._steps[step - 1]
+        self._invalidate(step - 1)
+        return self
+
+    def _update_cumulative(self):
+        start = len(self._cumulative)
+        if start == len(self._steps):
+            return
+        previous = self._cumulative[-1] if start else np.ones(len(self.data), dtype=bool)
+        stacked = np.vstack([previous] + [s['mask'] for s in self._steps[start:]])
+        cumulative = np.logical_and.accumulate(stacked, axis=0)
+        self._cumulative.extend(cumulative[1:])
+
+    def mask(self, step):
+        """
+        Rows remaining after ``step`` exclusions (0 is the initial cohort)
+        """
+        if step == 0:
+            return np.ones(len(self.data), dtype=bool)
+        self._update_cumulative()
+        return self._cumulative[step - 1]
+
+    def counts(self):
+        """
+        Cohort size and number excluded at every step
+        """
+        self._update_cumulative()
+        n = np.array([len(self.data)] + [int(m.sum()) for m in self._cumulative])
+        return pd.DataFrame({
+            'cohort': [self.initial_cohort_label] + [s['new_cohort_label'] for s in self._steps],
+            'exclusion_reason': [''] + [s['exclusion_reason'] for s in self._steps],
+            'n': n,
+            'excluded': np.concatenate([[0], n[:-1] - n[1:]]),
+        })
+
+    def frame(self, step):
+        """
+        Materialized cohort after ``step`` exclusions (cached)
+        """
+        if step not in self._frames:
+            self._frames[step] = self.data if step == 0 else self.data[self.mask(step)]
+        return self._frames[step]
+
+    def frames(self):
+        return [self.frame(i) for i in range(len(self._steps) + 1)]
+
+    def to_equiflow(self, **kwargs):
+        """
+        Build an EquiFlow object for the diagram from the materialized steps
+        """
+        from equiflow import EquiFlow
+
+        ef = EquiFlow(dfs=self.frames(), initial_cohort_label=self.initial_cohort_label, **kwargs)
+        for i, step in enumerate(self._steps, start=1):
+            ef.exclusion_labels[i] = step['exclusion_reason']
+            ef.new_cohort_labels[i] = step['new_cohort_label']
+        return ef
@@ -0,0 +1,185 @@
+"""
+Shared loader for the transfusion cohort extracts.
+
+The first time an extract is read, the CSV is parsed once and stored as a
+Parquet snapshot in a cache folder next to it. The snapshot name contains the
+hash of the source file, so a new extract gets a new snapshot. Later runs
+memory-map the snapshot and read only the columns a script asks for.
+
+Columns are stored with the compact types of ``schema.SCHEMA`` (categoricals,
+nullable Int8 flags, float32 labs); the schema hash is part of the snapshot
+name. Extracts larger than ``CHUNKED_SNAPSHOT_BYTES`` are converted a chunk
+of rows at a time, so building the snapshot never holds the whole CSV.
+"""
+import hashlib
+import json
+import os
+import re
+
+import pandas as pd
+
+from schema import SCHEMA, optimize_dtypes, schema_key
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow is optional, fall back to plain CSV parsing
+    pa = pq = None
+
+CACHE_DIR_NAME = ".cohort_cache"
+HASH_INDEX_FILE = "hashes.json"
+CHUNKED_SNAPSHOT_BYTES = 1 << 30
+SNAPSHOT_CHUNK_ROWS = 1_000_000
+
+
+def default_cache_dir(path):
+    """
+    Cache folder used for an extract: ``.cohort_cache`` next to the CSV
+    """
+    return os.path.join(os.path.dirname(os.path.abspath(path)), CACHE_DIR_NAME)
+
+
+def _read_hash_index(cache_dir):
+    index_path = os.path.join(cache_dir, HASH_INDEX_FILE)
+    try:
+        with open(index_path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_hash_index(cache_dir, index):
+    index_path = os.path.join(cache_dir, HASH_INDEX_FILE)
+    tmp_path = f"{index_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(index, f, indent=1)
+    os.replace(tmp_path, index_path)
+
+
+def file_hash(path, cache_dir=None, block_size=1 << 20):
+    """
+    Content hash of a source file.
+
+    The hash is remembered per (size, mtime) in the cache folder, so an
+    unchanged extract is not re-read just to find its snapshot.
+    """
+    cache_dir = cache_dir or default_cache_dir(path)
+    stat = os.stat(path)
+    key = os.path.abspath(path)
+    index = _read_hash_index(cache_dir)
+    entry = index.get(key)
+    if entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+        return entry["hash"]
+
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    content_hash = digest.hexdigest()
+
+    if os.path.isdir(cache_dir):
+        index[key] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "hash": content_hash}
+        _write_hash_index(cache_dir, index)
+    return content_hash
+
+
+def text_dtypes(path, schema=SCHEMA):
+    """
+    ``read_csv`` dtypes reading the categorical columns of ``schema`` as
+    strings (codes such as '0389' would otherwise be parsed as numbers)
+    """
+    header = pd.read_csv(path, nrows=0).columns
+    return {col: str for col, dtype in (schema or {}).items() if dtype == 'category' and col in header}
+
+
+def _write_snapshot_chunked(path, target, schema, chunksize=SNAPSHOT_CHUNK_ROWS):
+    """
+    Convert a large CSV to Parquet one chunk of rows at a time.
+
+    Text columns of the schema are read as strings so every chunk gets the
+    same types; the Arrow schema of the first chunk is used for all chunks
+    (categoricals as dictionaries, which are unified when read back).
+    """
+    writer = None
+    try:
+        for chunk in pd.read_csv(path, chunksize=chunksize, low_memory=False, dtype=text_dtypes(path, schema)):
+            if schema:
+                chunk = optimize_dtypes(chunk, schema)
+            if writer is None:
+                arrow_schema = pa.Schema.from_pandas(chunk, preserve_index=False)
+                # Same dictionary index type for every chunk
+                arrow_schema = pa.schema([
+                    field.with_type(pa.dictionary(pa.int32(), field.type.value_type))
+                    if pa.types.is_dictionary(field.type) else field
+                    for field in arrow_schema
+                ], metadata=arrow_schema.metadata)
+                writer = pq.ParquetWriter(target, arrow_schema)
+            writer.write_table(pa.Table.from_pandas(chunk, schema=arrow_schema, preserve_index=False))
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def snapshot_path(path, cache_dir=None, schema=SCHEMA):
+    """
+    Path of the Parquet snapshot for ``path``, creating it if needed.
+
+    Snapshots of older versions of the same extract are removed.
+    """
+    if pq is None:
+        raise ImportError("pyarrow is required for cohort snapshots")
+
+    cache_dir = cache_dir or default_cache_dir(path)
+    os.makedirs(cache_dir, exist_ok=True)
+    stem = os.path.splitext(os.path.basename(path))[0]
+    content_hash = file_hash(path, cache_dir=cache_dir)
+    suffix = schema_key(schema) if schema else "raw"
+    snapshot = os.path.join(cache_dir, f"{stem}-{content_hash}-{suffix}.parquet")
+    if os.path.exists(snapshot):
+        return snapshot
+
+    tmp_path = f"{snapshot}.{os.getpid()}.tmp"
+    if os.path.getsize(path) > CHUNKED_SNAPSHOT_BYTES:
+        _write_snapshot_chunked(path, tmp_path, schema)
+    else:
+        data = pd.read_csv(path, low_memory=False, dtype=text_dtypes(path, schema))
+        if schema:
+            data = optimize_dtypes(data, schema)
+        data.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, snapshot)
+
+    # Drop snapshots of previous versions of this extract (exact name pattern,
+    # so e.g. blood-2024.csv's snapshots are not taken for blood.csv's)
+    pattern = re.compile(re.escape(stem) + r"-([0-9a-f]{32})-(?:[0-9a-f]{8}|raw)\.parquet")
+    for name in os.listdir(cache_dir):
+        match = pattern.fullmatch(name)
+        if match and match.group(1) != content_hash:
+            os.remove(os.path.join(cache_dir, name))
+    return snapshot
+
+
+def load_cohort(path, columns=None, cache_dir=None, use_cache=True, schema=SCHEMA):
+    """
+    Load a cohort extract, optionally restricted to ``columns``.
+
+    Uses the Parquet snapshot when pyarrow is available, otherwise reads the
+    CSV directly (still only parsing the requested columns). A ``.parquet``
+    extract is read as is, without a snapshot. Columns get the types of
+    ``schema``; pass ``schema=None`` for the raw CSV types.
+    """
+    columns = list(columns) if columns is not None else None
+    if path.lower().endswith('.parquet'):
+        data = pd.read_parquet(path, columns=columns)
+        return optimize_dtypes(data, schema) if schema else data
+    if not use_cache or pq is None:
+        data = pd.read_csv(path, usecols=columns, low_memory=False, dtype=text_dtypes(path, schema))
+        return optimize_dtypes(data, schema) if schema else data
+
+    snapshot = snapshot_path(path, cache_dir=cache_dir, schema=schema)
+    table = pq.read_table(snapshot, columns=columns, memory_map=True)
+    data = table.to_pandas()
+    # Chunked snapshots unify categories in order of appearance
+    for col in data.columns:
+        if isinstance(data[col].dtype, pd.CategoricalDtype) and not data[col].cat.categories.is_monotonic_increasing:
+            data[col] = data[col].cat.reorder_categories(data[col].cat.categories.sort_values())
+    return data
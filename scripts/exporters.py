@@ -0,0 +1,173 @@
+"""
+Multi-format export of report tables (Table One and similar).
+
+A table is first turned into a ``TableDocument``: the table frame plus the
+header row and body as they are tabulated. Every output format is rendered
+from that document:
+
+- csv, xlsx, html: the table frame (as ``TableOne.to_csv`` / ``to_excel``)
+- tex, md: ``tabulate`` (LaTeX and GitHub Markdown) of the body, as
+  ``TableOne.tabulate``
+- png, pdf, svg: the body drawn as a matplotlib table; dates are left out of
+  the PDF/SVG metadata so the same table always gives the same file
+
+The format comes from the file extension. Outputs are written concurrently
+on a process pool, each to a temporary file that is renamed into place. An
+output is skipped when it was already written from the same document and
+settings (content-hash stamps, see figure_cache.is_fresh).
+"""
+import io
+import multiprocessing
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from figure_cache import content_hash, is_fresh, reproducible_metadata, write_stamp
+
+CACHE_DIR = ".export_cache"
+
+# Bump when a renderer changes, so existing outputs are rewritten
+EXPORT_VERSION = 1
+
+TableDocument = namedtuple('TableDocument', ['frame', 'headers', 'body', 'title'])
+
+
+def table_document(table, title=None):
+    """
+    Document of a TableOne, StreamingTableOne or plain DataFrame
+    """
+    frame = getattr(table, 'tableone', table)
+    if isinstance(frame.columns, pd.MultiIndex):
+        # TableOne layout: variable names only on the first row of each variable
+        headers = list(frame.columns.levels[1])
+        body = frame.reset_index().set_index('level_0')
+        body.index = body.index.where(~body.index.duplicated(), '')
+        body = body.rename_axis(None).rename(columns={'level_1': ''})
+    elif isinstance(frame.index, pd.MultiIndex):
+        # StreamingTableOne layout: one "variable, level" label per row
+        headers = [''] + list(frame.columns)
+        body = [[f"{var}, {level}" if level else var] + list(values)
+                for (var, level), values in zip(frame.index, frame.values)]
+    else:
+        headers = [frame.index.name or ''] + list(frame.columns)
+        body = [[index] + list(values) for index, values in zip(frame.index, frame.values)]
+    return TableDocument(frame, headers, body, title)
+
+
+def _tabulate(document, tablefmt):
+    from tabulate import tabulate
+    return tabulate(document.body, headers=document.headers, tablefmt=tablefmt)
+
+
+def _body_rows(document):
+    if isinstance(document.body, pd.DataFrame):
+        headers = [''] + [c[-1] if isinstance(c, tuple) else c for c in document.body.columns]
+        rows = [[index] + list(values) for index, values in zip(document.body.index, document.body.values)]
+        return headers, rows
+    return list(document.headers), document.body
+
+
+def _render_figure(document, fmt, dpi=200):
+    import matplotlib
+    from matplotlib.figure import Figure
+
+    headers, rows = _body_rows(document)
+    headers = [str(h) for h in headers]
+    cells = [['' if pd.isna(v) else str(v) for v in row] for row in rows]
+    # Column widths from the longest text (measuring every cell is slow)
+    chars = [max([len(headers[j])] + [len(row[j]) for row in cells]) + 2 for j in range(len(headers))]
+    width = 0.065 * sum(chars) + 0.2
+    height = 0.2 * (len(cells) + 1) + (0.4 if document.title else 0.1)
+    fig = Figure(figsize=(width, height))
+    ax = fig.add_axes((0.01, 0.05 / height, 0.98, 1 - (0.4 if document.title else 0.1) / height))
+    ax.set_axis_off()
+    table = ax.table(cellText=cells, colLabels=headers, colWidths=[c / sum(chars) for c in chars],
+                     loc='upper center', cellLoc='left', colLoc='left', bbox=(0, 0, 1, 1))
+    table.auto_set_font_size(False)
+    table.set_fontsize(7)
+    if document.title:
+        ax.set_title(document.title, fontsize=10, fontweight='bold')
+    buffer = io.BytesIO()
+    with matplotlib.rc_context({'svg.hashsalt': 'export'}):
+        fig.savefig(buffer, format=fmt, dpi=dpi, metadata=reproducible_metadata(fmt))
+    return buffer.getvalue()
+
+
+def _render_excel(document):
+    buffer = io.BytesIO()
+    document.frame.to_excel(buffer)
+    return buffer.getvalue()
+
+
+RENDERERS = {
+    'csv': lambda doc: doc.frame.to_csv().encode(),
+    'xlsx': _render_excel,
+    'tex': lambda doc: _tabulate(doc, 'latex').encode(),
+    'md': lambda doc: _tabulate(doc, 'github').encode(),
+    'html': lambda doc: doc.frame.to_html().encode(),
+    'png': lambda doc: _render_figure(doc, 'png'),
+    'pdf': lambda doc: _render_figure(doc, 'pdf'),
+    'svg': lambda doc: _render_figure(doc, 'svg'),
+}
+
+
+def _format(path):
+    fmt = os.path.splitext(path)[1].lstrip('.').lower()
+    if fmt not in RENDERERS:
+        raise ValueError(f"Unsupported export format '{fmt}' ({path}); use one of {sorted(RENDERERS)}")
+    return fmt
+
+
+def _write(document, path):
+    """
+    Render one output and move it into place
+    """
+    data = RENDERERS[_format(path)](document)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    return path
+
+
+def export_tables(jobs, cache_dir=CACHE_DIR, max_workers=None):
+    """
+    Write many (document, outputs) jobs (e.g. one report bundle per site)
+    on one process pool. Returns {path: 'written' or 'unchanged'}.
+    """
+    status, todo = {}, []
+    for document, outputs in jobs:
+        outputs = [outputs] if isinstance(outputs, str) else list(outputs)
+        doc_key = content_hash(document.frame, document.headers, document.title)
+        for path in outputs:
+            key = content_hash(doc_key, _format(path), EXPORT_VERSION)
+            if is_fresh([path], key, cache_dir):
+                status[path] = 'unchanged'
+            else:
+                todo.append((document, path, key))
+
+    if len(todo) == 1 or max_workers == 1:
+        for document, path, _ in todo:
+            _write(document, path)
+    elif todo:
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context('fork' if 'fork' in methods else None)
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=context) as pool:
+            futures = [pool.submit(_write, document, path) for document, path, _ in todo]
+            for future in futures:
+                future.result()
+    for _, path, key in todo:
+        write_stamp([path], key, cache_dir)
+        status[path] = 'written'
+    return status
+
+
+def export_table(table, outputs, title=None, cache_dir=CACHE_DIR, max_workers=None):
+    """
+    Write a table (TableOne, StreamingTableOne, DataFrame or TableDocument)
+    to every path in ``outputs``. Returns {path: 'written' or 'unchanged'}.
+    """
+    document = table if isinstance(table, TableDocument) else table_document(table, title)
+    return export_tables([(document, outputs)], cache_dir=cache_dir, max_workers=max_workers)
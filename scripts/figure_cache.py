@@ -0,0 +1,248 @@
+"""
+Cached, parallel rendering of report figures.
+
+A figure is described as a list of panels. Each panel is a plotting function
+``func(ax, data, **style)`` plus its input data and style parameters. Panels
+are hashed on all three (a function by its code: the sources of its module
+and of the local modules it imports, see ``module_sources``); unchanged
+panels reuse their cached PNG, changed
+panels are rendered in a process pool with the Agg backend, and the cached
+panel images are then composited into the final PNG/PDF.
+"""
+import ast
+import hashlib
+import inspect
+import json
+import multiprocessing
+import os
+import sys
+import textwrap
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+CACHE_DIR = ".figure_cache"
+
+Panel = namedtuple('Panel', ['func', 'data', 'style'])
+
+
+def _imports(tree, top_level=False):
+    """
+    Names of the modules imported in an AST (only its top-level statements
+    with ``top_level``)
+    """
+    names = set()
+    for node in (tree.body if top_level else ast.walk(tree)):
+        if isinstance(node, ast.Import):
+            names.update(alias.name.split('.')[0] for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            names.add(node.module.split('.')[0])
+    return names
+
+
+def _read_source(path):
+    with open(path, encoding='utf-8') as f:
+        return f.read()
+
+
+def module_sources(func):
+    """
+    {module name: source} of ``func``'s module and of the local modules (next
+    to it) that ``func`` uses: imports in its body and at the top of its
+    module, followed through every import of those modules
+    """
+    module_name = getattr(func, '__module__', None) or ''
+    module_file = getattr(sys.modules.get(module_name), '__file__', None)
+    if not module_file or not module_file.endswith('.py'):
+        return {}
+    folder = os.path.dirname(os.path.abspath(module_file))
+    sources = {module_name: _read_source(module_file)}
+    todo = _imports(ast.parse(sources[module_name]), top_level=True)
+    try:
+        todo |= _imports(ast.parse(textwrap.dedent(inspect.getsource(func))))
+    except (OSError, TypeError, SyntaxError):
+        pass
+    while todo:
+        name = todo.pop()
+        path = os.path.join(folder, f"{name}.py")
+        if name in sources or not os.path.isfile(path):
+            continue
+        sources[name] = _read_source(path)
+        todo |= _imports(ast.parse(sources[name]))
+    return dict(sorted(sources.items()))
+
+
+def _callable_version(func):
+    """
+    Version of the package providing ``func``, or for local code its module sources
+    """
+    module_name = getattr(func, '__module__', None) or ''
+    version = getattr(sys.modules.get(module_name.split('.')[0]), '__version__', None)
+    return version if version is not None else module_sources(func)
+
+
+def _update_hash(digest, value):
+    """
+    Feed ``value`` into ``digest`` (arrays by content, containers recursively)
+    """
+    if isinstance(value, pd.DataFrame):
+        digest.update(repr(list(value.columns)).encode())
+        digest.update(pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes())
+    elif isinstance(value, (pd.Series, pd.Index, pd.Categorical)):
+        value = pd.Series(value) if isinstance(value, pd.Categorical) else value
+        digest.update(pd.util.hash_pandas_object(value, index=False).to_numpy().tobytes())
+    elif isinstance(value, np.ndarray):
+        digest.update(f"{value.dtype}{value.shape}".encode())
+        digest.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, dict):
+        for key in sorted(value, key=str):
+            digest.update(repr(key).encode())
+            _update_hash(digest, value[key])
+    elif isinstance(value, (list, tuple)):
+        digest.update(f"{type(value).__name__}{len(value)}".encode())
+        for item in value:
+            _update_hash(digest, item)
+    elif callable(value):
+        func = getattr(value, 'func', value)  # functools.partial
+        digest.update(f"{getattr(func, '__module__', '')}.{getattr(func, '__qualname__', repr(func))}".encode())
+        _update_hash(digest, _callable_version(func))
+        if func is not value:
+            _update_hash(digest, (value.args, value.keywords))
+    else:
+        digest.update(repr(value).encode())
+
+
+def content_hash(*values):
+    """
+    Stable hash of plotting inputs (frames, arrays, dicts, style values)
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for value in values:
+        _update_hash(digest, value)
+    return digest.hexdigest()
+
+
+def _render_panel(panel, figsize, dpi, mpl_style, path):
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    with plt.style.context(mpl_style or 'default'):
+        fig, ax = plt.subplots(figsize=figsize)
+        panel.func(ax, panel.data, **panel.style)
+        fig.tight_layout()
+        tmp_path = f"{path}.{os.getpid()}.tmp.png"
+        fig.savefig(tmp_path, dpi=dpi, bbox_inches='tight')
+        plt.close(fig)
+    os.replace(tmp_path, path)
+    return path
+
+
+def reproducible_metadata(fmt):
+    """
+    Savefig metadata without timestamps, so unchanged figures give identical
+    PDF/SVG files
+    """
+    return {'pdf': {'CreationDate': None}, 'svg': {'Date': None}}.get(fmt.lstrip('.').lower())
+
+
+def _composite(panel_paths, layout, figsize, dpi, outputs):
+    import matplotlib.pyplot as plt
+
+    rows, cols = layout
+    fig = plt.figure(figsize=figsize)
+    for i, path in enumerate(panel_paths):
+        if path is None:
+            continue
+        ax = fig.add_subplot(rows, cols, i + 1)
+        ax.imshow(plt.imread(path))
+        ax.set_axis_off()
+    fig.subplots_adjust(left=0, right=1, bottom=0, top=1, wspace=0.02, hspace=0.02)
+    for output in outputs:
+        ext = os.path.splitext(output)[1]
+        tmp_path = f"{output}.{os.getpid()}.tmp{ext}"
+        fig.savefig(tmp_path, dpi=dpi, metadata=reproducible_metadata(ext))
+        os.replace(tmp_path, output)
+    plt.close(fig)
+
+
+def render_panels(panels, outputs, layout, panel_size=(6, 6), dpi=300,
+                  mpl_style=None, cache_dir=CACHE_DIR, max_workers=None):
+    """
+    Render ``panels`` into a ``layout`` (rows, cols) grid and save ``outputs``.
+
+    ``panels`` is a list of Panel (or None for an empty slot). Plotting
+    functions must be importable module-level functions so worker processes
+    can run them. Returns the number of panels that were re-rendered.
+    """
+    outputs = [outputs] if isinstance(outputs, str) else list(outputs)
+    os.makedirs(cache_dir, exist_ok=True)
+
+    keys = [None if p is None else content_hash(p.func, p.data, p.style, panel_size, dpi, mpl_style)
+            for p in panels]
+    paths = [None if k is None else os.path.join(cache_dir, f"panel-{k}.png") for k in keys]
+    todo = [(p, path) for p, path in zip(panels, paths)
+            if p is not None and not os.path.exists(path)]
+
+    if len(todo) == 1 or max_workers == 1:
+        for panel, path in todo:
+            _render_panel(panel, panel_size, dpi, mpl_style, path)
+    elif todo:
+        # Fork where possible: the report scripts run at module level, and
+        # spawned workers would re-import (and re-run) them
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context('fork' if 'fork' in methods else None)
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=context) as pool:
+            futures = [pool.submit(_render_panel, panel, panel_size, dpi, mpl_style, path)
+                       for panel, path in todo]
+            for future in futures:
+                future.result()
+
+    # Skip the composite when neither the panels nor the layout changed
+    rows, cols = layout
+    figsize = (cols * panel_size[0], rows * panel_size[1])
+    stamp = content_hash(keys, layout, figsize, dpi)
+    if not is_fresh(outputs, stamp, cache_dir):
+        _composite(paths, layout, figsize, dpi, outputs)
+        write_stamp(outputs, stamp, cache_dir)
+    return len(todo)
+
+
+def _stamp_path(outputs, cache_dir):
+    name = content_hash([os.path.abspath(o) for o in outputs])
+    return os.path.join(cache_dir, f"stamp-{name}.json")
+
+
+def is_fresh(outputs, key, cache_dir=CACHE_DIR):
+    """
+    True when all ``outputs`` exist and were last built from ``key``
+    """
+    try:
+        with open(_stamp_path(outputs, cache_dir)) as f:
+            stamp = json.load(f)
+    except (OSError, ValueError):
+        return False
+    return stamp.get('key') == key and all(os.path.exists(o) for o in outputs)
+
+
+def write_stamp(outputs, key, cache_dir=CACHE_DIR):
+    os.makedirs(cache_dir, exist_ok=True)
+    with open(_stamp_path(outputs, cache_dir), 'w') as f:
+        json.dump({'key': key, 'outputs': list(outputs)}, f)
+
+
+def cached_output(outputs, key, build, cache_dir=CACHE_DIR):
+    """
+    Call ``build()`` unless ``outputs`` were already built from ``key``.
+
+    Used for figures rendered by other libraries (e.g. the EquiFlow diagram).
+    Returns True when ``build`` ran.
+    """
+    outputs = [outputs] if isinstance(outputs, str) else list(outputs)
+    if is_fresh(outputs, key, cache_dir):
+        return False
+    build()
+    write_stamp(outputs, key, cache_dir)
+    return True
@@ -0,0 +1,165 @@
+"""
+Batched two-group comparison statistics (e.g. Early vs Late transfusion).
+
+The cohort is split once, and descriptive statistics and tests are computed
+for a whole list of columns at a time:
+
+- continuous columns: Welch t-test, or Mann-Whitney U for ``nonnormal``
+  columns (rank-based U on the stacked value matrix, normal approximation
+  with tie and continuity correction, as in scipy's asymptotic method)
+- categorical columns: chi-square on crosstabs built from category codes
+
+The result is one tidy table indexed by (variable, level).
+"""
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+
+def as_float_matrix(df, columns):
+    """
+    Stack ``columns`` into a (rows x columns) float64 array with NaN for missing
+    """
+    if not columns:
+        return np.empty((len(df), 0))
+    return np.column_stack([
+        pd.to_numeric(df[c], errors='coerce').to_numpy(dtype='float64', na_value=np.nan)
+        for c in columns
+    ])
+
+
+def describe_batch(x, in_group):
+    """
+    n, mean, SD, median, Q1 and Q3 per column of ``x`` for the rows in ``in_group``
+    """
+    sub = x[in_group]
+    n = np.sum(~np.isnan(sub), axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.nansum(sub, axis=0) / n
+        std = np.sqrt(np.nansum((sub - mean) ** 2, axis=0) / (n - 1))
+    if len(sub):
+        q1, median, q3 = np.nanpercentile(sub, [25, 50, 75], axis=0)
+    else:
+        q1 = median = q3 = np.full(x.shape[1], np.nan)
+    return {'n': n, 'mean': mean, 'std': std, 'median': median, 'q1': q1, 'q3': q3}
+
+
+def mannwhitney_batch(x, in_a, in_b):
+    """
+    Two-sided Mann-Whitney U for every column of ``x`` (group a vs group b).
+
+    Returns (U of group a, p-value) arrays, one entry per column.
+    """
+    rows = in_a | in_b
+    x = x[rows]
+    in_a = in_a[rows]
+    valid = ~np.isnan(x)
+
+    ranks = stats.rankdata(x, axis=0, nan_policy='omit')
+    # Tie correction: an element in a tie of size t contributes t^2 - 1
+    tie_size = (stats.rankdata(x, method='max', axis=0, nan_policy='omit')
+                - stats.rankdata(x, method='min', axis=0, nan_policy='omit') + 1)
+    tie_term = np.nansum(tie_size ** 2 - 1, axis=0)
+
+    n_a = np.sum(valid & in_a[:, None], axis=0).astype(float)
+    n = valid.sum(axis=0).astype(float)
+    n_b = n - n_a
+    rank_sum_a = np.nansum(np.where(in_a[:, None], ranks, 0.0), axis=0)
+    u_a = rank_sum_a - n_a * (n_a + 1) / 2
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mu = n_a * n_b / 2
+        sigma = np.sqrt(n_a * n_b / 12 * ((n + 1) - tie_term / (n * (n - 1))))
+        u = np.maximum(u_a, n_a * n_b - u_a)
+        z = (u - mu - 0.5) / sigma
+        p = np.clip(2 * stats.norm.sf(z), 0, 1)
+    return u_a, p
+
+
+def welch_ttest_batch(desc_a, desc_b):
+    """
+    Welch t-test for every column from the per-group descriptive statistics
+    """
+    var_a = desc_a['std'] ** 2 / desc_a['n']
+    var_b = desc_b['std'] ** 2 / desc_b['n']
+    with np.errstate(invalid='ignore', divide='ignore'):
+        t = (desc_a['mean'] - desc_b['mean']) / np.sqrt(var_a + var_b)
+        dof = (var_a + var_b) ** 2 / (var_a ** 2 / (desc_a['n'] - 1) + var_b ** 2 / (desc_b['n'] - 1))
+        p = 2 * stats.t.sf(np.abs(t), dof)
+    return t, p
+
+
+def crosstab_codes(codes, group_codes, n_levels, n_groups=2):
+    """
+    (groups x levels) count table from integer codes; code -1 (missing) is skipped
+    """
+    keep = (codes >= 0) & (group_codes >= 0)
+    flat = group_codes[keep] * n_levels + codes[keep]
+    return np.bincount(flat, minlength=n_groups * n_levels).reshape(n_groups, n_levels)
+
+
+def chi2_table(table):
+    """
+    Chi-square test of a count table (Yates correction for 2x2, like scipy)
+    """
+    table = table[:, table.sum(axis=0) > 0]
+    if table.shape[1] < 2 or (table.sum(axis=1) == 0).any():
+        return np.nan, np.nan
+    chi2, p, _, _ = stats.chi2_contingency(table)
+    return chi2, p
+
+
+def compare_groups(df, group, continuous=(), categorical=(), nonnormal=(), groups=None, labels=None):
+    """
+    Compare two groups of ``df`` (split on ``group``) for many columns at once.
+
+    ``groups`` gives the two group values to compare (a, b); by default the
+    sorted distinct values of ``group``. ``labels`` maps group values to the
+    names used in the output columns (e.g. ``mean_Early``).
+    """
+    values = df[group]
+    if groups is None:
+        groups = sorted(values.dropna().unique())
+    if len(groups) != 2:
+        raise ValueError(f"Expected two groups in '{group}', got {list(groups)}")
+    labels = labels or {}
+    names = [str(labels.get(g, g)) for g in groups]
+    in_a = (values == groups[0]).to_numpy(dtype=bool, na_value=False)
+    in_b = (values == groups[1]).to_numpy(dtype=bool, na_value=False)
+
+    rows = []
+    continuous = list(continuous)
+    if continuous:
+        x = as_float_matrix(df, continuous)
+        desc = [describe_batch(x, in_a), describe_batch(x, in_b)]
+        t, p_t = welch_ttest_batch(*desc)
+        is_nonnormal = np.array([c in nonnormal for c in continuous])
+        u, p_u = mannwhitney_batch(x[:, is_nonnormal], in_a, in_b) if is_nonnormal.any() else ([], [])
+        u_iter, p_u_iter = iter(u), iter(p_u)
+        for j, col in enumerate(continuous):
+            row = {'variable': col, 'level': '', 'type': 'continuous'}
+            if is_nonnormal[j]:
+                row.update(test='Mann-Whitney U', statistic=next(u_iter), p_value=next(p_u_iter))
+            else:
+                row.update(test='Welch t-test', statistic=t[j], p_value=p_t[j])
+            for name, d in zip(names, desc):
+                for key, arr in d.items():
+                    row[f'{key}_{name}'] = arr[j]
+            rows.append(row)
+
+    group_codes = np.where(in_a, 0, np.where(in_b, 1, -1))
+    for col in categorical:
+        cat = pd.Categorical(df[col])
+        table = crosstab_codes(cat.codes, group_codes, len(cat.categories))
+        chi2, p = chi2_table(table)
+        totals = table.sum(axis=1)
+        for k, level in enumerate(cat.categories):
+            row = {'variable': col, 'level': level, 'type': 'categorical',
+                   'test': 'Chi-square', 'statistic': chi2, 'p_value': p}
+            for g, name in enumerate(names):
+                row[f'n_{name}'] = totals[g]
+                row[f'count_{name}'] = table[g, k]
+                row[f'percent_{name}'] = table[g, k] / totals[g] * 100 if totals[g] else np.nan
+            rows.append(row)
+
+    return pd.DataFrame(rows).set_index(['variable', 'level'])
@@ -0,0 +1,272 @@
+"""
+Incremental refresh of the cohort outputs, keyed by admission ID.
+
+``IncrementalCohort`` keeps the prepared rows (with recoded columns and
+per-row exclusion masks), a hash per row, exclusion step counts, Table One
+accumulators and the key-plot accumulators. ``refresh`` hashes a new extract,
+finds the admissions that were added, changed or removed, and updates
+everything for those rows only: old versions are retracted from the
+accumulators and new versions added.
+
+``save`` writes a state folder:
+
+- ``state.pkl``: the accumulators, row hashes and the part of the row store
+  that holds the current version of every admission
+- ``rows-NNNNNN.parquet``: the row store, append-only. Each refresh adds one
+  part with its new and changed rows; older versions in earlier parts are
+  skipped when reading. The store is compacted into one part when it holds
+  more old versions than current ones.
+
+A refresh only reads the parts that hold the rows it retracts, and a save
+only writes the new part and the state; ``frame`` reads the whole store.
+
+The state also records ``spec_key``, a hash of the key column, ``prepare``
+(by the source of the modules it uses), the exclusions and the Table One
+spec. ``resume`` only reuses a saved state built with the same settings and
+starts over otherwise.
+"""
+import os
+import pickle
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from cohort_flow import CohortFlow
+from figure_cache import content_hash
+from schema import optimize_dtypes
+from streaming_tableone import StreamingTableOne
+
+Delta = namedtuple('Delta', ['added', 'changed', 'removed'])
+
+STATE_FILE = "state.pkl"
+PART_FILE = "rows-{:06d}.parquet"
+
+# Key-plot accumulators (script_plots.py): Early vs Late summaries
+PLOT_SPEC = dict(
+    columns=['age', 'number_of_transfusions', 'los_icu_days', 'in_hospital_mortality'],
+    categorical=['in_hospital_mortality'],
+    nonnormal=['age', 'number_of_transfusions', 'los_icu_days'],
+    groupby='early_transfusion',
+)
+
+
+def row_hashes(df, key):
+    """
+    One 64-bit hash per row of ``df`` (all columns), indexed by ``key``
+    """
+    hashes = pd.util.hash_pandas_object(df, index=False, categorize=True)
+    return pd.Series(hashes.to_numpy(), index=df[key].to_numpy())
+
+
+class IncrementalCohort:
+    """
+    Cohort outputs that are updated from the changed admissions only.
+
+    ``exclusions`` lists (keep, exclusion_reason, new_cohort_label) steps as
+    in ``CohortFlow.add_exclusion``; ``keep`` is a column name (kept when not
+    missing) or a function of a frame returning a boolean mask per row.
+    """
+
+    def __init__(self, key='hadm_id', prepare=None, exclusions=(), table_spec=None,
+                 initial_cohort_label='Initial cohort'):
+        self.key = key
+        self.prepare = prepare
+        self.exclusions = list(exclusions)
+        self.initial_cohort_label = initial_cohort_label
+        self.spec_key = content_hash(key, prepare, self.exclusions, table_spec, initial_cohort_label)
+        self.table = StreamingTableOne(**table_spec) if table_spec else None
+        self.plots = StreamingTableOne(**PLOT_SPEC)
+        self.hashes = pd.Series(dtype='uint64')
+        # Row store part holding the current version of every admission
+        self.part_of = pd.Series(dtype='int64')
+        self.n_parts = 0
+        self.n_old = 0
+        self.step_counts = np.zeros(len(self.exclusions) + 1, dtype=np.int64)
+        self.path = None
+        self._pending = {}
+        self._frame = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for name in ['path', '_pending', '_frame']:
+            state.pop(name)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state, path=None, _pending={}, _frame=None)
+
+    def _read_part(self, part, ids=None):
+        """
+        Current rows of one part of the row store (only those of ``ids``)
+        """
+        if part in self._pending:
+            rows = self._pending[part]
+        else:
+            filters = [(self.key, 'in', pd.Index(ids).tolist())] if ids is not None else None
+            rows = pd.read_parquet(os.path.join(self.path, PART_FILE.format(part)), filters=filters)
+        live = self.part_of.reindex(rows[self.key].to_numpy()).to_numpy() == part
+        if ids is not None:
+            live &= rows[self.key].isin(ids).to_numpy()
+        return rows[live]
+
+    def _rows(self, ids):
+        """
+        Current rows of the admissions ``ids``, read from the parts that hold them
+        """
+        parts = self.part_of[ids]
+        frames = [self._read_part(part, part_ids) for part, part_ids in parts.groupby(parts).groups.items()]
+        # Parts have their own categories; recompact the combined rows
+        return optimize_dtypes(pd.concat(frames, ignore_index=True))
+
+    @property
+    def frame(self):
+        """
+        All current rows (read from the row store), or None before the first refresh
+        """
+        if self._frame is None and len(self.part_of):
+            frames = [self._read_part(part) for part in np.unique(self.part_of.to_numpy())]
+            self._frame = optimize_dtypes(pd.concat(frames, ignore_index=True))
+        return self._frame
+
+    def _mask_columns(self):
+        return [f"_keep_{i}" for i in range(len(self.exclusions))]
+
+    def _prepare_rows(self, rows):
+        rows = self.prepare(rows.copy()) if self.prepare else rows.copy()
+        for name, (keep, _, _) in zip(self._mask_columns(), self.exclusions):
+            mask = rows[keep].notna() if isinstance(keep, str) else keep(rows)
+            rows[name] = np.asarray(mask, dtype=bool)
+        return rows
+
+    def _step_counts(self, rows):
+        """
+        Rows remaining after each exclusion step (initial cohort first)
+        """
+        masks = rows[self._mask_columns()].to_numpy(dtype=bool)
+        cumulative = np.logical_and.accumulate(masks, axis=1) if masks.size else masks
+        return np.concatenate([[len(rows)], cumulative.sum(axis=0)]).astype(np.int64)
+
+    def _add(self, rows):
+        self.step_counts += self._step_counts(rows)
+        if self.table is not None:
+            self.table.update(rows)
+        self.plots.update(rows)
+
+    def _remove(self, rows):
+        self.step_counts -= self._step_counts(rows)
+        if self.table is not None:
+            self.table.retract(rows)
+        self.plots.retract(rows)
+
+    def refresh(self, data):
+        """
+        Bring the state up to date with the extract ``data``; returns the Delta
+        of admission IDs
+        """
+        if data[self.key].duplicated().any():
+            raise ValueError(f"Duplicate values in key column '{self.key}'")
+        new_hashes = row_hashes(data, self.key)
+        old_ids, new_ids = self.hashes.index, new_hashes.index
+
+        removed = old_ids.difference(new_ids)
+        common = old_ids.intersection(new_ids)
+        changed = common[self.hashes[common].to_numpy() != new_hashes[common].to_numpy()]
+        added = new_ids.difference(old_ids)
+        delta = Delta(added.tolist(), changed.tolist(), removed.tolist())
+
+        stale = removed.append(changed)
+        if len(stale):
+            self._remove(self._rows(stale))
+            self.part_of = self.part_of.drop(stale)
+            self.n_old += len(stale)
+
+        fresh = added.append(changed)
+        if len(fresh):
+            rows = optimize_dtypes(self._prepare_rows(data[data[self.key].isin(fresh).to_numpy()]))
+            self._add(rows)
+            self.n_parts += 1
+            self._pending[self.n_parts] = rows.reset_index(drop=True)
+            self.part_of = pd.concat([self.part_of, pd.Series(self.n_parts, index=fresh, dtype='int64')])
+
+        if len(stale) or len(fresh):
+            self._frame = None
+        self.hashes = new_hashes
+        return delta
+
+    def flow(self):
+        """
+        CohortFlow over the stored rows, using the stored exclusion masks
+        """
+        flow = CohortFlow(self.frame, self.initial_cohort_label)
+        for name, (_, reason, label) in zip(self._mask_columns(), self.exclusions):
+            flow.add_exclusion(self.frame[name].to_numpy(dtype=bool), reason, label)
+        return flow
+
+    def counts(self):
+        """
+        Patients per cohort step, maintained incrementally
+        """
+        labels = [self.initial_cohort_label] + [label for _, _, label in self.exclusions]
+        reasons = [''] + [reason for _, reason, _ in self.exclusions]
+        n = self.step_counts
+        return pd.DataFrame({'cohort': labels, 'exclusion_reason': reasons, 'n': n,
+                             'excluded': np.concatenate([[0], n[:-1] - n[1:]])})
+
+    def _compact(self):
+        """
+        Replace the row store by one part with the current rows
+        """
+        rows = self.frame if self.frame is not None else pd.DataFrame()
+        self.n_parts += 1
+        self._pending = {self.n_parts: rows}
+        self.part_of = pd.Series(self.n_parts, index=self.part_of.index, dtype='int64')
+        self.n_old = 0
+
+    def save(self, path):
+        """
+        Write the new row parts and the state to the folder ``path``
+        """
+        os.makedirs(path, exist_ok=True)
+        if self.path is not None and os.path.abspath(path) != os.path.abspath(self.path):
+            # Saving elsewhere: the parts of the old folder are not carried over
+            self._compact()
+        elif self.n_old > len(self.part_of):
+            self._compact()
+        for part, rows in self._pending.items():
+            target = os.path.join(path, PART_FILE.format(part))
+            rows.to_parquet(f"{target}.{os.getpid()}.tmp", index=False)
+            os.replace(f"{target}.{os.getpid()}.tmp", target)
+        self._pending = {}
+        self.path = path
+
+        tmp_path = os.path.join(path, f"{STATE_FILE}.{os.getpid()}.tmp")
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, os.path.join(path, STATE_FILE))
+
+        # Parts without current rows (compacted, or left by an interrupted save)
+        used = {PART_FILE.format(part) for part in np.unique(self.part_of.to_numpy())}
+        for name in os.listdir(path):
+            if name.startswith('rows-') and name.endswith('.parquet') and name not in used:
+                os.remove(os.path.join(path, name))
+
+    @classmethod
+    def load(cls, path):
+        with open(os.path.join(path, STATE_FILE), 'rb') as f:
+            cohort = pickle.load(f)
+        cohort.path = path
+        return cohort
+
+    @classmethod
+    def resume(cls, path, **kwargs):
+        """
+        The state saved in ``path`` if it was built with the same settings
+        (``kwargs`` of ``IncrementalCohort``), else a new, empty cohort
+        """
+        cohort = cls(**kwargs)
+        if os.path.exists(os.path.join(path, STATE_FILE)):
+            saved = cls.load(path)
+            if getattr(saved, 'spec_key', None) == cohort.spec_key:
+                return saved
+        return cohort
@@ -0,0 +1,311 @@
+"""
+Stage timing and memory instrumentation for the analysis scripts.
+
+Wrap a stage with ``stage`` (context manager) or ``timed`` (decorator) to
+record wall time, CPU time, memory and row counts in/out:
+
+    with stage('load') as s:
+        df = load_cohort(...)
+        s.rows_out = len(df)
+
+Memory per stage: RSS at the start and end, the stage's peak RSS (sampled
+every ``rss_interval`` seconds while it runs) and ``rss_delta_mb``, how far
+that peak rose above the start. ``process_peak_rss_mb`` is the process
+high-water mark (``ru_maxrss``), which never goes down, so it only says
+which stage drove memory when it changes. The sampled fields are None where
+RSS cannot be read (non-Linux).
+
+Records are kept in memory (``records``/``summary``) and, when a trace file
+is configured, written as JSON lines (one record per stage, as it finishes)
+or as a Chrome trace (``chrome://tracing`` / Perfetto) at exit. Per stage,
+cProfile or a sampling profiler can be switched on; their output goes to
+``profile_dir``.
+
+Configuration comes from ``configure`` or the environment:
+``STUDY_TRACE`` (trace file; ``.json`` means Chrome format),
+``STUDY_PROFILE`` (comma-separated stage names, or ``*``) and
+``STUDY_PROFILER`` (``cprofile`` or ``sampling``).
+"""
+import atexit
+import cProfile
+import functools
+import json
+import os
+import resource
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+from contextlib import contextmanager
+
+records = []
+
+_config = {
+    'trace': os.environ.get('STUDY_TRACE'),
+    'format': None,
+    'profile': {s for s in os.environ.get('STUDY_PROFILE', '').split(',') if s},
+    'profiler': os.environ.get('STUDY_PROFILER', 'cprofile'),
+    'profile_dir': '.profiles',
+    'interval': 0.005,
+    'rss_interval': 0.01,
+}
+_stack = threading.local()
+_T0 = time.perf_counter()
+
+
+def configure(trace=None, format=None, profile=None, profiler=None, profile_dir=None, interval=None):
+    """
+    Set the trace file (format 'jsonl' or 'chrome', by default from the
+    extension) and the stages to profile ('*' for all). Settings not given
+    keep their current value (e.g. from the environment).
+    """
+    settings = dict(trace=trace, format=format, profile=set(profile) if profile is not None else None,
+                    profiler=profiler, profile_dir=profile_dir, interval=interval)
+    _config.update({key: value for key, value in settings.items() if value is not None})
+
+
+def _trace_format():
+    if _config['format']:
+        return _config['format']
+    return 'chrome' if (_config['trace'] or '').endswith('.json') else 'jsonl'
+
+
+def _rss_mb():
+    """
+    Current resident set size (Linux), or None
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except (OSError, ValueError):
+        return None
+
+
+def peak_rss_mb():
+    """
+    Peak resident set size of this process in MB (high-water mark)
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / 2**20 if sys.platform == 'darwin' else peak / 1024
+
+
+class RssMonitor:
+    """
+    One background thread sampling RSS while stages are open; every open
+    record keeps the highest value seen since it started
+    """
+
+    def __init__(self):
+        self._reset()
+        if hasattr(os, 'register_at_fork'):
+            # A forked worker has no sampler thread and may inherit a held lock
+            os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        self.open = set()
+        self._lock = threading.Lock()
+        self._started = False
+
+    def _run(self):
+        while True:
+            time.sleep(_config['rss_interval'])
+            with self._lock:
+                if self.open:
+                    self._sample()
+
+    def _sample(self):
+        rss = _rss_mb()
+        if rss is not None:
+            for record in self.open:
+                record._rss_peak = max(record._rss_peak, rss)
+
+    def add(self, record):
+        record.rss_start_mb = record._rss_peak = _rss_mb()
+        if record._rss_peak is None:
+            return
+        with self._lock:
+            if not self._started:
+                self._started = True
+                threading.Thread(target=self._run, daemon=True).start()
+            self.open.add(record)
+
+    def remove(self, record):
+        with self._lock:
+            if record in self.open:
+                self._sample()
+                self.open.discard(record)
+        return record._rss_peak
+
+
+_monitor = RssMonitor()
+
+
+class Sampler:
+    """
+    Samples the stack of one thread at a fixed interval (collapsed stacks,
+    as used by flame graph tools)
+    """
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                stack = traceback.extract_stack(frame)
+                self.stacks[';'.join(f"{f.name} ({os.path.basename(f.filename)}:{f.lineno})"
+                                     for f in stack)] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def write(self, path):
+        with open(path, 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+class StageRecord:
+    """
+    Measurements of one stage; set ``rows_out`` (and ``rows_in``) inside the block
+    """
+
+    def __init__(self, name, rows_in=None, **attrs):
+        self.name = name
+        self.rows_in = rows_in
+        self.rows_out = None
+        self.attrs = attrs
+        self.parent = None
+        self._rss_peak = None
+
+    def to_dict(self):
+        return {k: v for k, v in vars(self).items() if not k.startswith('_')}
+
+
+def _profiled(name):
+    return name in _config['profile'] or '*' in _config['profile']
+
+
+def _emit(record):
+    records.append(record)
+    if _config['trace'] and _trace_format() == 'jsonl':
+        with open(_config['trace'], 'a') as f:
+            f.write(json.dumps(record.to_dict(), default=str) + '\n')
+
+
+@contextmanager
+def stage(name, rows_in=None, emit=True, **attrs):
+    """
+    Measure the enclosed block as stage ``name``. With ``emit=False`` the
+    record is only returned (e.g. from a worker process, see ``collect``).
+    """
+    record = StageRecord(name, rows_in, **attrs)
+    parents = getattr(_stack, 'names', [])
+    record.parent = parents[-1] if parents else None
+    _stack.names = parents + [name]
+
+    profiler = sampler = None
+    if _profiled(name):
+        if _config['profiler'] == 'sampling':
+            sampler = Sampler(threading.get_ident(), _config['interval'])
+            sampler.start()
+        else:
+            profiler = cProfile.Profile()
+            profiler.enable()
+
+    record.pid = os.getpid()
+    record.tid = threading.get_ident()
+    record.start_s = time.perf_counter() - _T0
+    _monitor.add(record)
+    wall, cpu = time.perf_counter(), time.process_time()
+    try:
+        yield record
+    finally:
+        record.wall_s = time.perf_counter() - wall
+        record.cpu_s = time.process_time() - cpu
+        record.rss_mb = _rss_mb()
+        record.peak_rss_mb = _monitor.remove(record)
+        if record.peak_rss_mb is not None and record.rss_mb is not None:
+            record.peak_rss_mb = max(record.peak_rss_mb, record.rss_mb)
+            record.rss_delta_mb = record.peak_rss_mb - record.rss_start_mb
+        else:
+            record.rss_delta_mb = None
+        record.process_peak_rss_mb = peak_rss_mb()
+        _stack.names = parents
+        if profiler is not None or sampler is not None:
+            os.makedirs(_config['profile_dir'], exist_ok=True)
+            base = os.path.join(_config['profile_dir'], f"{name.replace(os.sep, '_')}-{record.pid}")
+            if profiler is not None:
+                profiler.disable()
+                profiler.dump_stats(f"{base}.prof")
+                record.profile = f"{base}.prof"
+            else:
+                sampler.stop()
+                sampler.write(f"{base}.stacks")
+                record.profile = f"{base}.stacks"
+        if emit:
+            _emit(record)
+
+
+def collect(record):
+    """
+    Add a record measured elsewhere (e.g. returned by a worker process)
+    """
+    _emit(record)
+
+
+def timed(name=None):
+    """
+    Decorator form of ``stage``; rows in/out are taken from the length of the
+    first argument and of the result when they have one
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            rows_in = len(args[0]) if args and hasattr(args[0], '__len__') else None
+            with stage(name or func.__name__, rows_in=rows_in) as record:
+                result = func(*args, **kwargs)
+                if hasattr(result, '__len__') and not isinstance(result, str):
+                    record.rows_out = len(result)
+                return result
+        return wrapper
+    return decorator
+
+
+def summary():
+    """
+    Recorded stages as a DataFrame
+    """
+    import pandas as pd
+    return pd.DataFrame([r.to_dict() for r in records])
+
+
+def write_chrome_trace(path):
+    """
+    Write all records as Chrome trace complete events
+    """
+    events = [{
+        'name': r.name, 'ph': 'X', 'pid': r.pid, 'tid': r.tid,
+        'ts': r.start_s * 1e6, 'dur': r.wall_s * 1e6,
+        'args': {k: v for k, v in r.to_dict().items()
+                 if k not in ('name', 'pid', 'tid', 'start_s') and v is not None},
+    } for r in records]
+    with open(path, 'w') as f:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f, default=str)
+
+
+@atexit.register
+def _write_trace_at_exit():
+    if _config['trace'] and _trace_format() == 'chrome' and records:
+        write_chrome_trace(_config['trace'])
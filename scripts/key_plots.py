@@ -0,0 +1,121 @@
+"""
+Panel functions for the transfusion key-plots figure.
+
+Each function draws one panel on ``ax`` from plain arrays/values so it can be
+hashed, cached and rendered in a worker process (see figure_cache.py).
+``key_panels`` builds the panels of the figure from the cohort.
+"""
+from figure_cache import Panel
+from stats_cache import compare_groups
+
+GROUP_COLORS = ['#2ecc71', '#e74c3c']
+
+# Columns of the key plots, all compared with Mann-Whitney U except mortality
+KEY_CONTINUOUS = ['age', 'number_of_transfusions', 'los_icu_days']
+KEY_COLUMNS = ['early_transfusion', 'age', 'time_to_first_transfusion_hours',
+               'number_of_transfusions', 'los_icu_days', 'in_hospital_mortality']
+
+
+def plot_group_boxplot(ax, data, ylabel, title):
+    """
+    Boxplot of one variable, Late vs Early. ``data`` maps group label to values.
+    """
+    bp = ax.boxplot(list(data.values()), labels=list(data.keys()), patch_artist=True,
+                    showfliers=False, medianprops=dict(color='red', linewidth=2))
+    for patch, color in zip(bp['boxes'], GROUP_COLORS):
+        patch.set_facecolor(color)
+        patch.set_alpha(0.7)
+    ax.set_ylabel(ylabel, fontsize=13, fontweight='bold')
+    ax.set_title(title, fontsize=15, fontweight='bold', pad=15)
+    ax.grid(axis='y', alpha=0.3)
+
+
+def plot_time_histogram(ax, data, cutoff=6):
+    """
+    Histogram of time to first transfusion with the early/late cutoff
+    """
+    ax.hist(data, bins=30, color='#3498db', alpha=0.7, edgecolor='black')
+    ax.axvline(cutoff, color='red', linestyle='--', linewidth=2.5, label=f'{cutoff:g}-hour cutoff')
+    ax.set_xlabel('Time to First Transfusion (hours)', fontsize=13, fontweight='bold')
+    ax.set_ylabel('Number of Patients', fontsize=13, fontweight='bold')
+    ax.set_title('Distribution of Time to First Transfusion', fontsize=15, fontweight='bold', pad=15)
+    ax.legend(fontsize=11)
+    ax.grid(axis='y', alpha=0.3)
+
+
+def plot_transfusion_volume(ax, data):
+    """
+    Average number of transfusions per patient. ``data`` maps group label to mean.
+    """
+    values = list(data.values())
+    bars = ax.bar(list(data.keys()), values,
+                  color=GROUP_COLORS, alpha=0.7, edgecolor='black', linewidth=1.5)
+    ax.set_ylabel('Number of Transfusions', fontsize=13, fontweight='bold')
+    ax.set_title('Average Number of Transfusions per Patient', fontsize=15, fontweight='bold', pad=15)
+    for bar in bars:
+        height = bar.get_height()
+        ax.text(bar.get_x() + bar.get_width()/2, height + 0.15, f'{height:.2f}',
+                ha='center', va='bottom', fontsize=12, fontweight='bold')
+    ax.grid(axis='y', alpha=0.3)
+    ax.set_ylim(0, max(values) * 1.2)
+
+
+def plot_mortality(ax, data, p_value):
+    """
+    In-hospital mortality rate (%) by group, annotated with the chi-square p-value
+    """
+    values = list(data.values())
+    bars = ax.bar(list(data.keys()), values, color=GROUP_COLORS, alpha=0.7, edgecolor='black', linewidth=1.5)
+    ax.set_ylabel('Mortality Rate (%)', fontsize=13, fontweight='bold')
+    ax.set_title('In-Hospital Mortality by Transfusion Timing', fontsize=15, fontweight='bold', pad=15)
+    ax.set_ylim(0, max(values) * 1.3)
+    for bar, val in zip(bars, values):
+        ax.text(bar.get_x() + bar.get_width()/2, val + 1, f'{val:.1f}%',
+                ha='center', va='bottom', fontsize=12, fontweight='bold')
+    if p_value < 0.05:
+        ax.text(0.5, max(values) * 1.2, f'p = {p_value:.4f}*',
+                ha='center', fontsize=11, style='italic', fontweight='bold')
+    else:
+        ax.text(0.5, max(values) * 1.2, f'p = {p_value:.4f} (ns)',
+                ha='center', fontsize=11, style='italic')
+    ax.grid(axis='y', alpha=0.3)
+
+
+def compare_timing(df):
+    """
+    Early vs Late statistics for the key plots (one batch)
+    """
+    return compare_groups(
+        df, 'early_transfusion',
+        continuous=KEY_CONTINUOUS,
+        categorical=['in_hospital_mortality'],
+        nonnormal=KEY_CONTINUOUS,
+        groups=[1, 0],
+        labels={1: 'early', 0: 'late'}
+    )
+
+
+def key_panels(df, comparison):
+    """
+    Panels of the 2x3 key-plots figure (the last slot is empty)
+    """
+    early = df[df['early_transfusion'] == 1]
+    late = df[df['early_transfusion'] == 0]
+    vol_stats = comparison.loc[('number_of_transfusions', '')]
+    mortality = comparison.loc[('in_hospital_mortality', 1)]
+    return [
+        Panel(plot_group_boxplot,
+              {'Late (>6h)': late['age'].dropna().to_numpy(), 'Early (≤6h)': early['age'].dropna().to_numpy()},
+              {'ylabel': 'Age (years)', 'title': 'Age Distribution'}),
+        Panel(plot_time_histogram, df['time_to_first_transfusion_hours'].dropna().to_numpy(), {'cutoff': 6}),
+        Panel(plot_transfusion_volume,
+              {'Late (>6h)': vol_stats['mean_late'], 'Early (≤6h)': vol_stats['mean_early']}, {}),
+        Panel(plot_group_boxplot,
+              {'Late (>6h)': late['los_icu_days'].dropna().to_numpy(),
+               'Early (≤6h)': early['los_icu_days'].dropna().to_numpy()},
+              {'ylabel': 'Days', 'title': 'ICU Length of Stay'}),
+        Panel(plot_mortality,
+              {'Late\n(>6h)': mortality['percent_late'], 'Early\n(≤6h)': mortality['percent_early']},
+              {'p_value': mortality['p_value']}),
+        None,
+    ]
@@ -0,0 +1,297 @@
+"""
+Out-of-core queries over the cohort's Parquet snapshot.
+
+For extracts too large to load as one pandas frame: counts, value counts,
+crosstabs, grouped summaries and exclusion-step counts run inside a query
+engine over the snapshot, with projection and predicate pushdown, and only
+the small aggregated results come back as pandas objects.
+
+Engines, in order of preference (``backend=None`` picks the first installed):
+
+- ``duckdb``: embedded SQL engine, multithreaded and spilling to disk
+- ``polars``: lazy frames (``scan_parquet``), streaming where possible
+- ``arrow``: pyarrow datasets and Acero group-bys (always available, since
+  snapshots need pyarrow); reads only the projected columns, which it holds
+  in memory while aggregating
+
+Filters are lists of ``(column, op, value)`` conditions that must all hold,
+like the ``filters`` of ``pandas.read_parquet``. ``op`` is one of ==, !=, <,
+<=, >, >=, in, notnull, isnull (value ignored for the last two).
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+from cohort_loader import snapshot_path
+
+try:
+    import duckdb
+except ImportError:  # optional engine
+    duckdb = None
+
+try:
+    import polars as pl
+except ImportError:  # optional engine
+    pl = None
+
+QUANTILES = (0.25, 0.5, 0.75)
+
+_COMPARISONS = {'==', '!=', '<', '<=', '>', '>='}
+
+
+def available_backends():
+    return [name for name, module in (('duckdb', duckdb), ('polars', pl)) if module is not None] + ['arrow']
+
+
+def _check(where):
+    where = list(where or [])
+    for column, op, _ in where:
+        if op not in _COMPARISONS | {'in', 'notnull', 'isnull'}:
+            raise ValueError(f"Unsupported filter operator '{op}' on '{column}'")
+    return where
+
+
+def _quote(column):
+    return '"' + column.replace('"', '""') + '"'
+
+
+class LazyCohort:
+    """
+    Aggregation queries over the snapshot of a cohort extract
+    """
+
+    def __init__(self, path, backend=None, threads=None, cache_dir=None):
+        self.path = snapshot_path(path, cache_dir=cache_dir) if path.endswith('.csv') else path
+        self.backend = backend or available_backends()[0]
+        if self.backend not in available_backends():
+            raise ImportError(f"Backend '{self.backend}' is not installed "
+                              f"(available: {', '.join(available_backends())})")
+        self.threads = threads or os.cpu_count()
+        if self.backend == 'duckdb':
+            self._con = duckdb.connect()
+            self._con.execute(f"SET threads = {int(self.threads)}")
+        elif self.backend == 'polars':
+            self._schema = dict(pl.scan_parquet(self.path).collect_schema())
+        else:
+            import pyarrow.dataset as ds
+            self._dataset = ds.dataset(self.path, format='parquet')
+
+    # Backend-specific building blocks
+
+    def _sql_where(self, where):
+        clauses, params = [], []
+        for column, op, value in _check(where):
+            if op == 'notnull':
+                clauses.append(f"{_quote(column)} IS NOT NULL")
+            elif op == 'isnull':
+                clauses.append(f"{_quote(column)} IS NULL")
+            elif op == 'in':
+                clauses.append(f"{_quote(column)} IN ({', '.join('?' * len(value))})")
+                params.extend(value)
+            else:
+                clauses.append(f"{_quote(column)} {'=' if op == '==' else op} ?")
+                params.append(value)
+        return (' AND '.join(clauses) or 'TRUE'), params
+
+    def _sql(self, query, where=None):
+        condition, params = self._sql_where(where)
+        source = f"read_parquet('{self.path}')"
+        return self._con.execute(query.format(source=source, where=condition), params).df()
+
+    def _polars_expr(self, where):
+        expr = pl.lit(True)
+        for column, op, value in _check(where):
+            col = pl.col(column)
+            if op == 'notnull':
+                cond = col.is_not_null()
+            elif op == 'isnull':
+                cond = col.is_null()
+            elif op == 'in':
+                cond = col.cast(pl.Utf8).is_in([str(v) for v in value]) if self._is_text(column) \
+                    else col.is_in(list(value))
+            else:
+                if self._is_text(column):
+                    col, value = col.cast(pl.Utf8), str(value)
+                cond = {'==': col == value, '!=': col != value, '<': col < value,
+                        '<=': col <= value, '>': col > value, '>=': col >= value}[op]
+            expr = expr & cond
+        return expr
+
+    def _is_text(self, column):
+        return self._schema[column] in (pl.Categorical, pl.Utf8)
+
+    def _arrow_expr(self, where):
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+        expr = None
+        for column, op, value in _check(where):
+            field = ds.field(column)
+            arrow_type = self._dataset.schema.field(column).type
+            if pa.types.is_dictionary(arrow_type):
+                field = field.cast(arrow_type.value_type)
+            if op == 'notnull':
+                cond = field.is_valid()
+            elif op == 'isnull':
+                cond = ~field.is_valid()
+            elif op == 'in':
+                cond = field.isin(list(value))
+            else:
+                cond = {'==': field == value, '!=': field != value, '<': field < value,
+                        '<=': field <= value, '>': field > value, '>=': field >= value}[op]
+            expr = cond if expr is None else expr & cond
+        return expr
+
+    def _arrow_table(self, columns, where=None):
+        return self._dataset.to_table(columns=list(dict.fromkeys(columns)), filter=self._arrow_expr(where),
+                                      use_threads=True)
+
+    # Queries
+
+    def count(self, where=None):
+        """
+        Number of rows matching ``where``
+        """
+        if self.backend == 'duckdb':
+            return int(self._sql("SELECT COUNT(*) AS n FROM {source} WHERE {where}", where)['n'].iloc[0])
+        if self.backend == 'polars':
+            return int(pl.scan_parquet(self.path).filter(self._polars_expr(where))
+                       .select(pl.len()).collect().item())
+        return self._dataset.count_rows(filter=self._arrow_expr(where))
+
+    def value_counts(self, column, where=None, dropna=True):
+        """
+        Counts per value of ``column`` (sorted by value), like ``Series.value_counts``
+        """
+        return self.crosstab([column], where=where, dropna=dropna).rename('count')
+
+    def crosstab(self, columns, where=None, dropna=True, wide=False):
+        """
+        Row counts per combination of ``columns`` (a Series indexed by the
+        combinations, or with ``wide`` a table like ``pd.crosstab`` of two columns)
+        """
+        columns = [columns] if isinstance(columns, str) else list(columns)
+        if dropna:
+            where = _check(where) + [(c, 'notnull', None) for c in columns]
+        if self.backend == 'duckdb':
+            keys = ', '.join(_quote(c) for c in columns)
+            result = self._sql(f"SELECT {keys}, COUNT(*) AS n FROM {{source}} WHERE {{where}} "
+                               f"GROUP BY {keys}", where)
+        elif self.backend == 'polars':
+            result = (pl.scan_parquet(self.path).filter(self._polars_expr(where))
+                      .group_by(columns).agg(pl.len().alias('n')).collect().to_pandas())
+        else:
+            table = self._arrow_table(columns, where)
+            table = table.group_by(columns).aggregate([([], 'count_all')])
+            result = table.to_pandas().rename(columns={'count_all': 'n'})
+        result = result.set_index(columns)['n'].astype('int64').sort_index()
+        return result.unstack(fill_value=0) if wide else result
+
+    def summarize(self, columns, by=None, where=None, quantiles=QUANTILES):
+        """
+        n, mean, SD (ddof=1) and quantiles of every column in ``columns``,
+        per value of ``by``. Returns a frame indexed by (by value, column).
+        """
+        columns = list(columns)
+        keys = [by] if by else []
+        where = _check(where) + [(k, 'notnull', None) for k in keys]
+        if self.backend == 'duckdb':
+            parts = []
+            for c in columns:
+                q = _quote(c)
+                parts += [f"COUNT({q}) AS \"{c}|n\"", f"AVG({q}) AS \"{c}|mean\"",
+                          f"STDDEV_SAMP({q}) AS \"{c}|std\""]
+                parts += [f"QUANTILE_CONT({q}, {p}) AS \"{c}|q{p}\"" for p in quantiles]
+            group = f" GROUP BY {_quote(by)}" if by else ''
+            select = ', '.join([_quote(by)] * bool(by) + parts)
+            wide = self._sql(f"SELECT {select} FROM {{source}} WHERE {{where}}{group}", where)
+        elif self.backend == 'polars':
+            parts = []
+            for c in columns:
+                col = pl.col(c).cast(pl.Float64)
+                parts += [col.count().alias(f"{c}|n"), col.mean().alias(f"{c}|mean"),
+                          col.std().alias(f"{c}|std")]
+                parts += [col.quantile(p, interpolation='linear').alias(f"{c}|q{p}") for p in quantiles]
+            frame = pl.scan_parquet(self.path).filter(self._polars_expr(where))
+            frame = frame.group_by(by).agg(parts) if by else frame.select(parts)
+            wide = frame.collect().to_pandas()
+        else:
+            import pyarrow.compute as pc
+            table = self._arrow_table(keys + columns, where)
+            aggs = []
+            for c in columns:
+                aggs += [(c, 'count'), (c, 'mean'), (c, 'stddev', pc.VarianceOptions(ddof=1))]
+            grouped = table.group_by(keys).aggregate(aggs).to_pandas()
+            wide = grouped.rename(columns={f"{c}_{a}": f"{c}|{n}" for c in columns
+                                           for a, n in (('count', 'n'), ('mean', 'mean'), ('stddev', 'std'))})
+            # Exact quantiles need the values: one projected column at a time
+            for c in columns:
+                values = table.select(keys + [c]).to_pandas()
+                q = (values.groupby(keys, observed=True)[c] if keys else values[c]).quantile(list(quantiles))
+                q = q.unstack() if keys else q.to_frame().T
+                q.columns = [f"{c}|q{p}" for p in quantiles]
+                wide = wide.merge(q, left_on=keys, right_index=True) if keys else \
+                    wide.assign(**q.iloc[0].to_dict())
+        names = dict(zip(quantiles, ('q1', 'median', 'q3'))) if tuple(quantiles) == QUANTILES else {}
+        stats = ['n', 'mean', 'std'] + [f"q{p}" for p in quantiles]
+        groups = wide[by].tolist() if by else ['All'] * len(wide)
+        rows = []
+        for group, (_, row) in zip(groups, wide.iterrows()):
+            for c in columns:
+                rows.append([group, c] + [row[f"{c}|{stat}"] for stat in stats])
+        table = pd.DataFrame(rows, columns=[by or 'group', 'variable', 'n', 'mean', 'std']
+                             + [names.get(p, f"q{p}") for p in quantiles])
+        return table.sort_values(by or 'group', kind='stable').set_index([by or 'group', 'variable']).astype(float)
+
+    def step_counts(self, exclusions, initial_cohort_label="Initial Cohort", where=None):
+        """
+        Cohort size after every exclusion step, in one scan; same table as
+        ``CohortFlow.counts``. ``exclusions`` lists (keep, reason, label),
+        where ``keep`` is a column name (rows with a value are kept) or a list
+        of filter conditions.
+        """
+        steps = [[(keep, 'notnull', None)] if isinstance(keep, str) else _check(keep)
+                 for keep, _, _ in exclusions]
+        cumulative = [[]]
+        for conditions in steps:
+            cumulative.append(cumulative[-1] + conditions)
+
+        if self.backend == 'duckdb':
+            parts, params = [], []
+            for i, conditions in enumerate(cumulative):
+                condition, p = self._sql_where(conditions)
+                parts.append(f"COUNT(*) FILTER (WHERE {condition}) AS step_{i}")
+                params.extend(p)
+            base, base_params = self._sql_where(where)
+            query = f"SELECT {', '.join(parts)} FROM read_parquet('{self.path}') WHERE {base}"
+            n = self._con.execute(query, params + base_params).df().iloc[0].to_numpy()
+        elif self.backend == 'polars':
+            # The initial step has no conditions: pl.lit(True).sum() would be 1, not the row count
+            parts = [(self._polars_expr(conditions).sum() if conditions else pl.len()).alias(f"step_{i}")
+                     for i, conditions in enumerate(cumulative)]
+            n = pl.scan_parquet(self.path).filter(self._polars_expr(where)).select(parts) \
+                .collect().to_numpy()[0]
+        else:
+            n = [self.count(_check(where) + conditions) for conditions in cumulative]
+        n = np.asarray(n, dtype=np.int64)
+        return pd.DataFrame({
+            'cohort': [initial_cohort_label] + [label for _, _, label in exclusions],
+            'exclusion_reason': [''] + [reason for _, reason, _ in exclusions],
+            'n': n,
+            'excluded': np.concatenate([[0], n[:-1] - n[1:]]),
+        })
+
+    def select(self, columns, where=None, limit=None):
+        """
+        Matching rows as a pandas frame (only ``columns``); for small subsets
+        """
+        columns = list(columns)
+        if self.backend == 'duckdb':
+            keys = ', '.join(_quote(c) for c in columns)
+            return self._sql(f"SELECT {keys} FROM {{source}} WHERE {{where}}"
+                             + (f" LIMIT {int(limit)}" if limit else ''), where)
+        if self.backend == 'polars':
+            frame = pl.scan_parquet(self.path).filter(self._polars_expr(where)).select(columns)
+            return (frame.head(limit) if limit else frame).collect().to_pandas()
+        table = self._arrow_table(columns, where)
+        return (table.slice(0, limit) if limit else table).to_pandas()
@@ -0,0 +1,160 @@
+"""
+Model selection for the binned ``number_of_transfusions`` target.
+
+Runs stratified K-fold CV over a grid of quantile bin counts, estimators and
+hyperparameters on a process pool with a bounded number of workers. The
+feature matrix (CSR) is put in shared memory once; workers attach to it
+instead of receiving a pickled copy with every task.
+
+One task is one (bin count, estimator, setting, fold). Inside a task the
+estimator walks its hyperparameter path (e.g. increasing ``C`` or
+``n_estimators``) with ``warm_start``, so each fit starts from the previous
+solution. Every fit is one row of the results table, with fit and predict
+timings.
+"""
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.linear_model import LogisticRegression
+from sklearn.metrics import accuracy_score, balanced_accuracy_score, f1_score
+from sklearn.model_selection import StratifiedKFold
+
+# name -> (estimator class, fixed settings, warm-started path parameter, path values)
+DEFAULT_GRID = {
+    'logreg': (LogisticRegression,
+               [{'max_iter': 1000, 'class_weight': 'balanced'}],
+               'C', [0.01, 0.1, 1.0, 10.0]),
+    'random_forest': (RandomForestClassifier,
+                      [{'max_depth': None, 'random_state': 0}, {'max_depth': 8, 'random_state': 0}],
+                      'n_estimators', [100, 200, 400]),
+}
+
+# Arrays shared with the workers (attached once per worker process)
+_shared = {}
+
+
+def make_quantile_bins(y, q):
+    labels = [f"Q{i}" for i in range(1, q + 1)]
+    y_b = pd.qcut(y, q=q, labels=labels, duplicates="drop")
+    return y_b.astype("category")
+
+
+def bin_target(y, bins=(4, 3, 2), min_count=2):
+    """
+    {q: binned target} for every bin count whose smallest class has at
+    least ``min_count`` rows
+    """
+    binned = {}
+    for q in bins:
+        try:
+            y_b = make_quantile_bins(pd.Series(y), q)
+        except ValueError:
+            continue
+        if y_b.value_counts().min() >= min_count:
+            binned[q] = np.asarray(y_b.cat.codes)
+    return binned
+
+
+def _share(arrays):
+    """
+    Copy arrays into shared memory blocks; returns (blocks, descriptors)
+    """
+    blocks, descriptors = [], {}
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+        blocks.append(block)
+        descriptors[name] = (block.name, array.shape, array.dtype.str)
+    return blocks, descriptors
+
+
+def _attach(descriptors, shape):
+    """
+    Worker initializer: rebuild the CSR matrix on top of the shared blocks
+    """
+    arrays = {}
+    for name, (block_name, array_shape, dtype) in descriptors.items():
+        block = shared_memory.SharedMemory(name=block_name)
+        _shared.setdefault('blocks', []).append(block)
+        arrays[name] = np.ndarray(array_shape, dtype=np.dtype(dtype), buffer=block.buf)
+    _shared['X'] = sparse.csr_matrix((arrays['data'], arrays['indices'], arrays['indptr']), shape=shape)
+    _shared['targets'] = {int(k[1:]): v for k, v in arrays.items() if k.startswith('y')}
+
+
+def _fit_path(q, name, estimator_class, setting, path_param, path_values, fold, train, test):
+    X, y = _shared['X'], _shared['targets'][q]
+    estimator = estimator_class(**setting, warm_start=True)
+    rows = []
+    for value in sorted(path_values):
+        estimator.set_params(**{path_param: value})
+        start = time.perf_counter()
+        estimator.fit(X[train], y[train])
+        fit_time = time.perf_counter() - start
+        start = time.perf_counter()
+        pred = estimator.predict(X[test])
+        predict_time = time.perf_counter() - start
+        rows.append({
+            'q': q, 'estimator': name,
+            'params': ', '.join(f"{k}={v}" for k, v in {**setting, path_param: value}.items()),
+            'fold': fold, 'fit_time': fit_time, 'predict_time': predict_time,
+            'accuracy': accuracy_score(y[test], pred),
+            'balanced_accuracy': balanced_accuracy_score(y[test], pred),
+            'f1_macro': f1_score(y[test], pred, average='macro'),
+        })
+    return rows
+
+
+def run_grid(X, y, bins=(4, 3, 2), grid=None, n_splits=5, seed=42, max_workers=4):
+    """
+    Cross-validated results for every (bin count, estimator, setting, fold)
+    and every value of the estimator's warm-started path parameter.
+
+    ``X`` is a (sparse) feature matrix and ``y`` the raw target.
+    """
+    grid = grid or DEFAULT_GRID
+    X = sparse.csr_matrix(X)
+    targets = bin_target(y, bins, min_count=n_splits)
+    if not targets:
+        raise ValueError(f"No bin count in {list(bins)} leaves {n_splits} rows per class")
+
+    tasks = []
+    for q, y_q in targets.items():
+        folds = StratifiedKFold(n_splits=n_splits, shuffle=True, random_state=seed).split(np.zeros(len(y_q)), y_q)
+        for fold, (train, test) in enumerate(folds):
+            for name, (estimator_class, settings, path_param, path_values) in grid.items():
+                for setting in settings:
+                    tasks.append((q, name, estimator_class, setting, path_param, path_values, fold, train, test))
+
+    arrays = {'data': X.data, 'indices': X.indices, 'indptr': X.indptr}
+    arrays.update({f"y{q}": y_q for q, y_q in targets.items()})
+    blocks, descriptors = _share(arrays)
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context('fork' if 'fork' in methods else None)
+    try:
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=context,
+                                 initializer=_attach, initargs=(descriptors, X.shape)) as pool:
+            futures = [pool.submit(_fit_path, *task) for task in tasks]
+            rows = [row for future in futures for row in future.result()]
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+    return pd.DataFrame(rows)
+
+
+def summarize(results, metric='balanced_accuracy'):
+    """
+    Mean and SD over folds per configuration, best ``metric`` first
+    """
+    summary = (results.groupby(['q', 'estimator', 'params'], sort=False)
+               .agg(**{metric: (metric, 'mean'), f"{metric}_sd": (metric, 'std'),
+                       'f1_macro': ('f1_macro', 'mean'),
+                       'fit_time': ('fit_time', 'mean'), 'predict_time': ('predict_time', 'mean')}))
+    return summary.sort_values(metric, ascending=False).reset_index()
@@ -0,0 +1,177 @@
+"""
+Study pipeline runner: stages as nodes of a DAG with cached results.
+
+A node is a function ``func(out_dir, *inputs, **params)``. ``inputs`` are
+the return values of other nodes, and files written to ``out_dir`` are the
+node's outputs. Every node gets a key hashed from its function source, the
+sources of its module and of the local modules it imports (at the top of its
+module or lazily in its body, and what those import in turn), its params, the
+content of its watched ``files`` and the keys of its inputs.
+Results and output files are stored under that key in the cache:
+
+- a node whose key is already cached is skipped (its result is reused)
+- changing a param or input re-runs that node and everything downstream
+- nodes whose inputs are ready run concurrently in a process pool
+
+Output files of every node are copied to ``output_dir/<node name>/``.
+"""
+import inspect
+import multiprocessing
+import os
+import pickle
+import shutil
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from cohort_loader import file_hash
+from figure_cache import content_hash, module_sources
+from instrumentation import collect, stage
+
+CACHE_DIR = ".pipeline_cache"
+
+Node = namedtuple('Node', ['name', 'func', 'inputs', 'params', 'files'], defaults=((), {}, ()))
+
+
+def _source(func):
+    try:
+        return inspect.getsource(func)
+    except (OSError, TypeError):
+        return f"{func.__module__}.{func.__qualname__}"
+
+
+def _execute(name, func, params, input_paths, node_path):
+    """
+    Run one node in a worker and store its result and files under node_path;
+    returns the stage record
+    """
+    inputs = []
+    for path in input_paths:
+        with open(path, 'rb') as f:
+            inputs.append(pickle.load(f))
+    tmp_path = f"{node_path}.{os.getpid()}.tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    out_dir = os.path.join(tmp_path, 'files')
+    try:
+        os.makedirs(out_dir)
+        with stage(name, rows_in=next((len(x) for x in inputs if hasattr(x, '__len__')), None),
+                   emit=False) as record:
+            result = func(out_dir, *inputs, **params)
+            if hasattr(result, '__len__'):
+                record.rows_out = len(result)
+        with open(os.path.join(tmp_path, 'result.pkl'), 'wb') as f:
+            pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+        shutil.rmtree(node_path, ignore_errors=True)
+        os.replace(tmp_path, node_path)
+    finally:
+        # Partial outputs of a failed node
+        shutil.rmtree(tmp_path, ignore_errors=True)
+    return record
+
+
+class Pipeline:
+    """
+    DAG of nodes with content-addressed results
+    """
+
+    def __init__(self, nodes, output_dir='results', cache_dir=CACHE_DIR, max_workers=None):
+        self.nodes = {node.name: node for node in nodes}
+        self.output_dir = output_dir
+        self.cache_dir = cache_dir
+        self.max_workers = max_workers
+        self.keys = {}
+        for node in nodes:
+            missing = [name for name in node.inputs if name not in self.nodes]
+            if missing:
+                raise ValueError(f"Node '{node.name}' depends on unknown nodes {missing}")
+        self.order = self._topological_order()
+
+    def _topological_order(self):
+        order, state = [], {}
+
+        def visit(name, path):
+            if state.get(name) == 'done':
+                return
+            if state.get(name) == 'visiting':
+                raise ValueError(f"Cycle in pipeline: {' -> '.join(path + [name])}")
+            state[name] = 'visiting'
+            for dep in self.nodes[name].inputs:
+                visit(dep, path + [name])
+            state[name] = 'done'
+            order.append(name)
+
+        for name in self.nodes:
+            visit(name, [])
+        return order
+
+    def _upstream(self, targets):
+        needed, stack = set(), list(targets)
+        while stack:
+            name = stack.pop()
+            if name not in needed:
+                needed.add(name)
+                stack.extend(self.nodes[name].inputs)
+        return [name for name in self.order if name in needed]
+
+    def key(self, name):
+        """
+        Content key of a node (computed from the keys of its inputs)
+        """
+        if name not in self.keys:
+            node = self.nodes[name]
+            self.keys[name] = content_hash(
+                node.name, _source(node.func), module_sources(node.func), node.params,
+                [file_hash(path) for path in node.files],
+                [self.key(dep) for dep in node.inputs]
+            )
+        return self.keys[name]
+
+    def _node_path(self, name):
+        return os.path.join(self.cache_dir, f"{name}-{self.key(name)}")
+
+    def result(self, name):
+        """
+        Cached result of a node (after ``run``)
+        """
+        with open(os.path.join(self._node_path(name), 'result.pkl'), 'rb') as f:
+            return pickle.load(f)
+
+    def _publish(self, name):
+        target = os.path.join(self.output_dir, name)
+        files = os.path.join(self._node_path(name), 'files')
+        shutil.rmtree(target, ignore_errors=True)
+        if os.listdir(files):
+            shutil.copytree(files, target)
+
+    def run(self, targets=None):
+        """
+        Run the nodes needed for ``targets`` (default: all). Returns
+        {node name: 'cached' or 'ran'}.
+        """
+        self.keys = {}
+        names = self._upstream(targets or list(self.nodes))
+        os.makedirs(self.cache_dir, exist_ok=True)
+        status = {name: 'cached' for name in names
+                  if os.path.exists(os.path.join(self._node_path(name), 'result.pkl'))}
+        pending = [name for name in names if name not in status]
+
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context('fork' if 'fork' in methods else None)
+        with ProcessPoolExecutor(max_workers=self.max_workers, mp_context=context) as pool:
+            running = {}
+            while pending or running:
+                for name in [n for n in pending if all(dep in status for dep in self.nodes[n].inputs)]:
+                    node = self.nodes[name]
+                    input_paths = [os.path.join(self._node_path(dep), 'result.pkl') for dep in node.inputs]
+                    running[pool.submit(_execute, name, node.func, node.params, input_paths,
+                                        self._node_path(name))] = name
+                    pending.remove(name)
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    collect(future.result())
+                    status[name] = 'ran'
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        for name in names:
+            self._publish(name)
+        return {name: status[name] for name in names}
@@ -0,0 +1,174 @@
+"""
+Preprocessing stage for the transfusion ML model.
+
+The notebook's cleaning steps (drop columns, drop rows missing key values,
+impute SaO2 from SpO2, drop remaining NaNs) and the one-hot
+``ColumnTransformer`` run once per dataset and config. The fitted
+transformer and its output are cached on disk, keyed by a hash of the input
+data, the config and ``PREPROCESSING_VERSION``:
+
+- ``transformer.joblib``: fitted ColumnTransformer (reused for scoring)
+- ``numeric.npy``: float32 numeric block, memory-mapped on load
+- ``onehot.npz``: sparse CSR one-hot block (no dense blow-up for
+  high-cardinality fields such as ``primary_icd_code``)
+- ``target.npy`` and ``meta.json`` (feature names, row ids, config)
+
+Later model fits load the cached matrices instead of rebuilding them.
+"""
+import json
+import os
+import shutil
+from collections import namedtuple
+
+import joblib
+import numpy as np
+from scipy import sparse
+from sklearn.compose import ColumnTransformer
+from sklearn.preprocessing import OneHotEncoder
+
+from figure_cache import content_hash
+
+# Bump when the cleaning steps or the transformer change
+PREPROCESSING_VERSION = 1
+
+CACHE_DIR = ".feature_cache"
+
+DEFAULT_CONFIG = {
+    'target': 'number_of_transfusions',
+    'cols_to_drop': ['bilirubin_direct', 'bilirubin_total', 'weight', 'ldh', 'dod'],
+    'cols_to_check': [
+        'pre_transfusion_hemoglobin', 'baseline_wbc', 'baseline_platelets',
+        'baseline_hemoglobin', 'diuretic_type', 'baseline_hematocrit',
+        'baseline_bp_diastolic', 'baseline_bp_systolic', 'baseline_spo2',
+        'post_transfusion_hemoglobin', 'insurance', 'language',
+        'baseline_creatinine', 'icd_version', 'primary_icd_long_title',
+        'primary_icd_code', 'los_icu_days'
+    ],
+    # Column imputed from another when missing, e.g. SaO2 from SpO2
+    'impute': {'baseline_sao2': 'baseline_spo2'},
+    'drop_after_impute': ['baseline_spo2'],
+    # Drop rows with any remaining NaN (as before the model fit)
+    'dropna': True,
+}
+
+Features = namedtuple('Features', ['numeric', 'onehot', 'target', 'feature_names', 'row_ids',
+                                   'transformer', 'key'])
+
+
+def clean(data, config=None):
+    """
+    Apply the cleaning steps of ``config`` and return a new DataFrame
+    """
+    config = {**DEFAULT_CONFIG, **(config or {})}
+    df = data.drop(columns=[c for c in config['cols_to_drop'] if c in data.columns])
+    check = [c for c in config['cols_to_check'] if c in df.columns]
+    df = df.dropna(subset=check)
+    for col, source in config['impute'].items():
+        if col not in df.columns or source not in df.columns:
+            raise KeyError(f"Columns '{col}' and '{source}' are needed for imputation")
+        df[col] = df[col].fillna(df[source])
+    df = df.drop(columns=[c for c in config['drop_after_impute'] if c in df.columns])
+    if config['dropna']:
+        df = df.dropna()
+    return df[df[config['target']].notna()]
+
+
+def split_columns(X):
+    """
+    Categorical (object, category, bool) and numeric feature columns
+    """
+    cat_cols = X.select_dtypes(include=['object', 'category', 'bool']).columns.tolist()
+    num_cols = X.select_dtypes(include=[np.number]).columns.tolist()
+    return cat_cols, num_cols
+
+
+def make_transformer(cat_cols, num_cols):
+    """
+    Sparse float32 one-hot encoding of the categorical columns; numeric
+    columns pass through
+    """
+    return ColumnTransformer(
+        transformers=[
+            ('cat', OneHotEncoder(handle_unknown='ignore', sparse_output=True, dtype=np.float32), cat_cols),
+            ('num', 'passthrough', num_cols),
+        ],
+        remainder='drop',
+        sparse_threshold=1.0,
+    )
+
+
+def transform(transformer, X):
+    """
+    (numeric float32 array, one-hot CSR matrix) for new rows with a fitted transformer
+    """
+    cat_cols = transformer.transformers_[0][2]
+    num_cols = transformer.transformers_[1][2]
+    onehot = transformer.named_transformers_['cat'].transform(X[cat_cols]).tocsr()
+    numeric = X[num_cols].to_numpy(dtype=np.float32)
+    return numeric, onehot
+
+
+def feature_matrix(features, rows=None):
+    """
+    CSR matrix [one-hot | numeric] (the ColumnTransformer column order)
+    """
+    numeric, onehot = features.numeric, features.onehot
+    if rows is not None:
+        numeric, onehot = numeric[rows], onehot[rows]
+    return sparse.hstack([onehot, sparse.csr_matrix(np.asarray(numeric))], format='csr')
+
+
+def _load(path, key):
+    with open(os.path.join(path, 'meta.json')) as f:
+        meta = json.load(f)
+    return Features(
+        numeric=np.load(os.path.join(path, 'numeric.npy'), mmap_mode='r'),
+        onehot=sparse.load_npz(os.path.join(path, 'onehot.npz')).tocsr(),
+        target=np.load(os.path.join(path, 'target.npy')),
+        feature_names=meta['feature_names'],
+        row_ids=meta['row_ids'],
+        transformer=joblib.load(os.path.join(path, 'transformer.joblib')),
+        key=key,
+    )
+
+
+def build_features(data, config=None, cache_dir=CACHE_DIR, use_cache=True):
+    """
+    Cleaned, encoded feature matrices for ``data`` (cached by data + config).
+
+    The transformer is fitted on all cleaned rows on purpose: one cached
+    matrix then serves every train/test split and CV fold (indexed by row).
+    It only learns the category levels (numeric columns pass through), and a
+    level seen only in held-out rows is an all-zero training column, which
+    gets a zero coefficient under L2 and is never split on by a tree: the
+    same predictions as an encoder fitted on the training rows. A step that
+    learns from values (scaling, imputation) would have to be fitted per split.
+    """
+    config = {**DEFAULT_CONFIG, **(config or {})}
+    key = content_hash(data, config, PREPROCESSING_VERSION)
+    path = os.path.join(cache_dir, key)
+    if use_cache and os.path.exists(os.path.join(path, 'meta.json')):
+        return _load(path, key)
+
+    df = clean(data, config)
+    X = df.drop(columns=[config['target']])
+    cat_cols, num_cols = split_columns(X)
+    transformer = make_transformer(cat_cols, num_cols).fit(X)
+    numeric, onehot = transform(transformer, X)
+    feature_names = [str(name) for name in transformer.get_feature_names_out()]
+
+    # Write into a temporary directory and move it into place
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    os.makedirs(tmp_path, exist_ok=True)
+    np.save(os.path.join(tmp_path, 'numeric.npy'), numeric)
+    sparse.save_npz(os.path.join(tmp_path, 'onehot.npz'), onehot)
+    np.save(os.path.join(tmp_path, 'target.npy'), df[config['target']].to_numpy(dtype=float))
+    joblib.dump(transformer, os.path.join(tmp_path, 'transformer.joblib'))
+    meta = {'version': PREPROCESSING_VERSION, 'config': config, 'feature_names': feature_names,
+            'cat_cols': cat_cols, 'num_cols': num_cols, 'row_ids': df.index.tolist()}
+    with open(os.path.join(tmp_path, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    os.replace(tmp_path, path)
+    return _load(path, key)
@@ -0,0 +1,332 @@
+"""
+Fast data profile (a lightweight replacement for ydata_profiling).
+
+One vectorized pass per chunk collects, for every column:
+
+- dtype, missing count (overall and per level of an optional group column)
+- numeric columns: mean/SD (mergeable moments), min/max, quantiles and a
+  histogram from a quantile sketch, number of distinct values (up to a cap)
+- other columns: level counts (cardinality and most frequent levels)
+
+Profiles of chunks (or files) merge, so large extracts can be profiled with
+``from_csv`` in chunks, optionally on a random sample of rows. The result is
+written as a compact JSON or HTML report.
+
+Whether a column is numeric comes from ``schema`` (see schema.py) and, for
+columns not in it, from the dtype of the first chunk. A column with no
+values yet that gets text in a later chunk is profiled as text from then
+on.
+"""
+import copy
+import html
+import json
+
+import numpy as np
+import pandas as pd
+
+from cohort_loader import text_dtypes
+from group_stats import as_float_matrix
+from schema import SCHEMA
+from streaming_tableone import MISSING_LEVEL, Moments, QuantileSketch
+
+QUANTILES = [0.05, 0.25, 0.5, 0.75, 0.95]
+SPARK = '▁▂▃▄▅▆▇█'
+
+
+class DataProfile:
+    """
+    Mergeable per-column summary of a dataset
+    """
+
+    def __init__(self, group=None, bins=20, sketch_k=512, max_distinct=1000, top=5, schema=SCHEMA):
+        self.group = group
+        self.schema = schema or {}
+        self.bins = bins
+        self.sketch_k = sketch_k
+        self.max_distinct = max_distinct
+        self.top = top
+        self.n_rows = 0
+        self.columns = None
+
+    def _start(self, chunk):
+        self.columns = list(chunk.columns)
+        self.dtypes = {c: str(chunk[c].dtype) for c in self.columns}
+        self.numeric = [c for c in self.columns if self._is_numeric(c, chunk[c])]
+        self.other = [c for c in self.columns if c not in self.numeric]
+        self.n_missing = np.zeros(len(self.columns), dtype=np.int64)
+        self.group_rows = {}
+        self.group_missing = {}
+        self.moments = Moments(len(self.numeric))
+        self.minimum = np.full(len(self.numeric), np.inf)
+        self.maximum = np.full(len(self.numeric), -np.inf)
+        self.sketches = [QuantileSketch(self.sketch_k) for _ in self.numeric]
+        # Distinct numeric values, or None once there are more than max_distinct
+        self.distinct = [set() for _ in self.numeric]
+        self.counts = {c: {} for c in self.other}
+
+    def _is_numeric(self, col, values):
+        if col in self.schema:
+            return self.schema[col] != 'category'
+        return pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values)
+
+    def _promote(self, col, values):
+        """
+        Profile a numeric column that gets text values as a text column
+        """
+        j = self.numeric.index(col)
+        if self.moments.n[j]:
+            raise ValueError(f"Column '{col}' has numbers in one chunk and text in another; "
+                             f"give its type in the schema")
+        del self.numeric[j]
+        del self.sketches[j]
+        del self.distinct[j]
+        self.moments.n, self.moments.mean, self.moments.m2 = (
+            np.delete(a, j) for a in (self.moments.n, self.moments.mean, self.moments.m2))
+        self.minimum = np.delete(self.minimum, j)
+        self.maximum = np.delete(self.maximum, j)
+        self.other = [c for c in self.columns if c not in self.numeric]
+        self.counts[col] = {}
+        self.dtypes[col] = str(values.dtype)
+
+    def update(self, chunk):
+        """
+        Add a chunk of rows to the profile
+        """
+        if self.columns is None:
+            self._start(chunk)
+        chunk = chunk[self.columns]
+        self.n_rows += len(chunk)
+        for col in [c for c in self.numeric if not pd.api.types.is_numeric_dtype(chunk[c])]:
+            if (pd.to_numeric(chunk[col], errors='coerce').isna() & chunk[col].notna()).any():
+                self._promote(col, chunk[col])
+
+        missing = chunk.isna().to_numpy()
+        self.n_missing += missing.sum(axis=0)
+        if self.group is not None:
+            keys = chunk[self.group].astype(object).where(chunk[self.group].notna(), MISSING_LEVEL)
+            grouped = pd.DataFrame(missing).groupby(keys.to_numpy(), sort=False)
+            sums, sizes = grouped.sum(), grouped.size()
+            for level in sums.index:
+                self.group_rows[level] = self.group_rows.get(level, 0) + int(sizes[level])
+                self.group_missing[level] = (self.group_missing.get(level, 0)
+                                             + sums.loc[level].to_numpy(dtype=np.int64))
+
+        if self.numeric:
+            x = as_float_matrix(chunk, self.numeric)
+            self.moments.update(x)
+            with np.errstate(invalid='ignore'):
+                self.minimum = np.fmin(self.minimum, np.nanmin(x, axis=0, initial=np.inf))
+                self.maximum = np.fmax(self.maximum, np.nanmax(x, axis=0, initial=-np.inf))
+            for j, sketch in enumerate(self.sketches):
+                sketch.update(x[:, j])
+                if self.distinct[j] is not None:
+                    self.distinct[j].update(np.unique(x[:, j][~np.isnan(x[:, j])]).tolist())
+                    if len(self.distinct[j]) > self.max_distinct:
+                        self.distinct[j] = None
+
+        for col, counts in self.counts.items():
+            for level, count in chunk[col].value_counts(sort=False).items():
+                if count:
+                    counts[level] = counts.get(level, 0) + int(count)
+        return self
+
+    def merge(self, other):
+        """
+        Merge the profile of another chunk of the same columns
+        """
+        if other.columns is None:
+            return self
+        if self.columns is None:
+            self._start(pd.DataFrame({c: pd.Series(dtype=other.dtypes[c]) for c in other.columns}))
+        for col in [c for c in self.numeric if c not in other.numeric]:
+            self._promote(col, pd.Series(dtype=other.dtypes[col]))
+        if any(c not in self.numeric for c in other.numeric):
+            other = copy.deepcopy(other)
+            for col in [c for c in other.numeric if c not in self.numeric]:
+                other._promote(col, pd.Series(dtype=self.dtypes[col]))
+        self.n_rows += other.n_rows
+        self.n_missing += other.n_missing
+        for level, rows in other.group_rows.items():
+            self.group_rows[level] = self.group_rows.get(level, 0) + rows
+            self.group_missing[level] = self.group_missing.get(level, 0) + other.group_missing[level]
+        self.moments.merge(other.moments)
+        self.minimum = np.fmin(self.minimum, other.minimum)
+        self.maximum = np.fmax(self.maximum, other.maximum)
+        for j, sketch in enumerate(self.sketches):
+            sketch.merge(other.sketches[j])
+            if self.distinct[j] is None or other.distinct[j] is None:
+                self.distinct[j] = None
+            else:
+                self.distinct[j] |= other.distinct[j]
+                if len(self.distinct[j]) > self.max_distinct:
+                    self.distinct[j] = None
+        for col, counts in self.counts.items():
+            for level, count in other.counts[col].items():
+                counts[level] = counts.get(level, 0) + count
+        return self
+
+    @classmethod
+    def from_frame(cls, df, sample=None, seed=0, **kwargs):
+        """
+        Profile a DataFrame, optionally a random sample of ``sample`` rows
+        (int) or of a fraction of the rows (float)
+        """
+        if isinstance(sample, float):
+            df = df.sample(frac=sample, random_state=seed)
+        elif sample is not None and sample < len(df):
+            df = df.sample(n=sample, random_state=seed)
+        return cls(**kwargs).update(df)
+
+    @classmethod
+    def from_csv(cls, path, chunksize=100_000, usecols=None, prepare=None, sample=None, seed=0, **kwargs):
+        """
+        Profile a CSV file in chunks of ``chunksize`` rows.
+
+        ``sample`` keeps a random fraction of the rows of every chunk (float)
+        or, as in ``from_frame``, a random sample of that many rows of the
+        file (int; held in memory until the end). ``prepare`` is applied to
+        the rows before they are profiled.
+        """
+        profile = cls(**kwargs)
+        rng = np.random.default_rng(seed)
+        # Text columns of the schema are read as text in every chunk
+        dtype = text_dtypes(path, profile.schema)
+        reservoir, keys = None, np.empty(0)
+        for chunk in pd.read_csv(path, chunksize=chunksize, usecols=usecols, low_memory=False, dtype=dtype):
+            if isinstance(sample, float):
+                chunk = chunk[rng.random(len(chunk)) < sample]
+            elif sample is not None:
+                # Bottom-k sample: the ``sample`` rows with the smallest random keys so far
+                reservoir = chunk if reservoir is None else pd.concat([reservoir, chunk], ignore_index=True)
+                keys = np.concatenate([keys, rng.random(len(chunk))])
+                keep = np.sort(np.argsort(keys, kind='stable')[:sample])
+                reservoir, keys = reservoir.iloc[keep].reset_index(drop=True), keys[keep]
+                continue
+            profile.update(prepare(chunk) if prepare else chunk)
+        if reservoir is not None:
+            profile.update(prepare(reservoir) if prepare else reservoir)
+        return profile
+
+    def _histogram(self, j):
+        values, weights = self.sketches[j].weighted_items()
+        if not len(values):
+            return [], []
+        counts, edges = np.histogram(values, bins=self.bins, range=(self.minimum[j], self.maximum[j]),
+                                     weights=weights)
+        return np.round(counts).astype(int).tolist(), edges.tolist()
+
+    def _cardinality(self, col):
+        if col in self.counts:
+            return len(self.counts[col])
+        distinct = self.distinct[self.numeric.index(col)]
+        return None if distinct is None else len(distinct)
+
+    def missing_table(self):
+        """
+        Missing count and percentage per column, most missing first
+        """
+        table = pd.DataFrame({
+            'n_missing': self.n_missing,
+            'missing_%': (self.n_missing / max(self.n_rows, 1) * 100).round(2)
+        }, index=self.columns)
+        return table.sort_values('missing_%', ascending=False, kind='mergesort')
+
+    def missing_by_group(self, columns=None):
+        """
+        Percentage missing per level of the group column (rows) and column
+        """
+        if self.group is None:
+            raise ValueError("The profile was built without a group column")
+        levels = sorted(self.group_rows, key=str)
+        table = pd.DataFrame([self.group_missing[level] for level in levels],
+                             index=pd.Index(levels, name=self.group), columns=self.columns)
+        table = table.div([self.group_rows[level] for level in levels], axis=0) * 100
+        table.insert(0, 'total_rows', [self.group_rows[level] for level in levels])
+        return table if columns is None else table[['total_rows'] + list(columns)]
+
+    def summary(self):
+        """
+        One row per column: dtype, missingness, cardinality and numeric statistics
+        """
+        rows = []
+        std = self.moments.std
+        for i, col in enumerate(self.columns):
+            row = {'column': col, 'dtype': self.dtypes[col], 'n_missing': int(self.n_missing[i]),
+                   'missing_%': round(self.n_missing[i] / max(self.n_rows, 1) * 100, 2),
+                   'distinct': self._cardinality(col)}
+            if col in self.counts:
+                top = sorted(self.counts[col].items(), key=lambda kv: -kv[1])[:self.top]
+                row['top'] = ', '.join(f"{level} ({count})" for level, count in top)
+            else:
+                j = self.numeric.index(col)
+                row.update(mean=self.moments.mean[j] if self.moments.n[j] else np.nan, std=std[j],
+                           min=self.minimum[j] if self.moments.n[j] else np.nan,
+                           max=self.maximum[j] if self.moments.n[j] else np.nan)
+                for q, value in zip(QUANTILES, np.atleast_1d(self.sketches[j].quantile(QUANTILES))):
+                    row[f'p{int(q * 100)}'] = value
+                counts, _ = self._histogram(j)
+                if counts and max(counts):
+                    row['histogram'] = ''.join(SPARK[int(c / max(counts) * (len(SPARK) - 1))] for c in counts)
+            rows.append(row)
+        return pd.DataFrame(rows).set_index('column')
+
+    def alerts(self, max_missing_pct=50.0, max_levels=50):
+        """
+        Warnings for a quick data gate: heavy missingness, constant and
+        high-cardinality columns
+        """
+        messages = []
+        for col, row in self.summary().iterrows():
+            if row['missing_%'] > max_missing_pct:
+                messages.append(f"{col}: {row['missing_%']:.1f}% missing")
+            if row['distinct'] == 1:
+                messages.append(f"{col}: constant")
+            if col in self.counts and row['distinct'] > max_levels:
+                messages.append(f"{col}: {row['distinct']} distinct levels")
+        return messages
+
+    def to_dict(self):
+        columns = {}
+        summary = self.summary()
+        for col, row in summary.iterrows():
+            entry = {k: (None if pd.isna(v) else v) for k, v in row.items() if k != 'histogram'}
+            if col in self.numeric:
+                counts, edges = self._histogram(self.numeric.index(col))
+                entry['histogram'] = {'counts': counts, 'edges': edges}
+            else:
+                levels = sorted(self.counts[col].items(), key=lambda kv: -kv[1])[:50]
+                entry['levels'] = {str(k): v for k, v in levels}
+            columns[col] = entry
+        result = {'n_rows': self.n_rows, 'n_columns': len(self.columns), 'columns': columns,
+                  'alerts': self.alerts()}
+        if self.group is not None:
+            by_group = self.missing_by_group()
+            result['missing_by_group'] = {
+                'group': self.group,
+                'percent': {str(level): row.round(2).to_dict() for level, row in by_group.iterrows()}
+            }
+        return result
+
+    def to_json(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2, default=lambda v: v.item() if hasattr(v, 'item') else str(v))
+
+    def to_html(self, path, title="Data Profile"):
+        parts = [
+            f"<html><head><meta charset='utf-8'><title>{html.escape(title)}</title>",
+            "<style>body{font-family:sans-serif;font-size:13px}"
+            "table{border-collapse:collapse}td,th{border:1px solid #ccc;padding:2px 6px}</style>",
+            f"</head><body><h1>{html.escape(title)}</h1>",
+            f"<p>{self.n_rows:,} rows, {len(self.columns)} columns</p>",
+        ]
+        alerts = self.alerts()
+        if alerts:
+            parts.append("<h2>Alerts</h2><ul>" + ''.join(f"<li>{html.escape(a)}</li>" for a in alerts) + "</ul>")
+        parts.append("<h2>Columns</h2>")
+        parts.append(self.summary().to_html(float_format=lambda v: f"{v:.4g}", na_rep=''))
+        if self.group is not None:
+            parts.append(f"<h2>Missing (%) by {html.escape(str(self.group))}</h2>")
+            parts.append(self.missing_by_group().to_html(float_format=lambda v: f"{v:.1f}"))
+        parts.append("</body></html>")
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(parts))
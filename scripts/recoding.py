@@ -0,0 +1,94 @@
+"""
+Table-driven recoding of free-text categories (race, language) into groups.
+
+A mapping is an ordered dict of ``group -> keywords``. A value belongs to the
+first group with a keyword contained in its upper-cased text, otherwise to
+the default group. Matching runs once per distinct value, and the result is
+broadcast to all rows through the category codes.
+"""
+import re
+
+import numpy as np
+import pandas as pd
+
+# Race/ethnicity keyword table shared by all scripts
+RACE_GROUPS = {
+    'White': ['WHITE', 'PORTUGUESE'],
+    'Black/African American': ['BLACK', 'AFRICAN', 'CAPE VERDEAN', 'CARIBBEAN'],
+    'Hispanic/Latino': ['HISPANIC', 'LATINO', 'SOUTH AMERICAN'],
+    'Asian': ['ASIAN', 'CHINESE', 'KOREAN'],
+    'Native American': ['AMERICAN INDIAN', 'ALASKA NATIVE', 'NATIVE HAWAIIAN', 'PACIFIC ISLANDER'],
+    'Unknown': ['UNKNOWN', 'UNABLE', 'DECLINED'],
+}
+RACE_ORDER = [
+    'White', 'Black/African American', 'Hispanic/Latino', 'Asian',
+    'Native American', 'Other', 'Unknown'
+]
+
+# Labels used in the EquiFlow diagram (Other and Unknown are merged)
+EQUIFLOW_RACE_LABELS = {
+    'White': 'Caucasian',
+    'Black/African American': 'African American',
+    'Hispanic/Latino': 'Hispanic',
+    'Asian': 'Asian',
+    'Native American': 'Native American',
+    'Other': 'Other/Unknown',
+    'Unknown': 'Other/Unknown',
+}
+EQUIFLOW_RACE_ORDER = [
+    'Caucasian', 'African American', 'Other/Unknown', 'Hispanic', 'Asian', 'Native American'
+]
+
+LANGUAGE_GROUPS = {
+    'English': ['ENGLISH'],
+}
+LANGUAGE_ORDER = ['English', 'Non-English', 'Unknown']
+
+
+def recode_categories(values, groups, default='Other', missing='Unknown', labels=None, order=None):
+    """
+    Recode ``values`` into groups using a keyword table.
+
+    ``labels`` optionally renames (or merges) groups after matching and
+    ``order`` gives the category order of the result. Returns an ordered
+    ``pd.Categorical``.
+    """
+    cat = pd.Categorical(values)
+    categories = pd.Index(cat.categories).astype(str).str.upper()
+
+    # Match every distinct value against the groups, first match wins
+    matched = np.full(len(categories), default, dtype=object)
+    unassigned = np.ones(len(categories), dtype=bool)
+    for group, keywords in groups.items():
+        pattern = '|'.join(re.escape(k.upper()) for k in keywords)
+        hits = unassigned & np.asarray(categories.str.contains(pattern, regex=True), dtype=bool)
+        matched[hits] = group
+        unassigned &= ~hits
+
+    if labels is not None:
+        matched = np.array([labels.get(g, g) for g in matched], dtype=object)
+        missing = labels.get(missing, missing)
+    if order is None:
+        order = list(dict.fromkeys([labels.get(g, g) if labels else g for g in groups] + [default, missing]))
+
+    # Broadcast through the category codes; code -1 marks missing values
+    position = {label: i for i, label in enumerate(order)}
+    lookup = np.array([position[g] for g in matched] + [position[missing]], dtype=np.int32)
+    codes = lookup[cat.codes]
+    return pd.Categorical.from_codes(codes, categories=order, ordered=True)
+
+
+def recode_race(values, labels=None, order=RACE_ORDER):
+    """
+    Recode detailed race/ethnicity strings into the shared race groups
+    """
+    return recode_categories(values, RACE_GROUPS, default='Other', missing='Unknown',
+                             labels=labels, order=order)
+
+
+def recode_language(values):
+    """
+    Recode primary language into English / Non-English / Unknown
+    """
+    return recode_categories(values, LANGUAGE_GROUPS, default='Non-English', missing='Unknown',
+                             order=LANGUAGE_ORDER)
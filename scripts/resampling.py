@@ -0,0 +1,187 @@
+"""
+Bootstrap confidence intervals and permutation p-values for two-group
+effect sizes (e.g. Early vs Late transfusion).
+
+Resamples are drawn as NumPy index matrices, a chunk of resamples at a time
+so memory stays below ``max_bytes``. Means of 0/1 outcomes skip the index
+matrices and draw the resampled event counts directly (binomial for the
+bootstrap, hypergeometric for permutations), which is equivalent. Each
+chunk has its own seed spawned from one ``SeedSequence``, so results are
+reproducible and do not depend on the number of worker processes.
+"""
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+STATISTICS = {
+    'mean': lambda values: values.mean(axis=1),
+    'median': lambda values: np.median(values, axis=1),
+}
+
+
+def _check(statistic, n_resamples):
+    if statistic not in STATISTICS:
+        raise ValueError(f"Unknown statistic '{statistic}'; use one of {sorted(STATISTICS)}")
+    if n_resamples < 1:
+        raise ValueError(f"n_resamples must be at least 1, got {n_resamples}")
+
+
+def _chunks(n_resamples, n_rows, max_bytes):
+    # int32 index matrix plus gathered values: roughly 12 bytes per cell
+    per_chunk = max(1, int(max_bytes // (12 * max(n_rows, 1))))
+    sizes = [per_chunk] * (n_resamples // per_chunk)
+    if n_resamples % per_chunk:
+        sizes.append(n_resamples % per_chunk)
+    return sizes
+
+
+def _is_binary(values):
+    return bool(np.isin(values, (0, 1)).all())
+
+
+def _bootstrap_chunk(a, b, statistic, size, seed):
+    """
+    Effect (stat(a) - stat(b)) for ``size`` bootstrap resamples, each group
+    resampled with replacement within itself
+    """
+    rng = np.random.default_rng(seed)
+    if statistic == 'mean' and _is_binary(a) and _is_binary(b):
+        # The bootstrap mean of a 0/1 outcome is a binomial proportion
+        return (rng.binomial(len(a), a.mean(), size) / len(a)
+                - rng.binomial(len(b), b.mean(), size) / len(b))
+    stat = STATISTICS[statistic]
+    stat_a = stat(a[rng.integers(0, len(a), size=(size, len(a)), dtype=np.int32)])
+    stat_b = stat(b[rng.integers(0, len(b), size=(size, len(b)), dtype=np.int32)])
+    return stat_a - stat_b
+
+
+def _permutation_chunk(pooled, n_a, statistic, size, seed):
+    """
+    Effect for ``size`` random relabelings of the pooled values
+    """
+    rng = np.random.default_rng(seed)
+    n_b = len(pooled) - n_a
+    if statistic == 'mean' and _is_binary(pooled):
+        # Events falling in group a under relabeling are hypergeometric
+        events = int(pooled.sum())
+        in_a = rng.hypergeometric(events, len(pooled) - events, n_a, size)
+        return in_a / n_a - (events - in_a) / n_b
+    stat = STATISTICS[statistic]
+    order = rng.permuted(np.tile(np.arange(len(pooled), dtype=np.int32), (size, 1)), axis=1)
+    values = pooled[order]
+    return stat(values[:, :n_a]) - stat(values[:, n_a:])
+
+
+def _run(tasks, pool):
+    if pool is None:
+        return [func(*args) for func, args in tasks]
+    futures = [pool.submit(func, *args) for func, args in tasks]
+    return [f.result() for f in futures]
+
+
+def _effect_tasks(a, b, statistic, n_resamples, seed, max_bytes):
+    a = np.asarray(a, dtype=float)
+    b = np.asarray(b, dtype=float)
+    a, b = a[~np.isnan(a)], b[~np.isnan(b)]
+    pooled = np.concatenate([a, b])
+
+    sizes = _chunks(n_resamples, len(pooled), max_bytes)
+    seeds = np.random.SeedSequence(seed).spawn(2 * len(sizes))
+    tasks = [(_bootstrap_chunk, (a, b, statistic, size, s))
+             for size, s in zip(sizes, seeds[:len(sizes)])]
+    tasks += [(_permutation_chunk, (pooled, len(a), statistic, size, s))
+              for size, s in zip(sizes, seeds[len(sizes):])]
+    return a, b, tasks, len(sizes)
+
+
+def _summarize(a, b, statistic, results, n_boot_chunks, confidence):
+    stat = STATISTICS[statistic]
+    observed = stat(a[None, :])[0] - stat(b[None, :])[0]
+    boot = np.concatenate(results[:n_boot_chunks])
+    perm = np.concatenate(results[n_boot_chunks:])
+    alpha = (1 - confidence) / 2
+    ci_low, ci_high = np.quantile(boot, [alpha, 1 - alpha])
+    # Two-sided permutation p-value with the +1 correction
+    p_perm = (np.sum(np.abs(perm) >= abs(observed) - 1e-12) + 1) / (len(perm) + 1)
+    return {'n_a': len(a), 'n_b': len(b), 'effect': observed,
+            'ci_low': ci_low, 'ci_high': ci_high, 'p_perm': p_perm}
+
+
+def _make_pool(max_workers):
+    if max_workers == 1:
+        return None
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context('fork' if 'fork' in methods else None)
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=context)
+
+
+def resample_effect(a, b, statistic='mean', n_resamples=10000, confidence=0.95,
+                    seed=42, max_bytes=256 * 2**20, max_workers=1):
+    """
+    Bootstrap CI and permutation p-value for ``stat(a) - stat(b)``.
+
+    ``statistic`` is 'mean' (for 0/1 outcomes this is the risk difference)
+    or 'median'. Missing values are dropped; each group needs at least one
+    value left.
+    """
+    _check(statistic, n_resamples)
+    a, b, tasks, n_boot_chunks = _effect_tasks(a, b, statistic, n_resamples, seed, max_bytes)
+    if len(a) == 0 or len(b) == 0:
+        raise ValueError(f"Both groups need non-missing values, got {len(a)} and {len(b)}")
+    pool = _make_pool(max_workers)
+    try:
+        results = _run(tasks, pool)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    return _summarize(a, b, statistic, results, n_boot_chunks, confidence)
+
+
+def compare_outcomes(df, group, outcomes, by=(), groups=(1, 0), n_resamples=10000,
+                     confidence=0.95, seed=42, max_bytes=256 * 2**20, max_workers=1):
+    """
+    Resampled effect sizes for several outcomes, overall and per subgroup.
+
+    ``outcomes`` maps outcome column to statistic ('mean' or 'median').
+    ``by`` lists columns to stratify on; every level of every column is a
+    subgroup. All chunks of all comparisons share one worker pool. Returns
+    one row per (subgroup, outcome).
+    """
+    for statistic in outcomes.values():
+        _check(statistic, n_resamples)
+    subsets = [('overall', 'All', df)]
+    for col in by:
+        for level, sub in df.groupby(col, observed=True, sort=True):
+            subsets.append((col, level, sub))
+
+    jobs = []
+    all_tasks = []
+    for i, (stratifier, level, sub) in enumerate(subsets):
+        in_a = (sub[group] == groups[0]).to_numpy(dtype=bool, na_value=False)
+        in_b = (sub[group] == groups[1]).to_numpy(dtype=bool, na_value=False)
+        for j, (outcome, statistic) in enumerate(outcomes.items()):
+            values = pd.to_numeric(sub[outcome], errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+            # Distinct seed per comparison, stable across runs
+            a, b, tasks, n_boot = _effect_tasks(values[in_a], values[in_b], statistic,
+                                                n_resamples, [seed, i, j], max_bytes)
+            if len(a) < 2 or len(b) < 2:
+                continue
+            jobs.append((stratifier, level, outcome, statistic, a, b, n_boot,
+                         len(all_tasks), len(all_tasks) + len(tasks)))
+            all_tasks.extend(tasks)
+
+    pool = _make_pool(max_workers)
+    try:
+        results = _run(all_tasks, pool)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    rows = []
+    for stratifier, level, outcome, statistic, a, b, n_boot, start, stop in jobs:
+        row = {'stratifier': stratifier, 'subgroup': level, 'outcome': outcome, 'statistic': statistic}
+        row.update(_summarize(a, b, statistic, results[start:stop], n_boot, confidence))
+        rows.append(row)
+    return pd.DataFrame(rows)
@@ -0,0 +1,98 @@
+"""
+Column types for the transfusion dataset.
+
+``optimize_dtypes`` converts a raw extract to compact types: text fields to
+categoricals, 0/1 flags to nullable Int8, counts and scores to nullable
+Int16, and labs, vitals and durations to float32. ``load_cohort`` applies it
+when the Parquet snapshot is written, so the compact types are stored in the
+snapshot and every script gets them for free. ``memory_report`` compares
+memory use before and after.
+"""
+import hashlib
+import json
+
+import pandas as pd
+
+# Bump when the conversion rules change (part of the snapshot name)
+SCHEMA_VERSION = 2
+
+CATEGORICAL = [
+    'gender', 'race', 'insurance', 'language', 'admission_type',
+    'vasopressor_type', 'diuretic_type', 'dod',
+    'primary_icd_code', 'primary_icd_long_title',
+]
+
+FLAGS = [
+    'ongoing_bleeding', 'heart_disease', 'kidney_disease', 'history_of_bleeding',
+    'sepsis', 'on_vasopressors', 'on_diuretics', 'early_transfusion',
+    'possible_hemolysis', 'in_hospital_mortality',
+]
+
+SMALL_INTEGERS = [
+    'sofa_score', 'number_of_transfusions', 'units_first_transfusion',
+    'total_units_transfused', 'icd_version',
+]
+
+FLOATS = [
+    'age', 'weight',
+    'baseline_hemoglobin', 'pre_transfusion_hemoglobin', 'post_transfusion_hemoglobin',
+    'baseline_wbc', 'baseline_platelets', 'baseline_hematocrit', 'baseline_creatinine',
+    'baseline_spo2', 'baseline_sao2', 'baseline_bp_systolic', 'baseline_bp_diastolic',
+    'time_to_first_transfusion_hours', 'ldh', 'bilirubin_total', 'bilirubin_direct',
+    'los_icu_days', 'los_hospital_days',
+]
+
+# subject_id and hadm_id stay int64
+SCHEMA = {
+    **{col: 'category' for col in CATEGORICAL},
+    **{col: 'Int8' for col in FLAGS},
+    **{col: 'Int16' for col in SMALL_INTEGERS},
+    **{col: 'float32' for col in FLOATS},
+}
+
+
+def schema_key(schema=SCHEMA):
+    """
+    Short hash of a schema (and SCHEMA_VERSION), used in snapshot names
+    """
+    payload = json.dumps(schema, sort_keys=True) + str(SCHEMA_VERSION)
+    return hashlib.blake2b(payload.encode(), digest_size=4).hexdigest()
+
+
+def optimize_dtypes(df, schema=SCHEMA):
+    """
+    Convert the columns of ``df`` listed in ``schema`` to their compact types.
+
+    A column whose values do not fit its type (e.g. a non-integer value in a
+    flag column) is left unchanged.
+    """
+    converted = {}
+    for col, dtype in schema.items():
+        if col not in df.columns or str(df[col].dtype) == dtype:
+            continue
+        values = df[col]
+        try:
+            if dtype == 'category':
+                converted[col] = values.astype('category')
+            else:
+                if values.dtype == object:
+                    values = pd.to_numeric(values)
+                converted[col] = values.astype(dtype)
+        except (TypeError, ValueError):
+            continue
+    return df.assign(**converted) if converted else df
+
+
+def memory_report(before, after):
+    """
+    Memory use per column (bytes, including strings) before and after conversion
+    """
+    report = pd.DataFrame({
+        'dtype_before': before.dtypes.astype(str),
+        'dtype_after': after.dtypes.reindex(before.columns).astype(str),
+        'bytes_before': before.memory_usage(deep=True, index=False),
+        'bytes_after': after.memory_usage(deep=True, index=False).reindex(before.columns),
+    })
+    report.loc['total'] = ['', '', report['bytes_before'].sum(), report['bytes_after'].sum()]
+    report['ratio'] = report['bytes_before'] / report['bytes_after']
+    return report
@@ -0,0 +1,315 @@
+"""
+Scoring with the fitted transfusion model.
+
+``export_model`` writes an artifact directory (``model.joblib`` with the
+fitted ColumnTransformer and estimator, ``model.json`` with the feature
+layout and classes). ``Scorer`` loads it and scores in two modes:
+
+- batch: ``score_csv`` reads an extract in chunks and streams predictions
+  and class probabilities to a Parquet file
+- online: ``serve`` runs a small asyncio HTTP service. Requests are
+  micro-batched, and records are encoded without pandas: the one-hot
+  lookups are precompiled into {category: column index} dicts, and linear
+  models are evaluated directly from their coefficients.
+"""
+import asyncio
+import json
+import os
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from preprocessing import DEFAULT_CONFIG, transform
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+ID_COLUMNS = ['subject_id', 'hadm_id']
+
+
+def export_model(model, transformer, path, config=None, **meta):
+    """
+    Save a fitted estimator and its ColumnTransformer as a scoring artifact
+    """
+    os.makedirs(path, exist_ok=True)
+    tmp_path = os.path.join(path, f"model.joblib.{os.getpid()}.tmp")
+    joblib.dump({'model': model, 'transformer': transformer}, tmp_path)
+    os.replace(tmp_path, os.path.join(path, 'model.joblib'))
+    info = {
+        'estimator': type(model).__name__,
+        'classes': [str(c) for c in model.classes_],
+        'cat_cols': list(transformer.transformers_[0][2]),
+        'num_cols': list(transformer.transformers_[1][2]),
+        'feature_names': [str(name) for name in transformer.get_feature_names_out()],
+        'config': {**DEFAULT_CONFIG, **(config or {})},
+        'exported_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        **meta,
+    }
+    with open(os.path.join(path, 'model.json'), 'w') as f:
+        json.dump(info, f, indent=2, default=str)
+
+
+class Scorer:
+    """
+    Loaded scoring artifact with precompiled one-hot lookups
+    """
+
+    def __init__(self, path):
+        artifact = joblib.load(os.path.join(path, 'model.joblib'))
+        with open(os.path.join(path, 'model.json')) as f:
+            self.info = json.load(f)
+        self.model = artifact['model']
+        self.transformer = artifact['transformer']
+        self.classes = self.info['classes']
+        self.cat_cols = self.info['cat_cols']
+        self.num_cols = self.info['num_cols']
+        self.impute = self.info['config'].get('impute', {})
+
+        # {category: column index} per categorical column, with str() keys as
+        # a fallback for JSON input (e.g. "1" for 1)
+        encoder = self.transformer.named_transformers_['cat']
+        self.lookups = []
+        offset = 0
+        for categories in encoder.categories_:
+            lookup = {value: offset + i for i, value in enumerate(categories)}
+            lookup.update({str(value): offset + i for i, value in enumerate(categories)})
+            self.lookups.append(lookup)
+            offset += len(categories)
+        self.n_onehot = offset
+        # Columns fitted on text categories; CSV chunks must read these as str
+        # (a chunk of all-digit ICD codes would otherwise be parsed as int)
+        self.text_cols = [col for col, categories in zip(self.cat_cols, encoder.categories_)
+                          if any(isinstance(value, str) for value in categories)]
+        self.n_features = offset + len(self.num_cols)
+
+        # Linear models: weights with an extra zero column for unknown categories
+        self.linear = hasattr(self.model, 'coef_')
+        if self.linear:
+            coef = np.atleast_2d(self.model.coef_)
+            self.w_cat = np.hstack([coef[:, :offset], np.zeros((coef.shape[0], 1))])
+            self.w_num = coef[:, offset:]
+            self.intercept = np.atleast_1d(self.model.intercept_)
+
+    def _prepare(self, df):
+        df = df.copy()
+        for col, source in self.impute.items():
+            if col in df.columns and source in df.columns:
+                df[col] = df[col].fillna(df[source])
+        return df
+
+    def score_frame(self, df):
+        """
+        Predictions and class probabilities for a DataFrame; rows with
+        missing model inputs get no prediction
+        """
+        df = self._prepare(df)
+        complete = df[self.cat_cols + self.num_cols].notna().all(axis=1).to_numpy()
+        result = pd.DataFrame(index=df.index)
+        for col in ID_COLUMNS:
+            if col in df.columns:
+                result[col] = df[col]
+        proba = np.full((len(df), len(self.classes)), np.nan)
+        if complete.any():
+            numeric, onehot = transform(self.transformer, df[complete])
+            X = sparse.hstack([onehot, sparse.csr_matrix(numeric)], format='csr')
+            proba[complete] = self.model.predict_proba(X)
+        prediction = np.where(complete, np.asarray(self.classes, dtype=object)[np.nan_to_num(proba).argmax(axis=1)], None)
+        result['prediction'] = pd.Series(prediction, index=df.index, dtype='string')
+        for k, label in enumerate(self.classes):
+            result[f'prob_{label}'] = proba[:, k]
+        return result
+
+    def _encode(self, records):
+        """
+        (category column indices, numeric matrix) for a list of dict records
+        """
+        for record in records:
+            for col, source in self.impute.items():
+                if record.get(col) is None and source in record:
+                    record[col] = record[source]
+        missing = sorted({c for r in records for c in self.num_cols + self.cat_cols if r.get(c) is None})
+        if missing:
+            raise ValueError(f"Missing model inputs: {missing}")
+        unknown = self.n_onehot
+        cat_idx = np.array([[lookup.get(r[col], lookup.get(str(r[col]), unknown))
+                             for col, lookup in zip(self.cat_cols, self.lookups)] for r in records],
+                           dtype=np.int64).reshape(len(records), len(self.cat_cols))
+        numeric = np.array([[r[col] for col in self.num_cols] for r in records],
+                           dtype=float).reshape(len(records), len(self.num_cols))
+        return cat_idx, numeric
+
+    def score_records(self, records):
+        """
+        Score a list of dict records (the online fast path)
+        """
+        cat_idx, numeric = self._encode(records)
+        if self.linear:
+            logits = self.intercept + numeric @ self.w_num.T + self.w_cat[:, cat_idx].sum(axis=2).T
+            if len(self.classes) == 2:
+                p1 = 1 / (1 + np.exp(-logits[:, 0]))
+                proba = np.column_stack([1 - p1, p1])
+            else:
+                logits -= logits.max(axis=1, keepdims=True)
+                proba = np.exp(logits)
+                proba /= proba.sum(axis=1, keepdims=True)
+        else:
+            known = cat_idx < self.n_onehot
+            rows = np.repeat(np.arange(len(records)), known.sum(axis=1))
+            onehot = sparse.csr_matrix((np.ones(len(rows)), (rows, cat_idx[known])),
+                                       shape=(len(records), self.n_onehot))
+            X = sparse.hstack([onehot, sparse.csr_matrix(numeric)], format='csr')
+            proba = self.model.predict_proba(X)
+        return [{'prediction': self.classes[int(np.argmax(p))],
+                 'probabilities': dict(zip(self.classes, p.round(6).tolist()))} for p in proba]
+
+
+def score_csv(scorer, path, out_path, chunksize=100_000):
+    """
+    Score a CSV extract chunk by chunk, streaming the results to Parquet.
+    Returns the number of rows scored.
+    """
+    if pq is None:
+        raise ImportError("pyarrow is required to write Parquet")
+    tmp_path = f"{out_path}.{os.getpid()}.tmp"
+    writer = None
+    n_rows = 0
+    header = pd.read_csv(path, nrows=0).columns
+    dtype = {col: str for col in scorer.text_cols if col in header}
+    try:
+        for chunk in pd.read_csv(path, chunksize=chunksize, low_memory=False, dtype=dtype):
+            table = pa.Table.from_pandas(scorer.score_frame(chunk), preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(tmp_path, table.schema)
+            writer.write_table(table.cast(writer.schema))
+            n_rows += len(chunk)
+    finally:
+        if writer is not None:
+            writer.close()
+    if writer is not None:
+        os.replace(tmp_path, out_path)
+    return n_rows
+
+
+class MicroBatcher:
+    """
+    Collects concurrent requests and scores them together (up to
+    ``max_batch`` records, waiting at most ``max_wait_ms`` for more)
+    """
+
+    def __init__(self, scorer, max_batch=64, max_wait_ms=2.0):
+        self.scorer = scorer
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.queue = asyncio.Queue()
+
+    async def score(self, records):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((records, future))
+        return await future
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            size = len(batch[0][0])
+            deadline = loop.time() + self.max_wait
+            while size < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                batch.append(item)
+                size += len(item[0])
+            records = [r for items, _ in batch for r in items]
+            try:
+                results = self.scorer.score_records(records)
+            except Exception:
+                # Score requests one by one so a bad record only fails its own request
+                for items, future in batch:
+                    try:
+                        future.set_result(self.scorer.score_records(items))
+                    except Exception as item_error:
+                        future.set_exception(item_error)
+                continue
+            start = 0
+            for items, future in batch:
+                future.set_result(results[start:start + len(items)])
+                start += len(items)
+
+
+async def _respond(writer, status, payload):
+    body = json.dumps(payload).encode()
+    reason = {200: 'OK', 400: 'Bad Request', 404: 'Not Found'}[status]
+    writer.write(f"HTTP/1.1 {status} {reason}\r\nContent-Type: application/json\r\n"
+                 f"Content-Length: {len(body)}\r\n\r\n".encode() + body)
+    await writer.drain()
+
+
+async def _handle(reader, writer, batcher):
+    try:
+        while True:
+            request_line = await reader.readline()
+            if not request_line:
+                break
+            headers = {}
+            try:
+                method, target, _ = request_line.decode().split(' ', 2)
+                while True:
+                    line = (await reader.readline()).decode().strip()
+                    if not line:
+                        break
+                    key, _, value = line.partition(':')
+                    headers[key.lower()] = value.strip()
+                length = int(headers.get('content-length', 0))
+                if length < 0:
+                    raise ValueError(f"Invalid Content-Length: {length}")
+            except (ValueError, UnicodeDecodeError) as error:
+                # Malformed request line or headers: the stream cannot be resynchronised
+                await _respond(writer, 400, {'error': f"Malformed request: {error}"})
+                break
+            body = await reader.readexactly(length)
+
+            if method == 'GET' and target == '/health':
+                await _respond(writer, 200, {'status': 'ok', 'estimator': batcher.scorer.info['estimator']})
+            elif method == 'POST' and target == '/score':
+                try:
+                    payload = json.loads(body)
+                    records = payload if isinstance(payload, list) else [payload]
+                    if not all(isinstance(record, dict) for record in records):
+                        raise TypeError("Expected a JSON object or a list of JSON objects")
+                    results = await batcher.score(records)
+                    await _respond(writer, 200, results if isinstance(payload, list) else results[0])
+                except (ValueError, KeyError, TypeError) as error:
+                    await _respond(writer, 400, {'error': str(error)})
+            else:
+                await _respond(writer, 404, {'error': f"{method} {target} not found"})
+            if headers.get('connection', '').lower() == 'close':
+                break
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(scorer, host='127.0.0.1', port=8080, max_batch=64, max_wait_ms=2.0):
+    """
+    HTTP service: POST /score with one JSON record (or a list), GET /health
+    """
+    batcher = MicroBatcher(scorer, max_batch, max_wait_ms)
+    batch_task = asyncio.create_task(batcher.run())
+    server = await asyncio.start_server(lambda r, w: _handle(r, w, batcher), host, port)
+    print(f"Scoring service listening on http://{host}:{port}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        batch_task.cancel()
@@ -0,0 +1,26 @@
+import sys
+from benchmark import SCALES, compare_results, run_benchmarks, write_results
+
+# Stage timings on synthetic cohorts; pass scales as arguments, e.g. 10000 100000
+scales = [int(n) for n in sys.argv[1:]] or SCALES
+RESULTS_PATH = 'benchmark_results.json'
+BASELINE_PATH = None   # e.g. 'benchmark_baseline.json' to flag regressions
+
+# TableOne and the model fit are slow at the largest scales
+SKIP = {'tableone': 100_000, 'model_fit': 1_000_000}
+
+print("=" * 80)
+print("BENCHMARKS (synthetic transfusion cohort)")
+print("=" * 80)
+results = run_benchmarks(scales, skip=SKIP)
+write_results(results, RESULTS_PATH)
+print(f"\n✓ Results saved to: {RESULTS_PATH}")
+
+if BASELINE_PATH:
+    table = compare_results(BASELINE_PATH, RESULTS_PATH)
+    print("\nComparison with baseline:")
+    print(table.to_string(float_format=lambda v: f"{v:.2f}"))
+    if table['regression'].any():
+        print("\n× Regressions found")
+        sys.exit(1)
+print("=" * 80)
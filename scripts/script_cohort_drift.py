@@ -0,0 +1,59 @@
+from cohort_drift import CohortDrift
+from cohort_flow import CohortFlow
+from cohort_loader import load_cohort
+from recoding import recode_language, recode_race
+from tableone_spec import categorical, columns, rename
+
+# Check that the exclusion steps do not shift the cohort: SMDs of every
+# Table One variable between consecutive steps and against the initial cohort
+SMD_THRESHOLD = 0.1
+
+exclusions = [
+    ('baseline_bp_systolic', "missing BP Systolic data", "Complete BP Systolic data"),
+    ('baseline_wbc', "missing WBC", "Complete WBC"),
+    ('pre_transfusion_hemoglobin', "missing pre transfusion hemoglobin", "Complete pre transfusion hemoglobin"),
+    ('post_transfusion_hemoglobin', "missing post transfusion hemoglobin", "Complete post transfusion hemoglobin"),
+    ('diuretic_type', "missing diuretic type", "Complete diuretic type"),
+]
+
+data = load_cohort('transfusion_data.csv')
+data['race_grouped'] = recode_race(data['race'])
+data['language_grouped'] = recode_language(data['language'])
+
+flow = CohortFlow(data, initial_cohort_label="Initial Patient Cohort")
+for keep, reason, label in exclusions:
+    flow.add_exclusion(keep=keep, exclusion_reason=reason, new_cohort_label=label)
+
+drift = CohortDrift(
+    flow,
+    continuous=[c for c in columns if c not in categorical],
+    categorical=categorical
+)
+
+print("=" * 80)
+print("COHORT DRIFT ACROSS EXCLUSION STEPS")
+print("=" * 80)
+print()
+print(flow.counts().to_string(index=False))
+
+for reference, title in [('previous', 'vs previous step'), ('initial', 'vs initial cohort')]:
+    matrix = drift.matrix(reference)
+    matrix.to_csv(f'cohort_smd_{reference}.csv')
+    flagged = matrix.abs().max(axis=1)
+    flagged = flagged[flagged > SMD_THRESHOLD].sort_values(ascending=False)
+    print("\n" + "-" * 80)
+    print(f"|SMD| > {SMD_THRESHOLD} {title}:")
+    print("-" * 80)
+    if flagged.empty:
+        print("  none")
+    for variable, value in flagged.items():
+        print(f"  • {rename.get(variable, variable)}: max |SMD| = {value:.3f}")
+    drift.heatmap(f'cohort_smd_{reference}.png', reference=reference, threshold=SMD_THRESHOLD, rename=rename)
+
+drift.pairwise().to_csv('cohort_smd_pairwise.csv', index=False)
+drift.proportion_deltas('initial').to_csv('cohort_proportion_deltas.csv')
+
+print("\n✓ SMD matrices exported to: cohort_smd_previous.csv, cohort_smd_initial.csv, cohort_smd_pairwise.csv")
+print("✓ Category shifts exported to: cohort_proportion_deltas.csv")
+print("✓ Heatmaps saved as: cohort_smd_previous.png, cohort_smd_initial.png")
+print("=" * 80)
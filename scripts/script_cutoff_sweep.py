@@ -0,0 +1,42 @@
+import numpy as np
+from cohort_loader import load_cohort
+from recoding import recode_race
+from transfusion_timing import CUTOFFS, TimingIndex, cutoff_sweep, plot_sweep
+
+# How much do the Early/Late findings depend on the 6-hour cutoff? Mortality
+# and ICU LOS comparisons for every cutoff from 1 to 48 hours (30-min steps)
+REFERENCE_CUTOFF = 6
+CONTINUOUS = ['los_icu_days']
+WITHIN_HOURS = [1, 3, 6, 12, 24, 48]
+
+df = load_cohort('transfusion_data.csv',
+                 columns=['time_to_first_transfusion_hours', 'in_hospital_mortality', 'race'] + CONTINUOUS)
+df['race_grouped'] = recode_race(df['race'])
+
+print("=" * 80)
+print("TRANSFUSION TIMING - CUTOFF SWEEP")
+print("=" * 80)
+
+# Share transfused within each threshold, overall and per race group
+timing = TimingIndex(df['time_to_first_transfusion_hours'], df['race_grouped'])
+within = timing.table(WITHIN_HOURS)
+print("\nPatients transfused within (%):")
+print(within.round(1).to_string())
+
+sweep = cutoff_sweep(df, CUTOFFS, continuous=CONTINUOUS)
+reference = sweep.loc[float(REFERENCE_CUTOFF)]
+print(f"\nAt the study cutoff ({REFERENCE_CUTOFF}h): mortality {reference['mortality_early']:.1f}% vs "
+      f"{reference['mortality_late']:.1f}% (p = {reference['mortality_p_value']:.4f})")
+
+print(f"\nCutoffs with p < 0.05 (of {len(sweep)} from {CUTOFFS[0]:g}h to {CUTOFFS[-1]:g}h):")
+for name, column in [('mortality', 'mortality_p_value')] + [(c, f"{c}_p_value") for c in CONTINUOUS]:
+    hits = sweep.index[sweep[column] < 0.05]
+    print(f"  • {name}: {', '.join(f'{h:g}h' for h in hits) if len(hits) else 'none'}"
+          f" (min p = {np.nanmin(sweep[column]):.4f} at {sweep[column].idxmin():g}h)")
+
+sweep.to_csv('cutoff_sweep.csv')
+within.to_csv('transfused_within.csv')
+plot_sweep(sweep, 'cutoff_sweep.png', continuous=CONTINUOUS, reference=REFERENCE_CUTOFF)
+print("\n✓ Sweep exported to: cutoff_sweep.csv, transfused_within.csv")
+print("✓ Figure saved as: cutoff_sweep.png")
+print("=" * 80)
@@ -1,12 +1,20 @@
-import numpy as np
-from equiflow import EquiFlow
 import os
 import matplotlib
-import pandas as pd
+from cohort_flow import CohortFlow
+from cohort_loader import load_cohort
+from figure_cache import cached_output, content_hash
+from recoding import EQUIFLOW_RACE_LABELS, EQUIFLOW_RACE_ORDER, recode_race
 matplotlib.use('Agg')
 
+# Columns used by the flow diagram and the exclusion criteria
+flow_columns = [
+    'age', 'gender', 'race', 'sofa_score',
+    'baseline_bp_systolic', 'baseline_wbc', 'baseline_platelets', 'baseline_hemoglobin',
+    'pre_transfusion_hemoglobin', 'post_transfusion_hemoglobin', 'diuretic_type'
+]
+
 # Read the dataset
-data = pd.read_csv("blood_transfusion.csv")
+data = load_cohort("blood_transfusion.csv", columns=flow_columns)
 
 # Print initial cohort size
 print(f"Initial cohort size: {len(data)}")
@@ -17,7 +25,6 @@ output_dir = os.path.abspath("test_output")
 os.makedirs(output_dir, exist_ok=True)
 os.makedirs(os.path.join(output_dir, "imgs"), exist_ok=True)
 
-# Convert max_troponin to numeric before creating EquiFlow instance
 data_processed = data.copy()
 
 
@@ -26,111 +33,74 @@ print(f"Initial data shape: {data_processed.shape}")
 
 print(data_processed['race'].value_counts())
 
-def recode_race(race_value):
-    """
-    Recode detailed race/ethnicity categories into 6 broad groups
-    """
-    if pd.isna(race_value):
-        return 'Other/Unknown'
-    
-    race_upper = str(race_value).upper()
-    
-    # Caucasian/White
-    if 'WHITE' in race_upper or 'PORTUGUESE' in race_upper:
-        return 'Caucasian'
-    
-    # African American
-    elif 'BLACK' in race_upper or 'AFRICAN' in race_upper or 'CAPE VERDEAN' in race_upper or 'CARIBBEAN' in race_upper:
-        return 'African American'
-    
-    # Hispanic
-    elif 'HISPANIC' in race_upper or 'LATINO' in race_upper or 'SOUTH AMERICAN' in race_upper:
-        return 'Hispanic'
-    
-    # Asian
-    elif 'ASIAN' in race_upper or 'CHINESE' in race_upper or 'KOREAN' in race_upper:
-        return 'Asian'
-    
-    # Native American
-    elif 'AMERICAN INDIAN' in race_upper or 'ALASKA NATIVE' in race_upper or 'NATIVE HAWAIIAN' in race_upper or 'PACIFIC ISLANDER' in race_upper:
-        return 'Native American'
-    
-    # Other/Unknown
-    else:
-        return 'Other/Unknown'
-
-# Apply the recoding
-data_processed['race'] = data_processed['race'].apply(recode_race)
-
-# Set categorical order
-eth_order = ['Caucasian', 'African American', 'Other/Unknown', 'Hispanic', 'Asian', 'Native American']
-data_processed['race'] = pd.Categorical(
+# Recode race into 6 broad groups (one keyword match per distinct value)
+data_processed['race'] = recode_race(
     data_processed['race'],
-    categories=eth_order,
-    ordered=True
+    labels=EQUIFLOW_RACE_LABELS,
+    order=EQUIFLOW_RACE_ORDER
 )
 
 # Sort by race
 data_processed = data_processed.sort_values('race', kind='mergesort')
 
-# EXAMPLE 1: Full metrics version
-print("\nCreating EquiFlow instance with ALL metrics...")
-ef_full = EquiFlow(
-    data=data_processed,
-    initial_cohort_label="Initial Patient Cohort",
-    categorical=['gender', 'race'],
-    normal=['age', 'sofa_score'],
-    format_cat='%'
-)
+# Build the exclusion cascade as masks over one base frame
+print("\nBuilding cohort flow...")
+flow = CohortFlow(data_processed, initial_cohort_label="Initial Patient Cohort")
 
 # Add exclusion steps
 print("Adding exclusion criteria...")
 
-ef_full.add_exclusion(
-    mask=~ef_full._dfs[-1]['baseline_bp_systolic'].isna(),
+flow.add_exclusion(
+    keep='baseline_bp_systolic',
     exclusion_reason="missing BP Systolic data",
     new_cohort_label="Complete BP Systolic data"
 )
 
-ef_full.add_exclusion(
-    mask=~ef_full._dfs[-1]['baseline_wbc'].isna(),
+flow.add_exclusion(
+    keep='baseline_wbc',
     exclusion_reason="missing WBC",
     new_cohort_label="Complete WBC"
 )
 
-# ef_full.add_exclusion(
-#     mask=~ef_full._dfs[-1]['baseline_platelets'].isna(),
+# flow.add_exclusion(
+#     keep='baseline_platelets',
 #     exclusion_reason="missing platelets",
 #     new_cohort_label="Complete platelets"
 # )
 
-# ef_full.add_exclusion(
-#     mask=~ef_full._dfs[-1]['baseline_hemoglobin'].isna(),
+# flow.add_exclusion(
+#     keep='baseline_hemoglobin',
 #     exclusion_reason="missing hemoglobin",
 #     new_cohort_label="Complete hemoglobin"
 # )
 
-ef_full.add_exclusion(
-    mask=~ef_full._dfs[-1]['pre_transfusion_hemoglobin'].isna(),
+flow.add_exclusion(
+    keep='pre_transfusion_hemoglobin',
     exclusion_reason="missing pre transfusion hemoglobin",
     new_cohort_label="Complete pre transfusion hemoglobin"
 )
 
-ef_full.add_exclusion(
-    mask=~ef_full._dfs[-1]['post_transfusion_hemoglobin'].isna(),
+flow.add_exclusion(
+    keep='post_transfusion_hemoglobin',
     exclusion_reason="missing post transfusion hemoglobin",
     new_cohort_label="Complete post transfusion hemoglobin"
 )
 
-ef_full.add_exclusion(
-    mask=~ef_full._dfs[-1]['diuretic_type'].isna(),
+flow.add_exclusion(
+    keep='diuretic_type',
     exclusion_reason="missing diuretic type",
     new_cohort_label="Complete diuretic type"
 )
 
-# Generate the full flow diagram
-print("Generating flow diagram with ALL metrics...")
-ef_full.plot_flows(
+print(flow.counts().to_string(index=False))
+
+# Diagram settings (part of the cache key together with the cohort and masks)
+ef_settings = dict(
+    categorical=['gender', 'race'],
+    normal=['age', 'sofa_score'],
+    format_cat='%'
+)
+plot_settings = dict(
     output_folder=output_dir,
     output_file="v3_blood_transfusion_case_study",
     plot_dists=True,
@@ -140,5 +110,25 @@ ef_full.plot_flows(
     box_height=1.5,
     display_flow_diagram=True
 )
+diagram_pdf = os.path.join(output_dir, "v3_blood_transfusion_case_study.pdf")
+diagram_key = content_hash(
+    data_processed, flow.counts(), [flow.mask(i) for i in range(1, len(flow) + 1)],
+    ef_settings, plot_settings
+)
+
+
+def build_diagram():
+    # EXAMPLE 1: Full metrics version
+    print("\nCreating EquiFlow instance with ALL metrics...")
+    ef_full = flow.to_equiflow(**ef_settings)
+
+    # Generate the full flow diagram
+    print("Generating flow diagram with ALL metrics...")
+    ef_full.plot_flows(**plot_settings)
+
+
+# Only re-render the diagram when the cohort, exclusions or settings changed
+if not cached_output(diagram_pdf, diagram_key, build_diagram):
+    print("\nFlow diagram inputs unchanged, reusing existing diagram")
 
-print(f"Full metrics diagram saved to {output_dir}/v8_blood_tr ansfusion_case_study.pdf")
\ No newline at end of file
+print(f"Full metrics diagram saved to {diagram_pdf}")
\ No newline at end of file
@@ -0,0 +1,19 @@
+from cohort_loader import load_cohort
+from schema import memory_report
+
+# Memory use of the cohort frame with raw CSV types vs the compact schema
+DATA_PATH = 'transfusion_data.csv'
+
+raw = load_cohort(DATA_PATH, schema=None)
+compact = load_cohort(DATA_PATH)
+report = memory_report(raw, compact)
+
+print("=" * 80)
+print("COHORT MEMORY: raw CSV types vs compact schema")
+print("=" * 80)
+print(report.to_string(float_format=lambda v: f"{v:.1f}"))
+
+total = report.loc['total']
+print(f"\nTotal: {total['bytes_before'] / 2**20:.2f} MB -> {total['bytes_after'] / 2**20:.2f} MB "
+      f"({total['ratio']:.1f}x smaller)")
+print("=" * 80)
@@ -0,0 +1,30 @@
+import warnings
+from cohort_loader import load_cohort
+from model_selection import run_grid, summarize
+from preprocessing import build_features, feature_matrix
+warnings.filterwarnings('ignore')
+
+# Stratified K-fold CV over bin counts, estimators and hyperparameters
+DATA_PATH = 'blood_transfusion.csv'
+BINS = (4, 3, 2)
+N_SPLITS = 5
+MAX_WORKERS = 4
+
+features = build_features(load_cohort(DATA_PATH))
+X = feature_matrix(features)
+
+print("=" * 80)
+print("MODEL SELECTION: number_of_transfusions (quantile bins)")
+print("=" * 80)
+print(f"\nFeatures: {X.shape[0]} rows x {X.shape[1]} columns ({X.nnz} non-zero)")
+
+results = run_grid(X, features.target.clip(min=0), bins=BINS, n_splits=N_SPLITS, max_workers=MAX_WORKERS)
+results.to_csv('model_selection_results.csv', index=False)
+
+summary = summarize(results)
+summary.to_csv('model_selection_summary.csv', index=False)
+print("\nTop configurations (mean over folds):")
+print(summary.head(10).to_string(index=False, float_format=lambda v: f"{v:.3f}"))
+
+print("\n✓ Results saved to: model_selection_results.csv, model_selection_summary.csv")
+print("=" * 80)
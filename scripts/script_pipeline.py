@@ -0,0 +1,47 @@
+import sys
+import study_stages as stages
+from instrumentation import records
+from pipeline import Node, Pipeline
+
+# Full study as a DAG; unchanged stages are reused from .pipeline_cache
+DATA_PATH = 'transfusion_data.csv'
+OUTPUT_DIR = 'results'
+MAX_WORKERS = 4
+
+nodes = [
+    Node('load', stages.load, params={'path': DATA_PATH}, files=[DATA_PATH]),
+    Node('recode', stages.recode, inputs=['load']),
+    Node('flow', stages.exclusion_flow, inputs=['load'], params={'exclusions': stages.EXCLUSIONS}),
+    Node('tableone', stages.table_one, inputs=['recode']),
+    Node('plots', stages.key_plots, inputs=['load'], params={'dpi': 300}),
+    Node('profile', stages.profile, inputs=['recode'], params={'group': 'race_grouped'}),
+    Node('train', stages.train, inputs=['load'], params={'C': 1.0}),
+]
+
+# Optional node names to run (with their dependencies), e.g. "tableone plots"
+targets = sys.argv[1:] or None
+
+pipeline = Pipeline(nodes, output_dir=OUTPUT_DIR, max_workers=MAX_WORKERS)
+status = pipeline.run(targets)
+
+print("=" * 80)
+print("TRANSFUSION STUDY PIPELINE")
+print("=" * 80)
+timings = {r.name: r for r in records}
+for name, state in status.items():
+    record = timings.get(name)
+    timing = ""
+    if record is not None:
+        memory = f", +{record.rss_delta_mb:.0f} MB RSS" if record.rss_delta_mb is not None else ""
+        timing = f" ({record.wall_s:.1f} s{memory})"
+    print(f"  • {name:10s} {state}{timing}")
+
+if 'flow' in status:
+    print("\nCohort flow:")
+    print(pipeline.result('flow').to_string(index=False))
+if 'train' in status:
+    print("\nModel:")
+    print(pipeline.result('train').to_string())
+
+print(f"\n✓ Outputs written to: {OUTPUT_DIR}/")
+print("=" * 80)
@@ -0,0 +1,36 @@
+import time
+from cohort_loader import load_cohort
+from profiling import DataProfile
+from recoding import recode_race
+
+# Quick data profile and gate for the cohort extract (replaces ydata_profiling)
+DATA_PATH = 'transfusion_data.csv'
+SAMPLE = None          # e.g. 0.2 to profile a 20% sample
+MAX_MISSING_PCT = 50.0
+
+start = time.perf_counter()
+df = load_cohort(DATA_PATH)
+df['race_grouped'] = recode_race(df['race'])
+
+profile = DataProfile.from_frame(df, group='race_grouped', sample=SAMPLE)
+
+print("=" * 80)
+print("DATA PROFILE")
+print("=" * 80)
+print(f"\n{profile.n_rows:,} rows, {len(profile.columns)} columns")
+
+print("\nMissing values (top 15):")
+print(profile.missing_table().head(15))
+
+print("\nSaO2 missingness by race (%):")
+print(profile.missing_by_group(['baseline_sao2']).round(1))
+
+alerts = profile.alerts(max_missing_pct=MAX_MISSING_PCT)
+print("\nAlerts:")
+for message in alerts or ["none"]:
+    print(f"  • {message}")
+
+profile.to_html('profile-report.html')
+profile.to_json('profile-report.json')
+print(f"\n✓ Report saved to: profile-report.html, profile-report.json ({time.perf_counter() - start:.1f}s)")
+print("=" * 80)
@@ -0,0 +1,68 @@
+import sys
+from group_stats import chi2_table, welch_ttest_batch
+from key_plots import KEY_CONTINUOUS
+from lazy_backend import LazyCohort, available_backends
+
+# Key study numbers computed out of core (for registry-sized extracts):
+# only aggregated results are brought into pandas
+DATA_PATH = 'transfusion_data.csv'
+BACKEND = sys.argv[1] if len(sys.argv) > 1 else None
+
+exclusions = [
+    ('baseline_bp_systolic', "missing BP Systolic data", "Complete BP Systolic data"),
+    ('baseline_wbc', "missing WBC", "Complete WBC"),
+    ('pre_transfusion_hemoglobin', "missing pre transfusion hemoglobin", "Complete pre transfusion hemoglobin"),
+    ('post_transfusion_hemoglobin', "missing post transfusion hemoglobin", "Complete post transfusion hemoglobin"),
+    ('diuretic_type', "missing diuretic type", "Complete diuretic type"),
+]
+
+cohort = LazyCohort(DATA_PATH, backend=BACKEND)
+
+print("=" * 80)
+print(f"TRANSFUSION TIMING STUDY - REGISTRY SUMMARY ({cohort.backend}; available: {', '.join(available_backends())})")
+print("=" * 80)
+
+# Cohort flow (one scan)
+flow = cohort.step_counts(exclusions, initial_cohort_label="Initial Patient Cohort")
+print("\nCohort flow:")
+print(flow.to_string(index=False))
+
+n = cohort.count()
+n_early = cohort.count([('early_transfusion', '==', 1)])
+print(f"\nDataset: {n:,} patients")
+print(f"Early transfusion (≤6h): {n_early:,} ({n_early / n * 100:.1f}%)")
+print(f"Late transfusion (>6h): {n - n_early:,} ({(n - n_early) / n * 100:.1f}%)")
+
+# Early vs Late descriptive statistics and Welch t-tests from the group aggregates
+summary = cohort.summarize(KEY_CONTINUOUS + ['time_to_first_transfusion_hours'], by='early_transfusion')
+early, late = summary.xs(1, level=0), summary.xs(0, level=0)
+t, p = welch_ttest_batch(early, late)
+print("\nEarly vs Late (mean ± SD, median [Q1, Q3], Welch t-test):")
+for i, variable in enumerate(early.index):
+    e, l = early.loc[variable], late.loc[variable]
+    print(f"  {variable:<34} {e['mean']:7.2f} ± {e['std']:6.2f}, {e['median']:6.2f} [{e['q1']:.2f}, {e['q3']:.2f}]"
+          f"  vs  {l['mean']:7.2f} ± {l['std']:6.2f}, {l['median']:6.2f} [{l['q1']:.2f}, {l['q3']:.2f}]"
+          f"  p = {p[i]:.4f}")
+
+# Mortality: crosstab and chi-square
+table = cohort.crosstab(['early_transfusion', 'in_hospital_mortality'], wide=True)
+chi2, p_value = chi2_table(table.loc[[1, 0]].to_numpy())
+rates = table[1] / table.sum(axis=1) * 100
+print(f"\nMortality: Early {rates.loc[1]:.1f}%, Late {rates.loc[0]:.1f}%  (χ² = {chi2:.3f}, p = {p_value:.4f})")
+
+# Transfused within each cutoff
+n_timed = cohort.count([('time_to_first_transfusion_hours', 'notnull', None)])
+print("\nPatients transfused within:")
+for hours in [1, 3, 6, 12, 24]:
+    within = cohort.count([('time_to_first_transfusion_hours', '<=', hours)])
+    print(f"  ≤{hours}h: {within / n_timed * 100:.1f}%")
+
+# Race and language distributions (raw values)
+race = cohort.value_counts('race')
+print(f"\nRace values: {len(race)} distinct, top 5:")
+print(race.sort_values(ascending=False).head().to_string())
+
+summary.to_csv('registry_summary.csv')
+flow.to_csv('registry_cohort_flow.csv', index=False)
+print("\n✓ Summary exported to: registry_summary.csv, registry_cohort_flow.csv")
+print("=" * 80)
@@ -0,0 +1,48 @@
+from cohort_loader import load_cohort
+from recoding import recode_race
+from resampling import compare_outcomes
+
+# Number of bootstrap resamples and permutations per comparison
+N_RESAMPLES = 10000
+
+# Load data
+df = load_cohort('transfusion_data.csv', columns=[
+    'early_transfusion', 'in_hospital_mortality', 'los_icu_days',
+    'race', 'sepsis', 'ongoing_bleeding'
+])
+df['race_grouped'] = recode_race(df['race'])
+
+print("="*80)
+print("EARLY (≤6h) vs LATE (>6h) TRANSFUSION - RESAMPLED EFFECT SIZES")
+print("="*80)
+print(f"\nDataset: {len(df)} patients, {N_RESAMPLES} bootstrap resamples / permutations per comparison")
+
+# Mortality: risk difference (mean of 0/1), ICU LOS: difference in medians
+results = compare_outcomes(
+    df, 'early_transfusion',
+    outcomes={'in_hospital_mortality': 'mean', 'los_icu_days': 'median'},
+    by=['race_grouped', 'sepsis', 'ongoing_bleeding'],
+    groups=(1, 0),
+    n_resamples=N_RESAMPLES,
+    seed=42,
+    max_workers=None
+)
+
+# Report mortality as percentage points
+is_mortality = results['outcome'] == 'in_hospital_mortality'
+results.loc[is_mortality, ['effect', 'ci_low', 'ci_high']] *= 100
+
+for outcome, label in [('in_hospital_mortality', 'IN-HOSPITAL MORTALITY (percentage points, Early - Late)'),
+                       ('los_icu_days', 'ICU LENGTH OF STAY (difference in median days, Early - Late)')]:
+    print("\n" + "="*80)
+    print(label)
+    print("="*80)
+    for _, row in results[results['outcome'] == outcome].iterrows():
+        name = 'Overall' if row['stratifier'] == 'overall' else f"{row['stratifier']} = {row['subgroup']}"
+        flag = '*' if row['p_perm'] < 0.05 else ''
+        print(f"  {name:<45} {row['effect']:7.2f} [{row['ci_low']:7.2f}, {row['ci_high']:7.2f}]  "
+              f"p = {row['p_perm']:.4f}{flag}  (n = {row['n_a']}/{row['n_b']})")
+
+results.to_csv('resampling_results.csv', index=False)
+print("\n✓ Results exported to: resampling_results.csv")
+print("="*80)
@@ -0,0 +1,19 @@
+import asyncio
+import sys
+from scoring import Scorer, score_csv, serve
+
+# Score with the exported model (see the notebook's export_model cell)
+MODEL_PATH = 'models/transfusion_logreg'
+DATA_PATH = 'blood_transfusion.csv'
+OUTPUT_PATH = 'transfusion_scores.parquet'
+CHUNKSIZE = 100_000
+
+# "batch" (default) scores DATA_PATH to Parquet; "serve" starts the HTTP service
+mode = sys.argv[1] if len(sys.argv) > 1 else 'batch'
+scorer = Scorer(MODEL_PATH)
+
+if mode == 'serve':
+    asyncio.run(serve(scorer, host='127.0.0.1', port=8080))
+else:
+    n_rows = score_csv(scorer, DATA_PATH, OUTPUT_PATH, chunksize=CHUNKSIZE)
+    print(f"✓ Scored {n_rows:,} rows with {scorer.info['estimator']} -> {OUTPUT_PATH}")
@@ -0,0 +1,52 @@
+from cohort_loader import load_cohort
+from subgroups import compare_subgroups, plot_subgroups
+from tableone_spec import categorical, columns, nonnormal, prepare, rename, source_columns
+
+# Every Table One comparison (including the key-plot variables) within each subgroup
+STRATIFIERS = ['race_grouped', 'gender', 'sepsis', 'admission_type']
+KEY_VARIABLES = [
+    ('age', ''),
+    ('time_to_first_transfusion_hours', ''),
+    ('number_of_transfusions', ''),
+    ('los_icu_days', ''),
+    ('in_hospital_mortality', 1),
+]
+
+df = prepare(load_cohort('transfusion_data.csv', columns=source_columns))
+
+results = compare_subgroups(
+    df, 'transfusion_timing', by=STRATIFIERS,
+    continuous=[c for c in columns if c not in categorical],
+    categorical=categorical,
+    nonnormal=nonnormal,
+    groups=['Early (≤6h)', 'Late (>6h)'],
+    labels={'Early (≤6h)': 'early', 'Late (>6h)': 'late'},
+    max_workers=None
+)
+
+print("=" * 80)
+print("EARLY (≤6h) vs LATE (>6h) TRANSFUSION BY SUBGROUP")
+print("=" * 80)
+print(f"\nDataset: {len(df)} patients, {results[['stratifier', 'subgroup']].drop_duplicates().shape[0]} subgroups")
+
+for variable, level in KEY_VARIABLES:
+    rows = results[(results['variable'] == variable) & (results['level'] == level)]
+    print("\n" + "-" * 80)
+    print(rename.get(variable, variable) + (f" = {level}" if level != '' else '') + f" ({rows['test'].iloc[0]})")
+    print("-" * 80)
+    for _, row in rows.iterrows():
+        name = 'Overall' if row['stratifier'] == 'overall' else f"{row['stratifier']} = {row['subgroup']}"
+        if row['type'] == 'categorical':
+            values = f"{row['percent_early']:6.1f}% vs {row['percent_late']:6.1f}%"
+        else:
+            stat = 'median' if row['test'] == 'Mann-Whitney U' else 'mean'
+            values = f"{row[f'{stat}_early']:7.2f} vs {row[f'{stat}_late']:7.2f} ({stat})"
+        flag = '*' if row['p_value'] < 0.05 else ''
+        print(f"  {name:<45} {values}  p = {row['p_value']:.4f}{flag}")
+
+results.to_csv('subgroup_comparison.csv', index=False)
+print("\n✓ Results exported to: subgroup_comparison.csv")
+
+plot_subgroups(results, KEY_VARIABLES, 'subgroup_key_plots.png', titles=rename)
+print("✓ Figure saved as: subgroup_key_plots.png")
+print("=" * 80)
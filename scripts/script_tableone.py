@@ -1,177 +1,18 @@
-import pandas as pd
-import numpy as np
-from tableone import TableOne
-
-# Read the data
-df = pd.read_csv('transfusion_data.csv')
-
-# Create more readable labels for the grouping variable
-df['transfusion_timing'] = df['early_transfusion'].map({
-    0: 'Late (>6h)',
-    1: 'Early (≤6h)'
-})
-
-# Group race/ethnicity into main categories
-def group_race(race):
-    if pd.isna(race):
-        return 'Unknown'
-    race = str(race).upper()
-    if 'WHITE' in race:
-        return 'White'
-    elif 'BLACK' in race or 'AFRICAN' in race:
-        return 'Black/African American'
-    elif 'HISPANIC' in race or 'LATINO' in race:
-        return 'Hispanic/Latino'
-    elif 'ASIAN' in race:
-        return 'Asian'
-    elif 'UNKNOWN' in race or 'UNABLE' in race:
-        return 'Unknown'
-    else:
-        return 'Other'
-
-df['race_grouped'] = df['race'].apply(group_race)
-
-# Simplify language to English vs Non-English
-def group_language(lang):
-    if pd.isna(lang):
-        return 'Unknown'
-    lang = str(lang).upper()
-    if 'ENGLISH' in lang:
-        return 'English'
-    else:
-        return 'Non-English'
-
-df['language_grouped'] = df['language'].apply(group_language)
-
-# Define columns for Table 1
-columns = [
-    # Demographics
-    'age',
-    'gender',
-    'race_grouped',
-    'weight',
-    'insurance',
-    'language_grouped',
-    
-    # Diagnosis & Severity
-    'sofa_score',
-    'admission_type',
-    'ongoing_bleeding',
-    
-    # Comorbidities
-    'heart_disease',
-    'kidney_disease',
-    'history_of_bleeding',
-    'sepsis',
-    
-    # Baseline Labs - Hemoglobin
-    'baseline_hemoglobin',
-    'pre_transfusion_hemoglobin',
-    'baseline_wbc',
-    'baseline_platelets',
-    'baseline_hematocrit',
-    'baseline_creatinine',
-    
-    # Baseline Vitals
-    'baseline_spo2',
-    'baseline_sao2',
-    'baseline_bp_systolic',
-    'baseline_bp_diastolic',
-    
-    # Interventions
-    'on_vasopressors',
-    'vasopressor_type',
-    'on_diuretics',
-    
-    # Transfusion variables
-    'time_to_first_transfusion_hours',
-    'number_of_transfusions',
-    'units_first_transfusion',
-    'total_units_transfused',
-    
-    # Hemolysis
-    'possible_hemolysis',
-    'ldh',
-    'bilirubin_total',
-    
-    # Outcomes
-    'in_hospital_mortality',
-    'los_icu_days',
-    'los_hospital_days'
-]
-
-# Define categorical variables
-categorical = [
-    'gender',
-    'race_grouped',
-    'insurance',
-    'language_grouped',
-    'admission_type',
-    'ongoing_bleeding',
-    'heart_disease',
-    'kidney_disease',
-    'history_of_bleeding',
-    'sepsis',
-    'on_vasopressors',
-    'vasopressor_type',
-    'on_diuretics',
-    'possible_hemolysis',
-    'in_hospital_mortality'
-]
-
-# Define variables that should be shown as non-normal (median [IQR])
-nonnormal = [
-    'sofa_score',
-    'baseline_creatinine',
-    'time_to_first_transfusion_hours',
-    'number_of_transfusions',
-    'units_first_transfusion',
-    'total_units_transfused',
-    'los_icu_days',
-    'los_hospital_days',
-    'ldh',
-    'bilirubin_total'
-]
-
-# Rename columns for better display
-rename = {
-    'age': 'Age (years)',
-    'gender': 'Gender',
-    'race_grouped': 'Race/Ethnicity',
-    'weight': 'Weight (kg)',
-    'insurance': 'Insurance',
-    'language_grouped': 'Primary Language',
-    'sofa_score': 'SOFA Score',
-    'admission_type': 'Admission Type',
-    'ongoing_bleeding': 'Ongoing Bleeding',
-    'heart_disease': 'Heart Disease',
-    'kidney_disease': 'Chronic Kidney Disease',
-    'history_of_bleeding': 'History of Bleeding',
-    'sepsis': 'Sepsis',
-    'baseline_hemoglobin': 'Baseline Hemoglobin (g/dL)',
-    'pre_transfusion_hemoglobin': 'Pre-transfusion Hemoglobin (g/dL)',
-    'baseline_wbc': 'White Blood Cell Count (K/uL)',
-    'baseline_platelets': 'Platelet Count (K/uL)',
-    'baseline_hematocrit': 'Hematocrit (%)',
-    'baseline_creatinine': 'Creatinine (mg/dL)',
-    'baseline_spo2': 'SpO2 (%)',
-    'baseline_sao2': 'SaO2 from ABG (%)',
-    'baseline_bp_systolic': 'Systolic BP (mmHg)',
-    'baseline_bp_diastolic': 'Diastolic BP (mmHg)',
-    'on_vasopressors': 'Vasopressor Use',
-    'vasopressor_type': 'Vasopressor Type',
-    'on_diuretics': 'Diuretic Use',
-    'time_to_first_transfusion_hours': 'Time to First Transfusion (hours)',
-    'number_of_transfusions': 'Number of Transfusions',
-    'units_first_transfusion': 'Units in First Transfusion (mL)',
-    'total_units_transfused': 'Total Units Transfused (mL)',
-    'possible_hemolysis': 'Possible Hemolysis',
-    'ldh': 'LDH (U/L)',
-    'bilirubin_total': 'Total Bilirubin (mg/dL)',
-    'in_hospital_mortality': 'In-Hospital Mortality',
-    'los_icu_days': 'ICU Length of Stay (days)',
-    'los_hospital_days': 'Hospital Length of Stay (days)'
-}
+from cohort_loader import load_cohort
+from exporters import export_table
+from instrumentation import stage
+from stats_cache import compare_groups, summary, tableone
+from tableone_spec import categorical, columns, nonnormal, prepare, rename, source_columns
+
+OUTPUTS = ['table_one.csv', 'table_one.xlsx', 'table_one.tex']
+
+# Read the data and add the grouped columns
+with stage('load') as s:
+    df = load_cohort('transfusion_data.csv', columns=source_columns)
+    s.rows_out = len(df)
+with stage('recode', rows_in=len(df)) as s:
+    df = prepare(df)
+    s.rows_out = len(df)
 
 # Create the table
 print("=" * 80)
@@ -191,32 +32,30 @@ print("TABLE 1: Baseline Characteristics by Transfusion Timing")
 print("=" * 80)
 print()
 
-mytable = TableOne(
-    df, 
-    columns=columns, 
-    categorical=categorical,
-    nonnormal=nonnormal,
-    groupby='transfusion_timing',
-    rename=rename,
-    pval=True,
-    missing=False,
-    overall=True
-)
+with stage('tableone', rows_in=len(df)) as s:
+    # Memoized on the table columns: an unchanged slice is read from .stats_cache
+    mytable = tableone(
+        df, 
+        columns=columns, 
+        categorical=categorical,
+        nonnormal=nonnormal,
+        groupby='transfusion_timing',
+        rename=rename,
+        pval=True,
+        missing=False,
+        overall=True
+    )
+    s.rows_out = len(mytable.tableone)
 
 print(mytable.tabulate(tablefmt='fancy_grid'))
 
-# Export to CSV
-mytable.to_csv('table_one.csv')
-print("\n✓ Table exported to: table_one.csv")
-
-# Export to Excel with better formatting
-mytable.to_excel('table_one.xlsx')
-print("✓ Table exported to: table_one.xlsx")
-
-# Export to LaTeX for publication
-with open('table_one.tex', 'w') as f:
-    f.write(mytable.tabulate(tablefmt='latex'))
-print("✓ Table exported to: table_one.tex")
+with stage('export', rows_in=len(mytable.tableone)):
+    # CSV, Excel and LaTeX (for publication), written in parallel; unchanged
+    # outputs are not rewritten
+    exported = export_table(mytable, OUTPUTS)
+    print()
+    for path, status in exported.items():
+        print(f"✓ Table exported to: {path}" + (" (unchanged)" if status == 'unchanged' else ""))
 
 print("\n" + "=" * 80)
 print("INTERPRETATION GUIDE")
@@ -245,20 +84,25 @@ print("\n" + "=" * 80)
 print("SIGNIFICANT DIFFERENCES (p < 0.05)")
 print("=" * 80)
 
-# Get the p-values
-pvals = mytable.tableone['P-Value']
-pvals = pvals[pvals != '']  # Remove empty strings
-pvals = pvals[pvals.notna()]  # Remove NaN
-
-significant = []
-for idx, pval in pvals.items():
-    if isinstance(pval, str):
-        try:
-            p = float(pval.replace('<', '').replace('>', ''))
-            if p < 0.05:
-                significant.append((idx, pval))
-        except:
-            pass
+# Batched Early vs Late statistics for group_comparison.csv (group sizes,
+# means, medians, Welch t-test, Mann-Whitney U with continuity correction,
+# chi-square). These tests differ from TableOne's for some columns, so the
+# significance list below uses the P-Value column of the table itself.
+with stage('group_stats', rows_in=len(df)) as s:
+    comparison = compare_groups(
+        df, 'transfusion_timing',
+        continuous=[c for c in columns if c not in categorical],
+        categorical=categorical,
+        nonnormal=nonnormal,
+        groups=['Early (≤6h)', 'Late (>6h)']
+    )
+    s.rows_out = len(comparison)
+comparison.to_csv('group_comparison.csv')
+
+# P-values as reported in Table One (on the first row of each variable)
+pvals = mytable.tableone.xs('P-Value', axis=1, level=1).iloc[:, 0]
+pvals = pvals[pvals.notna() & (pvals != '')]
+significant = [(var, pval) for (var, _), pval in pvals.items() if float(pval.lstrip('<>')) < 0.05]
 
 if significant:
     print("\nVariables with statistically significant differences:")
@@ -267,6 +111,8 @@ if significant:
 else:
     print("\nNo variables showed statistically significant differences (p < 0.05)")
 
+print(f"\n{summary()}")
+
 print("\n" + "=" * 80)
 print("✓ Table One creation complete!")
 print("=" * 80)
\ No newline at end of file
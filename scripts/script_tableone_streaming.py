@@ -0,0 +1,46 @@
+from exporters import export_table
+from streaming_tableone import StreamingTableOne
+from tableone_spec import categorical, columns, groupby, nonnormal, prepare, rename, source_columns
+
+# Rows per chunk; peak memory is bounded by one chunk plus the accumulators
+CHUNKSIZE = 200_000
+
+OUTPUTS = ['table_one.csv', 'table_one.xlsx', 'table_one.tex']
+
+print("=" * 80)
+print("TABLE 1 (STREAMING): Baseline Characteristics by Transfusion Timing")
+print("=" * 80)
+print()
+
+# Read the extract chunk by chunk and keep only per-group accumulators
+mytable = StreamingTableOne.from_csv(
+    'transfusion_data.csv',
+    prepare=prepare,
+    chunksize=CHUNKSIZE,
+    usecols=source_columns,
+    columns=columns,
+    categorical=categorical,
+    nonnormal=nonnormal,
+    groupby=groupby,
+    rename=rename
+)
+
+print(mytable.tabulate(tablefmt='fancy_grid'))
+
+# CSV, Excel and LaTeX (for publication), written in parallel; unchanged
+# outputs are not rewritten
+exported = export_table(mytable, OUTPUTS)
+print()
+for path, status in exported.items():
+    print(f"✓ Table exported to: {path}" + (" (unchanged)" if status == 'unchanged' else ""))
+
+print("""
+Medians and quartiles of non-normal variables come from quantile sketches and
+their p-values (Kruskal-Wallis) are computed on the sketches, so both are
+approximate on very large cohorts. Means, SDs, counts and the t-test and
+chi-square p-values are exact.
+""")
+
+print("=" * 80)
+print("✓ Table One creation complete!")
+print("=" * 80)
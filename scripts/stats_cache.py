@@ -0,0 +1,315 @@
+"""
+On-disk memoization of statistical computations.
+
+A memoized function is keyed on a content hash of its inputs (arrays and
+frames by content, see figure_cache.content_hash), its parameters, its name
+and the version of the library that provides it. Results are pickled into
+``cache_dir``, one file per key:
+
+- a hit returns the stored result (and marks the entry as recently used)
+- writes go to a temporary file that is renamed into place, so concurrent
+  worker processes never read a partial entry
+- when the cache grows past ``max_bytes``, the least recently used entries
+  are removed (under an fcntl lock, so only one process evicts at a time).
+  Each process scans the cache once and then keeps a running size, so the
+  folder is only scanned again when that size crosses the limit (eviction
+  then goes down to 3/4 of the limit).
+
+Hit and miss counts of the current process are kept in ``counts``.
+
+Memoized versions of scipy's ``mannwhitneyu`` and ``chi2_contingency``,
+``group_stats.compare_groups`` and ``TableOne`` are provided; ``memoize``
+wraps anything else. Configuration comes from ``configure`` or the
+environment: ``STUDY_STATS_CACHE`` (cache folder, or ``0`` to disable) and
+``STUDY_STATS_CACHE_MB`` (size limit).
+"""
+import functools
+import inspect
+import os
+import pickle
+import sys
+import threading
+from collections import Counter
+
+from figure_cache import content_hash
+
+try:
+    import fcntl
+except ImportError:  # Windows: eviction is not locked
+    fcntl = None
+
+CACHE_DIR = ".stats_cache"
+MAX_MB = 512
+
+# Bump to invalidate every entry (e.g. when a wrapper's result changes)
+CACHE_VERSION = 1
+
+_disabled = os.environ.get('STUDY_STATS_CACHE') == '0'
+_config = {
+    'enabled': not _disabled,
+    'cache_dir': CACHE_DIR if _disabled else os.environ.get('STUDY_STATS_CACHE', CACHE_DIR),
+    'max_bytes': int(float(os.environ.get('STUDY_STATS_CACHE_MB', MAX_MB)) * 2**20),
+}
+
+counts = Counter()
+
+# Size of the cache as seen by this process (None: not scanned yet)
+_size = {'bytes': None}
+
+
+def configure(cache_dir=None, max_mb=None, enabled=None):
+    """
+    Set the cache folder, its size limit (MB) and whether caching is on
+    """
+    if cache_dir is not None:
+        _config['cache_dir'] = cache_dir
+        _size['bytes'] = None
+    if max_mb is not None:
+        _config['max_bytes'] = int(max_mb * 2**20)
+    if enabled is not None:
+        _config['enabled'] = enabled
+
+
+def _version(func):
+    """
+    Version of the package providing ``func``, or for local code the source
+    of its whole module (so a change to a helper it calls is a new version)
+    """
+    module_name = getattr(func, '__module__', None) or ''
+    package = sys.modules.get(module_name.split('.')[0])
+    version = getattr(package, '__version__', None)
+    if version is None:
+        try:
+            version = inspect.getsource(sys.modules[module_name])
+        except (KeyError, OSError, TypeError):
+            try:
+                version = inspect.getsource(func)
+            except (OSError, TypeError):
+                pass
+    return version
+
+
+def _entry_path(key):
+    return os.path.join(_config['cache_dir'], key[:2], f"{key}.pkl")
+
+
+def _read(path):
+    try:
+        with open(path, 'rb') as f:
+            result = pickle.load(f)
+    except FileNotFoundError:
+        return False, None
+    except Exception:
+        # Unreadable entry (truncated, or pickled by another library version): a miss
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        return False, None
+    try:
+        os.utime(path)  # recently used, for LRU eviction
+    except OSError:
+        pass
+    return True, result
+
+
+def _write(path, result):
+    """
+    Store ``result`` and return the size of the entry in bytes
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Unique per process and thread, so concurrent writers of a key do not collide
+    tmp_path = f"{path}.{os.getpid()}-{threading.get_ident()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+        size = f.tell()
+    os.replace(tmp_path, path)
+    return size
+
+
+def _entries(cache_dir):
+    entries = []
+    for sub in os.scandir(cache_dir):
+        if not sub.is_dir():
+            continue
+        for entry in os.scandir(sub.path):
+            if entry.name.endswith('.pkl'):
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, entry.path))
+    return entries
+
+
+def evict(max_bytes=None):
+    """
+    Remove least recently used entries until the cache fits in ``max_bytes``.
+    Returns the number of entries removed.
+    """
+    cache_dir = _config['cache_dir']
+    max_bytes = _config['max_bytes'] if max_bytes is None else max_bytes
+    if not os.path.isdir(cache_dir):
+        return 0
+    with open(os.path.join(cache_dir, '.lock'), 'w') as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        entries = sorted(_entries(cache_dir))
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in entries:
+            if total <= max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+    _size['bytes'] = total
+    counts['evictions'] += removed
+    return removed
+
+
+def _grow(nbytes):
+    """
+    Add a new entry's size to the running total; evict once it crosses the limit
+    """
+    if _size['bytes'] is None:
+        cache_dir = _config['cache_dir']
+        _size['bytes'] = sum(size for _, size, _ in _entries(cache_dir)) if os.path.isdir(cache_dir) else 0
+    else:
+        _size['bytes'] += nbytes
+    if _size['bytes'] > _config['max_bytes']:
+        # Down to 3/4 of the limit, so the next scan is a while off
+        evict(_config['max_bytes'] * 3 // 4)
+
+
+def info():
+    """
+    Entries and size on disk, and this process's hit/miss counts
+    """
+    cache_dir = _config['cache_dir']
+    entries = _entries(cache_dir) if os.path.isdir(cache_dir) else []
+    return {'entries': len(entries), 'mb': sum(size for _, size, _ in entries) / 2**20,
+            'hits': counts['hits'], 'misses': counts['misses'], 'evictions': counts['evictions']}
+
+
+def summary():
+    stats = info()
+    return (f"stats cache: {stats['hits']} hits, {stats['misses']} misses "
+            f"({stats['entries']} entries, {stats['mb']:.1f} MB in {_config['cache_dir']})")
+
+
+def memoize(func=None, key=None, name=None, version=None):
+    """
+    Decorator caching ``func``'s results on disk.
+
+    ``key(*args, **kwargs)`` returns what identifies a call (by default all
+    arguments); use it to hash only the columns of a frame that are used.
+    """
+    if func is None:
+        return functools.partial(memoize, key=key, name=name, version=version)
+    name = name or f"{func.__module__}.{func.__qualname__}"
+    version = version or _version(func)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not _config['enabled']:
+            return func(*args, **kwargs)
+        inputs = key(*args, **kwargs) if key else (args, kwargs)
+        path = _entry_path(content_hash(name, version, CACHE_VERSION, inputs))
+        found, result = _read(path)
+        if found:
+            counts['hits'] += 1
+            return result
+        counts['misses'] += 1
+        result = func(*args, **kwargs)
+        _grow(_write(path, result))
+        return result
+
+    wrapper.uncached = func
+    return wrapper
+
+
+_cached = {}
+
+
+def _cached_function(name, factory):
+    # The wrapped libraries are imported on first use only
+    if name not in _cached:
+        _cached[name] = factory()
+    return _cached[name]
+
+
+def _scipy(name):
+    from scipy import stats
+    return memoize(getattr(stats, name), name=f"scipy.stats.{name}")
+
+
+def mannwhitneyu(x, y, **kwargs):
+    """
+    scipy.stats.mannwhitneyu, memoized
+    """
+    return _cached_function('mannwhitneyu', lambda: _scipy('mannwhitneyu'))(x, y, **kwargs)
+
+
+def chi2_contingency(observed, **kwargs):
+    """
+    scipy.stats.chi2_contingency, memoized
+    """
+    return _cached_function('chi2_contingency', lambda: _scipy('chi2_contingency'))(observed, **kwargs)
+
+
+def _frame_slice(df, used, *args, **kwargs):
+    """
+    Key of a call on a frame: only the ``used`` columns count, plus the other arguments
+    """
+    return df[[c for c in dict.fromkeys(used) if c in df.columns]], args, kwargs
+
+
+def _compare_groups_key(df, group, continuous=(), categorical=(), nonnormal=(), groups=None, labels=None):
+    return _frame_slice(df, [group, *continuous, *categorical], group, continuous, categorical,
+                        nonnormal, groups, labels)
+
+
+def compare_groups(df, group, continuous=(), categorical=(), nonnormal=(), groups=None, labels=None):
+    """
+    group_stats.compare_groups, memoized on the columns it uses
+    """
+    def factory():
+        import group_stats
+        return memoize(group_stats.compare_groups, key=_compare_groups_key)
+    cached = _cached_function('compare_groups', factory)
+    return cached(df, group, continuous=continuous, categorical=categorical, nonnormal=nonnormal,
+                  groups=groups, labels=labels)
+
+
+def _tableone_key(data, columns=None, groupby=None, **kwargs):
+    used = list(columns) if columns is not None else list(data.columns)
+    return _frame_slice(data, used + ([groupby] if groupby else []), columns, groupby, **kwargs)
+
+
+def _table_one(data, **kwargs):
+    from tableone import TableOne
+    # TableOne recodes some columns of the frame it is given (e.g. missing
+    # categories as 'None'); keep those columns so a cache hit can apply them too
+    used = list(data.columns)
+    before = data.copy()
+    table = TableOne(data, **kwargs)
+    changed = [c for c in used if not data[c].equals(before[c]) or data[c].dtype != before[c].dtype]
+    return table, data[changed].copy()
+
+
+def tableone(data, **kwargs):
+    """
+    TableOne(data, **kwargs), memoized on the columns it uses (columns and groupby).
+    Columns TableOne changes in ``data`` are changed on a cache hit as well.
+    """
+    def factory():
+        import tableone as package
+        return memoize(_table_one, key=_tableone_key, name='tableone.TableOne', version=package.__version__)
+    table, changed = _cached_function('tableone', factory)(data, **kwargs)
+    for col in changed.columns:
+        data[col] = changed[col]
+    return table
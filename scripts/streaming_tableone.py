@@ -0,0 +1,437 @@
+"""
+Streaming Table One for cohorts that do not fit in memory.
+
+The extract is read in chunks and each group keeps mergeable accumulators:
+
+- ``normal`` columns: running count/mean/M2 (Welford, merged with Chan's
+  formula) for mean (SD) and the Welch t-test (one-way ANOVA for >2 groups)
+- ``nonnormal`` columns: KLL-style quantile sketches for median [Q1,Q3] and
+  an approximate Kruskal-Wallis test on the sketches' weighted items
+- ``categorical`` columns: count tables for n (%) and the chi-square test
+  (missing values are counted as their own level, as TableOne does)
+
+Rows can also be retracted (``retract``) for incremental refreshes: moments
+and counts are subtracted exactly, and retracted values are removed from
+the sketches (exactly while a sketch is uncompacted, approximately after).
+
+The output follows TableOne's layout, with CSV/XLSX/LaTeX exports.
+"""
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+from cohort_loader import text_dtypes
+from group_stats import as_float_matrix, chi2_table
+
+# Level used for missing values of categorical columns (as in TableOne)
+MISSING_LEVEL = 'None'
+
+
+class Moments:
+    """
+    Running count, mean and sum of squared deviations for a set of columns
+    """
+
+    def __init__(self, n_columns):
+        self.n = np.zeros(n_columns)
+        self.mean = np.zeros(n_columns)
+        self.m2 = np.zeros(n_columns)
+
+    def update(self, x):
+        n_b = np.sum(~np.isnan(x), axis=0).astype(float)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean_b = np.where(n_b > 0, np.nansum(x, axis=0) / n_b, 0.0)
+        m2_b = np.nansum((x - mean_b) ** 2, axis=0)
+        self._combine(n_b, mean_b, m2_b)
+
+    def merge(self, other):
+        self._combine(other.n, other.mean, other.m2)
+
+    def subtract(self, other):
+        """
+        Remove the rows summarized by ``other`` (Chan's formula with negative n)
+        """
+        self._combine(-other.n, other.mean, -other.m2)
+
+    def _combine(self, n_b, mean_b, m2_b):
+        n = self.n + n_b
+        delta = mean_b - self.mean
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.where(n > 0, self.mean + delta * n_b / n, 0.0)
+            m2 = np.where(n > 0, self.m2 + m2_b + delta ** 2 * self.n * n_b / n, 0.0)
+        self.n, self.mean, self.m2 = n, mean, m2
+
+    @property
+    def std(self):
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.sqrt(self.m2 / (self.n - 1))
+
+
+class QuantileSketch:
+    """
+    Mergeable quantile sketch (KLL-style compactor hierarchy).
+
+    Level ``h`` holds items of weight ``2**h``. When a level exceeds its
+    capacity it is sorted and every other item (random offset) is promoted
+    to the next level.
+    """
+
+    def __init__(self, k=2048, seed=0):
+        self.k = k
+        self.n = 0
+        self.levels = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+        # Retracted values that were no longer stored with unit weight
+        self.retracted = None
+
+    def _capacity(self, h):
+        depth = len(self.levels)
+        return max(2, int(np.ceil(self.k * (2 / 3) ** (depth - h - 1))))
+
+    def update(self, values):
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        self.n += len(values)
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+
+    def merge(self, other):
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for h, items in enumerate(other.levels):
+            self.levels[h] = np.concatenate([self.levels[h], items])
+        self.n += other.n
+        if other.retracted is not None:
+            if self.retracted is None:
+                self.retracted = QuantileSketch(self.k)
+            self.retracted.merge(other.retracted)
+        self._compress()
+
+    def retract(self, values):
+        """
+        Remove ``values`` that were added before.
+
+        Values still stored with unit weight (level 0) are deleted exactly;
+        the rest are kept in a sketch of negative weight.
+        """
+        values = np.asarray(values, dtype=float)
+        values = np.sort(values[~np.isnan(values)])
+        self.n -= len(values)
+        items = np.sort(self.levels[0])
+        uniq, counts = np.unique(values, return_counts=True)
+        if len(items) and len(uniq):
+            # Drop up to counts[u] occurrences of every retracted value u
+            rank = np.arange(len(items)) - np.searchsorted(items, items, side='left')
+            idx = np.clip(np.searchsorted(uniq, items), 0, len(uniq) - 1)
+            drop = (uniq[idx] == items) & (rank < counts[idx])
+            counts = counts - np.bincount(idx[drop], minlength=len(uniq))
+            self.levels[0] = items[~drop]
+        left = np.repeat(uniq, counts)
+        if len(left):
+            if self.retracted is None:
+                self.retracted = QuantileSketch(self.k)
+            self.retracted.update(left)
+
+    def _compress(self):
+        h = 0
+        while h < len(self.levels):
+            level = self.levels[h]
+            if len(level) > self._capacity(h):
+                if h + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                level = np.sort(level)
+                # Keep one item here when the count is odd, promote half the rest
+                odd = len(level) % 2
+                promoted = level[odd:][self._rng.integers(2)::2]
+                self.levels[h] = level[:odd]
+                self.levels[h + 1] = np.concatenate([self.levels[h + 1], promoted])
+            h += 1
+
+    def weighted_items(self):
+        """
+        Sketch items and their weights (sorted by value)
+        """
+        values = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(items), 2.0 ** h) for h, items in enumerate(self.levels)])
+        if self.retracted is not None and self.retracted.n:
+            # Net weight per distinct value, without negative mass
+            removed, removed_weights = self.retracted.weighted_items()
+            values, inverse = np.unique(np.concatenate([values, removed]), return_inverse=True)
+            weights = np.bincount(inverse, weights=np.concatenate([weights, -removed_weights]))
+            keep = weights > 0
+            return values[keep], weights[keep]
+        order = np.argsort(values, kind='mergesort')
+        return values[order], weights[order]
+
+    def quantile(self, q):
+        values, weights = self.weighted_items()
+        if not len(values):
+            return np.full(np.shape(q), np.nan)
+        if self.retracted is not None and self.retracted.n:
+            # Items are distinct values with their net weight; each covers a
+            # block of order statistics
+            end = np.cumsum(weights) - 1
+            positions = np.column_stack([end - weights + 1, end]).ravel()
+            values = np.repeat(values, 2)
+        else:
+            # Linear interpolation on the weighted order statistics; with unit
+            # weights this is the same as pandas' default quantile
+            positions = np.cumsum(weights) - (weights + 1) / 2
+        return np.interp(np.asarray(q) * (weights.sum() - 1), positions, values)
+
+
+def kruskal_weighted(samples):
+    """
+    Kruskal-Wallis test on weighted samples [(values, weights), ...]
+    """
+    samples = [(v, w) for v, w in samples if w.sum() > 0]
+    if len(samples) < 2:
+        return np.nan, np.nan
+    values = np.concatenate([v for v, _ in samples])
+    weights = np.concatenate([w for _, w in samples])
+    group = np.concatenate([np.full(len(v), i) for i, (v, _) in enumerate(samples)])
+
+    # Mid-ranks of tied values under the weights
+    uniques, inverse = np.unique(values, return_inverse=True)
+    tie_weight = np.bincount(inverse, weights=weights)
+    before = np.cumsum(tie_weight) - tie_weight
+    ranks = (before + (tie_weight + 1) / 2)[inverse]
+
+    n = weights.sum()
+    n_g = np.bincount(group, weights=weights)
+    r_g = np.bincount(group, weights=weights * ranks)
+    h = 12 / (n * (n + 1)) * np.sum(r_g ** 2 / n_g) - 3 * (n + 1)
+    ties = 1 - np.sum(tie_weight ** 3 - tie_weight) / (n ** 3 - n)
+    if ties <= 0:
+        return np.nan, np.nan
+    h /= ties
+    return h, stats.chi2.sf(h, len(samples) - 1)
+
+
+class GroupSummary:
+    """
+    Mergeable accumulators for one group (or the overall cohort)
+    """
+
+    def __init__(self, normal, nonnormal, categorical, sketch_k=2048):
+        self.n = 0
+        self.moments = Moments(len(normal))
+        self.sketches = {col: QuantileSketch(sketch_k) for col in nonnormal}
+        self.counts = {col: {} for col in categorical}
+
+    def update(self, chunk, normal):
+        self.n += len(chunk)
+        if normal:
+            self.moments.update(as_float_matrix(chunk, normal))
+        for col, sketch in self.sketches.items():
+            sketch.update(as_float_matrix(chunk, [col])[:, 0])
+        for col, counts in self.counts.items():
+            for level, count in chunk[col].value_counts(dropna=False, sort=False).items():
+                if count:
+                    level = MISSING_LEVEL if pd.isna(level) else level
+                    counts[level] = counts.get(level, 0) + int(count)
+
+    def retract(self, chunk, normal):
+        self.n -= len(chunk)
+        if normal:
+            removed = Moments(len(normal))
+            removed.update(as_float_matrix(chunk, normal))
+            self.moments.subtract(removed)
+        for col, sketch in self.sketches.items():
+            sketch.retract(as_float_matrix(chunk, [col])[:, 0])
+        for col, counts in self.counts.items():
+            for level, count in chunk[col].value_counts(dropna=False, sort=False).items():
+                if count:
+                    level = MISSING_LEVEL if pd.isna(level) else level
+                    counts[level] = counts.get(level, 0) - int(count)
+                    if counts[level] <= 0:
+                        del counts[level]
+
+    def merge(self, other):
+        self.n += other.n
+        self.moments.merge(other.moments)
+        for col, sketch in self.sketches.items():
+            sketch.merge(other.sketches[col])
+        for col, counts in self.counts.items():
+            for level, count in other.counts[col].items():
+                counts[level] = counts.get(level, 0) + count
+
+
+class StreamingTableOne:
+    """
+    Table One built from chunks, with the same layout as ``TableOne``.
+    """
+
+    def __init__(self, columns, categorical, nonnormal, groupby, rename=None,
+                 decimals=1, sketch_k=2048):
+        self.columns = list(columns)
+        self.categorical = [c for c in self.columns if c in categorical]
+        self.nonnormal = [c for c in self.columns if c in nonnormal and c not in categorical]
+        self.normal = [c for c in self.columns if c not in categorical and c not in nonnormal]
+        self.groupby = groupby
+        self.rename = rename or {}
+        self.decimals = decimals
+        self.sketch_k = sketch_k
+        self.groups = {}
+        self.level_order = {}
+        self._table = None
+
+    def _new_summary(self):
+        return GroupSummary(self.normal, self.nonnormal, self.categorical, self.sketch_k)
+
+    def update(self, chunk):
+        """
+        Add a chunk of (prepared) rows to the accumulators
+        """
+        for col in self.categorical:
+            if isinstance(chunk[col].dtype, pd.CategoricalDtype) and col not in self.level_order:
+                self.level_order[col] = list(chunk[col].cat.categories)
+        for label, rows in chunk.groupby(self.groupby, observed=True, sort=False):
+            if label not in self.groups:
+                self.groups[label] = self._new_summary()
+            self.groups[label].update(rows, self.normal)
+        self._table = None
+        return self
+
+    def retract(self, chunk):
+        """
+        Remove a chunk of (prepared) rows that was added before
+        """
+        for label, rows in chunk.groupby(self.groupby, observed=True, sort=False):
+            self.groups[label].retract(rows, self.normal)
+            if self.groups[label].n <= 0:
+                del self.groups[label]
+        self._table = None
+        return self
+
+    def merge(self, other):
+        """
+        Merge the accumulators of another StreamingTableOne with the same spec
+        """
+        for label, summary in other.groups.items():
+            if label not in self.groups:
+                self.groups[label] = self._new_summary()
+            self.groups[label].merge(summary)
+        for col, order in other.level_order.items():
+            self.level_order.setdefault(col, order)
+        self._table = None
+        return self
+
+    @classmethod
+    def from_csv(cls, path, prepare=None, chunksize=100_000, usecols=None, **spec):
+        """
+        Build the table by reading ``path`` in chunks of ``chunksize`` rows.
+
+        ``prepare`` is applied to every chunk before it is summarized. Text
+        columns of the schema (e.g. ICD codes) are read as text in every chunk.
+        """
+        table = cls(**spec)
+        for chunk in pd.read_csv(path, chunksize=chunksize, usecols=usecols, low_memory=False,
+                                 dtype=text_dtypes(path)):
+            table.update(prepare(chunk) if prepare else chunk)
+        return table
+
+    def overall(self):
+        summary = self._new_summary()
+        for group in self.groups.values():
+            summary.merge(group)
+        return summary
+
+    def _levels(self, col, summaries):
+        seen = set()
+        for s in summaries:
+            seen.update(s.counts[col])
+        if col in self.level_order:
+            order = self.level_order[col] + [MISSING_LEVEL]
+            return [level for level in order if level in seen]
+        return sorted(seen, key=str)
+
+    def _pvalue(self, col, summaries):
+        if col in self.categorical:
+            levels = self._levels(col, summaries)
+            table = np.array([[s.counts[col].get(level, 0) for level in levels] for s in summaries])
+            return chi2_table(table)[1] if table.size else np.nan
+        if col in self.nonnormal:
+            return kruskal_weighted([s.sketches[col].weighted_items() for s in summaries])[1]
+
+        j = self.normal.index(col)
+        n = np.array([s.moments.n[j] for s in summaries])
+        mean = np.array([s.moments.mean[j] for s in summaries])
+        var = np.array([s.moments.std[j] ** 2 for s in summaries])
+        if (n < 2).any():
+            return np.nan
+        if len(summaries) == 2:
+            # Welch t-test
+            se = var / n
+            t = (mean[0] - mean[1]) / np.sqrt(se.sum())
+            dof = se.sum() ** 2 / np.sum(se ** 2 / (n - 1))
+            return 2 * stats.t.sf(abs(t), dof)
+        # One-way ANOVA
+        grand = np.sum(n * mean) / n.sum()
+        between = np.sum(n * (mean - grand) ** 2) / (len(n) - 1)
+        within = np.sum((n - 1) * var) / (n.sum() - len(n))
+        return stats.f.sf(between / within, len(n) - 1, n.sum() - len(n))
+
+    def _format_p(self, p):
+        if np.isnan(p):
+            return ''
+        return '<0.001' if p < 0.001 else f"{p:.3f}"
+
+    def _build(self):
+        labels = sorted(self.groups)
+        summaries = [self.groups[label] for label in labels]
+        overall = self.overall()
+        columns = ['Overall'] + [str(label) for label in labels] + ['P-Value']
+        d = self.decimals
+        rows = {('n', ''): [str(overall.n)] + [str(s.n) for s in summaries] + ['']}
+
+        for col in self.columns:
+            name = self.rename.get(col, col)
+            p = self._format_p(self._pvalue(col, summaries))
+            if col in self.categorical:
+                for i, level in enumerate(self._levels(col, [overall])):
+                    cells = []
+                    for s in [overall] + summaries:
+                        total = sum(s.counts[col].values())
+                        count = s.counts[col].get(level, 0)
+                        pct = count / total * 100 if total else np.nan
+                        cells.append(f"{count} ({pct:.{d}f})")
+                    rows[(f"{name}, n (%)", str(level))] = cells + [p if i == 0 else '']
+            elif col in self.nonnormal:
+                cells = []
+                for s in [overall] + summaries:
+                    q1, median, q3 = s.sketches[col].quantile([0.25, 0.5, 0.75])
+                    cells.append(f"{median:.{d}f} [{q1:.{d}f},{q3:.{d}f}]")
+                rows[(f"{name}, median [Q1,Q3]", '')] = cells + [p]
+            else:
+                j = self.normal.index(col)
+                cells = [f"{s.moments.mean[j]:.{d}f} ({s.moments.std[j]:.{d}f})"
+                         for s in [overall] + summaries]
+                rows[(f"{name}, mean (SD)", '')] = cells + [p]
+
+        table = pd.DataFrame.from_dict(rows, orient='index', columns=columns)
+        table.index = pd.MultiIndex.from_tuples(table.index)
+        return table
+
+    @property
+    def tableone(self):
+        if self._table is None:
+            self._table = self._build()
+        return self._table
+
+    def tabulate(self, headers=None, tablefmt='grid', **kwargs):
+        from tabulate import tabulate
+        headers = headers or [''] + list(self.tableone.columns)
+        rows = [[f"{var}, {level}" if level else var] + list(values)
+                for (var, level), values in zip(self.tableone.index, self.tableone.values)]
+        return tabulate(rows, headers=headers, tablefmt=tablefmt, **kwargs)
+
+    def to_csv(self, path, **kwargs):
+        self.tableone.to_csv(path, **kwargs)
+
+    def to_excel(self, path, **kwargs):
+        self.tableone.to_excel(path, **kwargs)
+
+    def to_latex(self, path):
+        with open(path, 'w') as f:
+            f.write(self.tabulate(tablefmt='latex'))
@@ -0,0 +1,123 @@
+"""
+Stages of the transfusion study, as pipeline nodes (see pipeline.py).
+
+Every stage takes the folder for its output files first, then the results
+of the stages it depends on, then its parameters.
+
+Libraries only some stages need are imported inside those stages, so that
+running one stage (see cli.py) does not pay for the others.
+"""
+import os
+
+import pandas as pd
+
+from cohort_loader import load_cohort
+from tableone_spec import categorical, columns, groupby, nonnormal, prepare, rename
+
+# Default exclusion cascade: (column that must be present, reason, label of the remaining cohort)
+EXCLUSIONS = [
+    ('baseline_bp_systolic', "missing BP Systolic data", "Complete BP Systolic data"),
+    ('baseline_wbc', "missing WBC", "Complete WBC"),
+    ('pre_transfusion_hemoglobin', "missing pre transfusion hemoglobin", "Complete pre transfusion hemoglobin"),
+    ('post_transfusion_hemoglobin', "missing post transfusion hemoglobin", "Complete post transfusion hemoglobin"),
+    ('diuretic_type', "missing diuretic type", "Complete diuretic type"),
+]
+
+
+def load(out_dir, path):
+    return load_cohort(path)
+
+
+def recode(out_dir, data):
+    """
+    Grouping labels and grouped race/language columns (Table One spec)
+    """
+    return prepare(data.copy())
+
+
+def exclusion_flow(out_dir, data, exclusions=EXCLUSIONS, diagram=False, ef_settings=None, plot_settings=None):
+    """
+    Cohort size after every exclusion step; optionally the EquiFlow diagram
+    """
+    from cohort_flow import CohortFlow
+    from recoding import EQUIFLOW_RACE_LABELS, EQUIFLOW_RACE_ORDER, recode_race
+
+    data = data.copy()
+    data['race'] = recode_race(data['race'], labels=EQUIFLOW_RACE_LABELS, order=EQUIFLOW_RACE_ORDER)
+    data = data.sort_values('race', kind='mergesort')
+    flow = CohortFlow(data, initial_cohort_label="Initial Patient Cohort")
+    for keep, reason, label in exclusions:
+        flow.add_exclusion(keep=keep, exclusion_reason=reason, new_cohort_label=label)
+    counts = flow.counts()
+    counts.to_csv(os.path.join(out_dir, 'cohort_flow.csv'), index=False)
+    if diagram:
+        flow.to_equiflow(**(ef_settings or {})).plot_flows(output_folder=out_dir, **(plot_settings or {}))
+    return counts
+
+
+def table_one(out_dir, data, formats=('csv', 'xlsx', 'tex'), spec=None):
+    """
+    Table One by transfusion timing (CSV, Excel and LaTeX by default).
+    ``spec`` overrides entries of the study spec (columns, categorical,
+    nonnormal, groupby, rename).
+    """
+    from exporters import export_table
+    from stats_cache import tableone
+
+    spec = {'columns': columns, 'categorical': categorical, 'nonnormal': nonnormal,
+            'groupby': groupby, 'rename': rename, **(spec or {})}
+    table = tableone(data, **spec, pval=True, missing=False, overall=True)
+    export_table(table, [os.path.join(out_dir, f'table_one.{ext}') for ext in formats])
+    return table.tableone
+
+
+def key_plots(out_dir, data, dpi=300):
+    """
+    Early vs Late statistics and the key-plots figure
+    """
+    from figure_cache import render_panels
+    from key_plots import KEY_COLUMNS, compare_timing, key_panels
+
+    data = data[KEY_COLUMNS]
+    comparison = compare_timing(data)
+    comparison.to_csv(os.path.join(out_dir, 'key_plot_statistics.csv'))
+    render_panels(key_panels(data, comparison), os.path.join(out_dir, 'transfusion_key_plots.png'),
+                  layout=(2, 3), dpi=dpi, mpl_style='seaborn-v0_8-darkgrid')
+    return comparison
+
+
+def profile(out_dir, data, group='race_grouped'):
+    """
+    Data profile report (HTML and JSON); returns the alerts
+    """
+    from profiling import DataProfile
+
+    report = DataProfile.from_frame(data, group=group)
+    report.to_html(os.path.join(out_dir, 'profile-report.html'))
+    report.to_json(os.path.join(out_dir, 'profile-report.json'))
+    return report.alerts()
+
+
+def train(out_dir, data, C=1.0, test_size=0.2, seed=42):
+    """
+    Logistic regression on the binned number of transfusions, exported for scoring
+    """
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.metrics import balanced_accuracy_score
+    from sklearn.model_selection import train_test_split
+
+    from model_selection import bin_target
+    from preprocessing import build_features, feature_matrix
+    from scoring import export_model
+
+    features = build_features(data)
+    binned = bin_target(features.target.clip(min=0))
+    q = max(binned)
+    X = feature_matrix(features)
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, binned[q], test_size=test_size, random_state=seed, stratify=binned[q])
+    model = LogisticRegression(C=C, max_iter=1000, class_weight='balanced').fit(X_train, y_train)
+    score = balanced_accuracy_score(y_test, model.predict(X_test))
+    export_model(model, features.transformer, os.path.join(out_dir, 'model'), data_key=features.key, q=q)
+    return pd.Series({'q': q, 'n_train': X_train.shape[0], 'n_test': X_test.shape[0],
+                      'balanced_accuracy': score})
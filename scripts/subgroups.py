@@ -0,0 +1,262 @@
+"""
+Two-group comparisons repeated within every subgroup (stratified analysis).
+
+For each stratifying column (e.g. race group, gender, sepsis), every level
+is a subgroup, and the statistics of ``group_stats.compare_groups`` are
+computed within each of them. Instead of filtering the frame once per
+subgroup, each stratifier is handled in one pass over category codes:
+
+- each continuous column is sorted once by (subgroup, value); ranks within
+  subgroups (for Mann-Whitney U) and tie corrections follow from that sort,
+  and a stable re-sort by group gives the per-cell quantiles
+- counts, means and SDs per (subgroup, group) cell are bincounts
+- crosstabs of all subgroups at once are one bincount per categorical column
+
+Stratifiers run in parallel on a process pool. The result is one long
+table with a row per (stratifier, subgroup, variable, level), with the
+columns of ``compare_groups``.
+"""
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+from group_stats import as_float_matrix, chi2_table, welch_ttest_batch
+
+OVERALL = 'overall'
+
+_data = {}
+
+
+def _init(data):
+    _data.update(data)
+
+
+def _segment_starts(sorted_codes, n_codes):
+    """
+    First position of every code in a sorted code array
+    """
+    return np.searchsorted(sorted_codes, np.arange(n_codes))
+
+
+def _interpolate(values, starts, counts, q):
+    """
+    Linear-interpolated ``q`` quantile (as np.percentile) of the sorted
+    segments ``values[start:start + count]``
+    """
+    out = np.full(len(starts), np.nan)
+    has = counts > 0
+    pos = (counts[has] - 1) * q
+    lo = np.floor(pos).astype(int)
+    hi = np.minimum(lo + 1, counts[has] - 1)
+    frac = pos - lo
+    start = starts[has]
+    out[has] = values[start + lo] + frac * (values[start + hi] - values[start + lo])
+    return out
+
+
+def continuous_batch(v, strata, group, n_strata):
+    """
+    Descriptive statistics per (subgroup, group) cell and Mann-Whitney U per
+    subgroup for one column.
+
+    ``strata`` are subgroup codes (0..n_strata-1, -1 for missing) and
+    ``group`` is 0 for group a, 1 for group b and -1 for neither. Returns
+    ([desc_a, desc_b], U of group a, p-value), with arrays per subgroup.
+    """
+    keep = ~np.isnan(v) & (strata >= 0) & (group >= 0)
+    v, s, g = v[keep], strata[keep], group[keep]
+
+    # One sort by (subgroup, value)
+    order = np.lexsort((v, s))
+    v, s, g = v[order], s[order], g[order]
+    m = len(v)
+
+    # Average ranks within subgroups: a tie run starts where the subgroup or value changes
+    run_start = np.ones(m, dtype=bool)
+    run_start[1:] = (s[1:] != s[:-1]) | (v[1:] != v[:-1])
+    run_id = np.cumsum(run_start) - 1
+    first = np.flatnonzero(run_start)
+    run_size = np.diff(np.append(first, m))
+    seg_start = _segment_starts(s, n_strata)
+    rank = (first + (run_size - 1) / 2 - seg_start[s[first]] + 1)[run_id]
+    tie_term = np.bincount(s[first], weights=run_size ** 3 - run_size, minlength=n_strata)
+
+    in_a = g == 0
+    n = np.bincount(s, minlength=n_strata).astype(float)
+    n_a = np.bincount(s[in_a], minlength=n_strata).astype(float)
+    n_b = n - n_a
+    u_a = np.bincount(s[in_a], weights=rank[in_a], minlength=n_strata) - n_a * (n_a + 1) / 2
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mu = n_a * n_b / 2
+        sigma = np.sqrt(n_a * n_b / 12 * ((n + 1) - tie_term / (n * (n - 1))))
+        z = (np.maximum(u_a, n_a * n_b - u_a) - mu - 0.5) / sigma
+        p = np.clip(2 * stats.norm.sf(z), 0, 1)
+
+    # Stable re-sort by cell keeps values sorted within every (subgroup, group) cell
+    cell = s * 2 + g
+    by_cell = np.argsort(cell, kind='stable')
+    v_cell, cell = v[by_cell], cell[by_cell]
+    counts = np.bincount(cell, minlength=2 * n_strata)
+    starts = _segment_starts(cell, 2 * n_strata)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.bincount(cell, weights=v_cell, minlength=2 * n_strata) / counts
+        std = np.sqrt(np.bincount(cell, weights=(v_cell - mean[cell]) ** 2, minlength=2 * n_strata)
+                      / (counts - 1))
+    desc = {'n': counts, 'mean': mean, 'std': std}
+    for name, q in (('median', 0.5), ('q1', 0.25), ('q3', 0.75)):
+        desc[name] = _interpolate(v_cell, starts, counts, q)
+    desc = [{k: arr[i::2] for k, arr in desc.items()} for i in (0, 1)]
+    return desc, u_a, p
+
+
+def _stratifier_rows(name):
+    """
+    Long-format rows for every subgroup of one stratifier (runs in a worker)
+    """
+    strata, levels = _data['strata'][name]
+    group, names = _data['group'], _data['names']
+    n_strata = len(levels)
+    rows = []
+
+    for j, col in enumerate(_data['continuous']):
+        desc, u, p_u = continuous_batch(_data['x'][:, j], strata, group, n_strata)
+        nonnormal = col in _data['nonnormal']
+        if not nonnormal:
+            t, p_t = welch_ttest_batch(*desc)
+        for k, level in enumerate(levels):
+            row = {'stratifier': name, 'subgroup': level, 'variable': col, 'level': '', 'type': 'continuous'}
+            if nonnormal:
+                row.update(test='Mann-Whitney U', statistic=u[k], p_value=p_u[k])
+            else:
+                row.update(test='Welch t-test', statistic=t[k], p_value=p_t[k])
+            for group_name, d in zip(names, desc):
+                for key, arr in d.items():
+                    row[f'{key}_{group_name}'] = arr[k]
+            rows.append(row)
+
+    keep = (strata >= 0) & (group >= 0)
+    for col, (codes, categories) in _data['categorical'].items():
+        n_levels = len(categories)
+        valid = keep & (codes >= 0)
+        flat = (strata[valid] * 2 + group[valid]) * n_levels + codes[valid]
+        tables = np.bincount(flat, minlength=n_strata * 2 * n_levels).reshape(n_strata, 2, n_levels)
+        for k, level in enumerate(levels):
+            table = tables[k]
+            chi2, p = chi2_table(table)
+            totals = table.sum(axis=1)
+            for c, category in enumerate(categories):
+                row = {'stratifier': name, 'subgroup': level, 'variable': col, 'level': category,
+                       'type': 'categorical', 'test': 'Chi-square', 'statistic': chi2, 'p_value': p}
+                for g, group_name in enumerate(names):
+                    row[f'n_{group_name}'] = totals[g]
+                    row[f'count_{group_name}'] = table[g, c]
+                    row[f'percent_{group_name}'] = table[g, c] / totals[g] * 100 if totals[g] else np.nan
+                rows.append(row)
+    return rows
+
+
+def compare_subgroups(df, group, by, continuous=(), categorical=(), nonnormal=(), groups=None,
+                      labels=None, overall=True, max_workers=None):
+    """
+    ``compare_groups`` of ``group`` within every level of every column in
+    ``by`` (and over the whole cohort when ``overall``).
+
+    Returns one long table with a row per (stratifier, subgroup, variable,
+    level); the whole cohort has stratifier 'overall' and subgroup 'All'.
+    """
+    values = df[group]
+    if groups is None:
+        groups = sorted(values.dropna().unique())
+    if len(groups) != 2:
+        raise ValueError(f"Expected two groups in '{group}', got {list(groups)}")
+    labels = labels or {}
+    in_a = (values == groups[0]).to_numpy(dtype=bool, na_value=False)
+    in_b = (values == groups[1]).to_numpy(dtype=bool, na_value=False)
+
+    strata = {}
+    if overall:
+        strata[OVERALL] = (np.zeros(len(df), dtype=np.int64), ['All'])
+    for col in by:
+        cat = pd.Categorical(df[col])
+        strata[col] = (cat.codes.astype(np.int64), list(cat.categories))
+
+    data = {
+        'x': as_float_matrix(df, list(continuous)),
+        'continuous': list(continuous),
+        'nonnormal': set(nonnormal),
+        'categorical': {col: (cat.codes.astype(np.int64), list(cat.categories))
+                        for col, cat in ((col, pd.Categorical(df[col])) for col in categorical)},
+        'group': np.where(in_a, 0, np.where(in_b, 1, -1)),
+        'names': [str(labels.get(g, g)) for g in groups],
+        'strata': strata,
+    }
+
+    if max_workers == 1 or len(strata) == 1:
+        _init(data)
+        results = [_stratifier_rows(name) for name in strata]
+    else:
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context('fork' if 'fork' in methods else None)
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=context,
+                                 initializer=_init, initargs=(data,)) as pool:
+            results = list(pool.map(_stratifier_rows, strata))
+    return pd.DataFrame([row for rows in results for row in rows])
+
+
+def plot_subgroups(table, variables, path, names=('early', 'late'), titles=None, dpi=150):
+    """
+    Faceted figure: one row per variable, one column per stratifier, showing
+    the two groups in every subgroup with the p-value.
+
+    ``variables`` lists (variable, level) pairs; continuous variables are
+    shown as medians (Mann-Whitney) or means, categorical levels as percent.
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    from key_plots import GROUP_COLORS
+
+    titles = titles or {}
+    stratifiers = list(dict.fromkeys(table['stratifier']))
+    n_rows = table.groupby('stratifier')['subgroup'].nunique().max()
+    fig, axes = plt.subplots(len(variables), len(stratifiers), squeeze=False, sharex='row',
+                             figsize=(4.5 * len(stratifiers), (0.3 * n_rows + 1) * len(variables)))
+    for i, (variable, level) in enumerate(variables):
+        rows = table[(table['variable'] == variable) & (table['level'] == level)]
+        for j, stratifier in enumerate(stratifiers):
+            ax = axes[i, j]
+            sub = rows[rows['stratifier'] == stratifier]
+            if sub.empty:
+                ax.set_visible(False)
+                continue
+            if sub['type'].iloc[0] == 'categorical':
+                stat, unit = 'percent', '%'
+            else:
+                stat, unit = 'median' if sub['test'].iloc[0] == 'Mann-Whitney U' else 'mean', ''
+            y = np.arange(len(sub))
+            for name, color in zip(names, GROUP_COLORS):
+                ax.scatter(sub[f'{stat}_{name}'], y, color=color, label=name, zorder=3)
+            ax.hlines(y, sub[[f'{stat}_{n}' for n in names]].min(axis=1),
+                      sub[[f'{stat}_{n}' for n in names]].max(axis=1), color='grey', alpha=0.5)
+            ax.set_yticks(y)
+            ax.set_yticklabels([f"{s} (p={p:.3f})" for s, p in zip(sub['subgroup'], sub['p_value'])],
+                               fontsize=8)
+            ax.invert_yaxis()
+            ax.grid(axis='x', alpha=0.3)
+            if i == 0:
+                ax.set_title(titles.get(stratifier, 'Overall' if stratifier == OVERALL else stratifier),
+                             fontsize=10, fontweight='bold')
+            if j == 0:
+                label = titles.get(variable, variable) + (f" = {level}" if level != '' else '')
+                ax.set_xlabel(f"{label} ({stat}{unit and ', ' + unit})", fontsize=9)
+            else:
+                ax.set_xlabel(f"{stat}{unit and ', ' + unit}", fontsize=9)
+    axes[0, -1].legend(fontsize=8, loc='lower right')
+    fig.tight_layout()
+    fig.savefig(path, dpi=dpi, bbox_inches='tight')
+    plt.close(fig)
+    return path
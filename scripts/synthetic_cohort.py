@@ -0,0 +1,160 @@
+"""
+Synthetic transfusion cohort with the schema of ``transfusion_data.csv``.
+
+For benchmarks and tests outside the hospital network. Rows are drawn
+independently (vectorized, in chunks for large files) with:
+
+- missingness rates close to the real extract (``MISSING_RATES``; the key
+  labs follow the notebook's ``cols_to_check`` comments)
+- messy race and language strings, as found in the source system
+- skewed LOS, transfusion counts and time to first transfusion, with
+  mortality and LOS depending on SOFA score and age
+"""
+import numpy as np
+import pandas as pd
+
+COLUMNS = [
+    'subject_id', 'hadm_id', 'age', 'gender', 'race', 'weight', 'insurance', 'language',
+    'sofa_score', 'admission_type', 'ongoing_bleeding', 'heart_disease', 'kidney_disease',
+    'history_of_bleeding', 'sepsis', 'baseline_hemoglobin', 'pre_transfusion_hemoglobin',
+    'post_transfusion_hemoglobin', 'baseline_wbc', 'baseline_platelets', 'baseline_hematocrit',
+    'baseline_creatinine', 'baseline_spo2', 'baseline_sao2', 'baseline_bp_systolic',
+    'baseline_bp_diastolic', 'on_vasopressors', 'vasopressor_type', 'on_diuretics',
+    'diuretic_type', 'time_to_first_transfusion_hours', 'early_transfusion',
+    'number_of_transfusions', 'units_first_transfusion', 'total_units_transfused',
+    'possible_hemolysis', 'ldh', 'bilirubin_total', 'bilirubin_direct', 'in_hospital_mortality',
+    'los_icu_days', 'los_hospital_days', 'dod', 'icd_version', 'primary_icd_code',
+    'primary_icd_long_title',
+]
+
+# Fraction of missing values per column
+MISSING_RATES = {
+    'race': 0.086, 'weight': 0.30, 'insurance': 0.052, 'language': 0.016,
+    'baseline_hemoglobin': 0.1095, 'pre_transfusion_hemoglobin': 0.174,
+    'post_transfusion_hemoglobin': 0.048, 'baseline_wbc': 0.1287,
+    'baseline_platelets': 0.126, 'baseline_hematocrit': 0.0957,
+    'baseline_creatinine': 0.045, 'baseline_spo2': 0.028, 'baseline_sao2': 0.51,
+    'baseline_bp_systolic': 0.042, 'baseline_bp_diastolic': 0.037,
+    'ldh': 0.40, 'bilirubin_total': 0.30, 'bilirubin_direct': 0.60,
+}
+
+# Raw race strings (with the spelling variants the recoding has to handle)
+RACE_VALUES = [
+    'WHITE', 'WHITE - RUSSIAN', 'WHITE - OTHER EUROPEAN', 'PORTUGUESE', 'White',
+    'BLACK/AFRICAN AMERICAN', 'BLACK/CAPE VERDEAN', 'BLACK/AFRICAN', 'BLACK/CARIBBEAN ISLAND',
+    'HISPANIC/LATINO - PUERTO RICAN', 'HISPANIC OR LATINO', 'SOUTH AMERICAN',
+    'ASIAN - CHINESE', 'ASIAN', 'ASIAN - KOREAN',
+    'AMERICAN INDIAN/ALASKA NATIVE', 'NATIVE HAWAIIAN OR OTHER PACIFIC ISLANDER',
+    'OTHER', 'MULTIPLE RACE/ETHNICITY', 'UNKNOWN', 'UNABLE TO OBTAIN', 'PATIENT DECLINED TO ANSWER',
+]
+RACE_WEIGHTS = [
+    0.20, 0.05, 0.02, 0.06, 0.01,
+    0.08, 0.04, 0.01, 0.01,
+    0.05, 0.02, 0.01,
+    0.05, 0.02, 0.01,
+    0.04, 0.01,
+    0.09, 0.01, 0.09, 0.08, 0.04,
+]
+LANGUAGE_VALUES = ['ENGLISH', 'SPANISH', 'CHINESE', '?', 'English', 'PORTUGUESE', 'RUSSIAN']
+LANGUAGE_WEIGHTS = [0.78, 0.10, 0.05, 0.04, 0.01, 0.01, 0.01]
+
+ICD_CODES = {
+    'A419': (10, 'Sepsis'), '0389': (9, 'Sepsis'),
+    'D62': (10, 'Acute posthemorrhagic anemia'), '2851': (9, 'Acute posthemorrhagic anemia'),
+    'K922': (10, 'GI hemorrhage'), '5789': (9, 'GI hemorrhage'),
+}
+
+
+def generate_cohort(n, seed=0, start_id=0):
+    """
+    ``n`` synthetic admissions as a DataFrame (IDs start after ``start_id``)
+    """
+    rng = np.random.default_rng(seed)
+    ids = np.arange(start_id, start_id + n)
+    age = np.clip(np.round(rng.normal(65, 15, n)), 18, 100)
+    sofa = np.clip(rng.poisson(5, n), 0, 20)
+    sepsis = rng.integers(0, 2, n)
+    on_vasopressors = (rng.random(n) < 0.3 + 0.04 * sofa).astype(int)
+    on_diuretics = rng.integers(0, 2, n)
+
+    # Skewed time to first transfusion (median about 5.5 h), early = within 6 h
+    time_to_transfusion = rng.gamma(1.0, 8.0, n)
+    ongoing_bleeding = rng.integers(0, 2, n)
+    n_transfusions = 1 + rng.negative_binomial(3, 0.7 - 0.1 * ongoing_bleeding, n)
+
+    # Mortality and LOS depend on severity and age
+    logit = -1.9 + 0.25 * (sofa - 5) + 0.03 * (age - 65) + 0.3 * sepsis
+    mortality = (rng.random(n) < 1 / (1 + np.exp(-logit))).astype(int)
+    los_icu = rng.lognormal(1.2 + 0.06 * (sofa - 5), 0.8, n)
+    los_hospital = los_icu + rng.lognormal(1.3, 0.7, n)
+
+    codes = np.array(list(ICD_CODES))
+    code = codes[rng.integers(0, len(codes), n)]
+    spo2 = rng.normal(96, 2, n)
+    systolic = rng.normal(115, 18, n)
+    hemoglobin = rng.normal(9, 1.5, n)
+
+    df = pd.DataFrame({
+        'subject_id': 10_000 + ids,
+        'hadm_id': 20_000_000 + ids,
+        'age': age,
+        'gender': rng.choice(['F', 'M'], n),
+        'race': rng.choice(RACE_VALUES, n, p=np.array(RACE_WEIGHTS) / sum(RACE_WEIGHTS)),
+        'weight': np.round(rng.normal(80, 15, n), 2),
+        'insurance': rng.choice(['Private', 'Other', 'Medicaid', 'Medicare'], n),
+        'language': rng.choice(LANGUAGE_VALUES, n, p=LANGUAGE_WEIGHTS),
+        'sofa_score': sofa,
+        'admission_type': rng.choice(['ELECTIVE', 'SURGICAL SAME DAY ADMISSION', 'URGENT', 'EW EMER.'], n),
+        'ongoing_bleeding': ongoing_bleeding,
+        'heart_disease': rng.integers(0, 2, n),
+        'kidney_disease': rng.integers(0, 2, n),
+        'history_of_bleeding': rng.integers(0, 2, n),
+        'sepsis': sepsis,
+        'baseline_hemoglobin': np.round(hemoglobin, 2),
+        'pre_transfusion_hemoglobin': np.round(rng.normal(7, 1, n), 2),
+        'post_transfusion_hemoglobin': np.round(rng.normal(8.5, 1, n), 2),
+        'baseline_wbc': np.round(rng.lognormal(2.3, 0.4, n), 2),
+        'baseline_platelets': np.round(np.clip(rng.normal(200, 60, n), 5, None), 2),
+        'baseline_hematocrit': np.round(hemoglobin * 3.1 + rng.normal(0, 2, n), 2),
+        'baseline_creatinine': np.round(rng.lognormal(0.2, 0.5, n), 2),
+        'baseline_spo2': np.round(spo2, 2),
+        'baseline_sao2': np.round(spo2 - 1 + rng.normal(0, 2, n), 2),
+        'baseline_bp_systolic': np.round(systolic, 2),
+        'baseline_bp_diastolic': np.round(systolic * 0.54 + rng.normal(0, 10, n), 2),
+        'on_vasopressors': on_vasopressors,
+        'vasopressor_type': np.where(on_vasopressors == 1,
+                                     rng.choice(['norepinephrine', 'phenylephrine', 'vasopressin'], n), None),
+        'on_diuretics': on_diuretics,
+        'diuretic_type': np.where(rng.random(n) < 0.9, rng.choice(['bumetanide', 'furosemide'], n), None),
+        'time_to_first_transfusion_hours': np.round(time_to_transfusion, 2),
+        'early_transfusion': (time_to_transfusion <= 6).astype(int),
+        'number_of_transfusions': n_transfusions,
+        'units_first_transfusion': rng.choice([250, 300, 350], n),
+        'total_units_transfused': rng.choice([250, 500, 750, 1000], n),
+        'possible_hemolysis': rng.integers(0, 2, n),
+        'ldh': np.round(rng.lognormal(5.5, 0.5, n), 2),
+        'bilirubin_total': np.round(rng.lognormal(0, 0.6, n), 2),
+        'bilirubin_direct': np.round(rng.lognormal(-1, 0.6, n), 2),
+        'in_hospital_mortality': mortality,
+        'los_icu_days': np.round(los_icu, 2),
+        'los_hospital_days': np.round(los_hospital, 2),
+        'dod': np.where(mortality == 1, '2150-01-01', None),
+        'icd_version': pd.Series(code).map({k: v[0] for k, v in ICD_CODES.items()}).to_numpy(),
+        'primary_icd_code': code,
+        'primary_icd_long_title': pd.Series(code).map({k: v[1] for k, v in ICD_CODES.items()}).to_numpy(),
+    })
+    for col, rate in MISSING_RATES.items():
+        df.loc[rng.random(n) < rate, col] = np.nan
+    return df[COLUMNS]
+
+
+def write_cohort(path, n, seed=0, chunksize=1_000_000):
+    """
+    Write ``n`` synthetic admissions to a CSV file, ``chunksize`` rows at a time
+    """
+    seeds = np.random.SeedSequence(seed).spawn(-(-n // chunksize))
+    for i, chunk_seed in enumerate(seeds):
+        start = i * chunksize
+        chunk = generate_cohort(min(chunksize, n - start), seed=chunk_seed, start_id=start)
+        chunk.to_csv(path, mode='w' if i == 0 else 'a', header=(i == 0), index=False)
+    return path
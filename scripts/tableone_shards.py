@@ -0,0 +1,96 @@
+"""
+Multi-site (sharded) Table One.
+
+Each shard (site, year or file) is summarized into a partial StreamingTableOne
+in a worker process. Partials are pickled on disk, keyed by the shard's
+content hash and the table spec, so only new or changed shards are
+recomputed. The partials are then merged into the per-group and overall
+columns without reading the raw rows again.
+"""
+import hashlib
+import inspect
+import json
+import multiprocessing
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+
+from cohort_loader import file_hash
+from figure_cache import module_sources
+from streaming_tableone import StreamingTableOne
+
+CACHE_DIR = ".tableone_shards"
+
+# Bump when the accumulator format changes to invalidate cached partials
+SUMMARY_VERSION = 1
+
+
+def spec_hash(spec, prepare=None):
+    """
+    Hash of the table spec (columns, groupby, rename, ...) and the prepare
+    step: its source and that of the local modules it uses (so editing it, or
+    e.g. the recoding tables it calls, recomputes the partials)
+    """
+    payload = json.dumps(spec, sort_keys=True, default=str)
+    if prepare is not None:
+        try:
+            payload += inspect.getsource(prepare)
+        except (OSError, TypeError):
+            payload += f"{prepare.__module__}.{prepare.__qualname__}"
+        payload += json.dumps(module_sources(prepare))
+    payload += str(SUMMARY_VERSION)
+    return hashlib.blake2b(payload.encode(), digest_size=8).hexdigest()
+
+
+def partial_path(path, spec, prepare=None, cache_dir=CACHE_DIR):
+    # The shard hashes are remembered in the cache folder (by size and mtime)
+    os.makedirs(cache_dir, exist_ok=True)
+    stem = os.path.splitext(os.path.basename(path))[0]
+    key = f"{file_hash(path, cache_dir=cache_dir)}-{spec_hash(spec, prepare)}"
+    return os.path.join(cache_dir, f"{stem}-{key}.pkl")
+
+
+def summarize_shard(path, spec, prepare=None, chunksize=200_000, usecols=None, cache_dir=CACHE_DIR):
+    """
+    Partial summary of one shard, read from the cache when available
+    """
+    cached = partial_path(path, spec, prepare, cache_dir)
+    if os.path.exists(cached):
+        with open(cached, 'rb') as f:
+            return pickle.load(f)
+
+    partial = StreamingTableOne.from_csv(path, prepare=prepare, chunksize=chunksize,
+                                         usecols=usecols, **spec)
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = f"{cached}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(partial, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, cached)
+    return partial
+
+
+def summarize_shards(paths, spec, prepare=None, chunksize=200_000, usecols=None,
+                     cache_dir=CACHE_DIR, max_workers=None):
+    """
+    Summarize all shards (changed ones in parallel) and merge them.
+
+    Returns (merged table, {path: partial}, [paths that were recomputed]).
+    """
+    stale = [p for p in paths if not os.path.exists(partial_path(p, spec, prepare, cache_dir))]
+    partials = {}
+    if stale:
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context('fork' if 'fork' in methods else None)
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=context) as pool:
+            futures = {p: pool.submit(summarize_shard, p, spec, prepare, chunksize, usecols, cache_dir)
+                       for p in stale}
+            for p, future in futures.items():
+                partials[p] = future.result()
+    for p in paths:
+        if p not in partials:
+            partials[p] = summarize_shard(p, spec, prepare, chunksize, usecols, cache_dir)
+
+    merged = StreamingTableOne(**spec)
+    for p in paths:
+        merged.merge(partials[p])
+    return merged, partials, stale
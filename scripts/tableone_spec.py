@@ -0,0 +1,162 @@
+"""
+Table One specification for the transfusion timing study.
+
+Shared by the in-memory (TableOne), streaming and per-site Table One scripts.
+"""
+from recoding import recode_language, recode_race
+
+# Define columns for Table 1
+columns = [
+    # Demographics
+    'age',
+    'gender',
+    'race_grouped',
+    'weight',
+    'insurance',
+    'language_grouped',
+    
+    # Diagnosis & Severity
+    'sofa_score',
+    'admission_type',
+    'ongoing_bleeding',
+    
+    # Comorbidities
+    'heart_disease',
+    'kidney_disease',
+    'history_of_bleeding',
+    'sepsis',
+    
+    # Baseline Labs - Hemoglobin
+    'baseline_hemoglobin',
+    'pre_transfusion_hemoglobin',
+    'baseline_wbc',
+    'baseline_platelets',
+    'baseline_hematocrit',
+    'baseline_creatinine',
+    
+    # Baseline Vitals
+    'baseline_spo2',
+    'baseline_sao2',
+    'baseline_bp_systolic',
+    'baseline_bp_diastolic',
+    
+    # Interventions
+    'on_vasopressors',
+    'vasopressor_type',
+    'on_diuretics',
+    
+    # Transfusion variables
+    'time_to_first_transfusion_hours',
+    'number_of_transfusions',
+    'units_first_transfusion',
+    'total_units_transfused',
+    
+    # Hemolysis
+    'possible_hemolysis',
+    'ldh',
+    'bilirubin_total',
+    
+    # Outcomes
+    'in_hospital_mortality',
+    'los_icu_days',
+    'los_hospital_days'
+]
+
+# Define categorical variables
+categorical = [
+    'gender',
+    'race_grouped',
+    'insurance',
+    'language_grouped',
+    'admission_type',
+    'ongoing_bleeding',
+    'heart_disease',
+    'kidney_disease',
+    'history_of_bleeding',
+    'sepsis',
+    'on_vasopressors',
+    'vasopressor_type',
+    'on_diuretics',
+    'possible_hemolysis',
+    'in_hospital_mortality'
+]
+
+# Define variables that should be shown as non-normal (median [IQR])
+nonnormal = [
+    'sofa_score',
+    'baseline_creatinine',
+    'time_to_first_transfusion_hours',
+    'number_of_transfusions',
+    'units_first_transfusion',
+    'total_units_transfused',
+    'los_icu_days',
+    'los_hospital_days',
+    'ldh',
+    'bilirubin_total'
+]
+
+# Rename columns for better display
+rename = {
+    'age': 'Age (years)',
+    'gender': 'Gender',
+    'race_grouped': 'Race/Ethnicity',
+    'weight': 'Weight (kg)',
+    'insurance': 'Insurance',
+    'language_grouped': 'Primary Language',
+    'sofa_score': 'SOFA Score',
+    'admission_type': 'Admission Type',
+    'ongoing_bleeding': 'Ongoing Bleeding',
+    'heart_disease': 'Heart Disease',
+    'kidney_disease': 'Chronic Kidney Disease',
+    'history_of_bleeding': 'History of Bleeding',
+    'sepsis': 'Sepsis',
+    'baseline_hemoglobin': 'Baseline Hemoglobin (g/dL)',
+    'pre_transfusion_hemoglobin': 'Pre-transfusion Hemoglobin (g/dL)',
+    'baseline_wbc': 'White Blood Cell Count (K/uL)',
+    'baseline_platelets': 'Platelet Count (K/uL)',
+    'baseline_hematocrit': 'Hematocrit (%)',
+    'baseline_creatinine': 'Creatinine (mg/dL)',
+    'baseline_spo2': 'SpO2 (%)',
+    'baseline_sao2': 'SaO2 from ABG (%)',
+    'baseline_bp_systolic': 'Systolic BP (mmHg)',
+    'baseline_bp_diastolic': 'Diastolic BP (mmHg)',
+    'on_vasopressors': 'Vasopressor Use',
+    'vasopressor_type': 'Vasopressor Type',
+    'on_diuretics': 'Diuretic Use',
+    'time_to_first_transfusion_hours': 'Time to First Transfusion (hours)',
+    'number_of_transfusions': 'Number of Transfusions',
+    'units_first_transfusion': 'Units in First Transfusion (mL)',
+    'total_units_transfused': 'Total Units Transfused (mL)',
+    'possible_hemolysis': 'Possible Hemolysis',
+    'ldh': 'LDH (U/L)',
+    'bilirubin_total': 'Total Bilirubin (mg/dL)',
+    'in_hospital_mortality': 'In-Hospital Mortality',
+    'los_icu_days': 'ICU Length of Stay (days)',
+    'los_hospital_days': 'Hospital Length of Stay (days)'
+}
+
+# Grouping variable and its display labels
+groupby = 'transfusion_timing'
+timing_labels = {
+    0: 'Late (>6h)',
+    1: 'Early (≤6h)'
+}
+
+# Source columns: race and language are read raw and grouped in prepare()
+source_columns = [c for c in columns if c not in ('race_grouped', 'language_grouped')]
+source_columns += ['race', 'language', 'early_transfusion']
+
+
+def prepare(df):
+    """
+    Add the grouping labels and the grouped race/language columns
+    """
+    # Create more readable labels for the grouping variable
+    df['transfusion_timing'] = df['early_transfusion'].map(timing_labels)
+
+    # Group race/ethnicity into main categories
+    df['race_grouped'] = recode_race(df['race'])
+
+    # Simplify language to English vs Non-English
+    df['language_grouped'] = recode_language(df['language'])
+    return df
@@ -0,0 +1,16 @@
+import os
+import sys
+
+import pytest
+
+# The study modules live in scripts/ and import each other by module name
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scripts'))
+
+
+@pytest.fixture(scope='session')
+def cohort():
+    """
+    Small synthetic cohort (2,000 admissions, fixed seed)
+    """
+    from synthetic_cohort import generate_cohort
+    return generate_cohort(2_000, seed=7)
@@ -0,0 +1,34 @@
+import tracemalloc
+
+import pytest
+
+import benchmark
+
+
+def test_run_and_compare(tmp_path, monkeypatch):
+    pytest.importorskip('pyarrow')
+    loads = []
+    load_snapshot = benchmark._load_snapshot
+    monkeypatch.setattr(benchmark, '_load_snapshot', lambda path: loads.append(path) or load_snapshot(path))
+
+    results = benchmark.run_benchmarks([2_000], stages=['recode', 'streaming_tableone'], work_dir=str(tmp_path))
+    # The loaded frame is reused for the recoded input
+    assert len(loads) == 1
+    rows = {row['stage']: row for row in results['results']}
+    assert set(rows) == {'generate', 'recode', 'streaming_tableone'}
+    assert 0 < rows['recode']['process_peak_rss_mb'] < 100_000
+
+    path = str(tmp_path / 'results.json')
+    benchmark.write_results(results, path)
+    table = benchmark.compare_results(path, path)
+    assert not table['regression'].any()
+
+
+def test_timed_run_is_not_traced():
+    tracing, setups = [], []
+    result, wall, cpu, peak = benchmark.measure(lambda: tracing.append(tracemalloc.is_tracing()) or bytearray(2**20),
+                                                setup=lambda: setups.append(1))
+    # One untraced (timed) run, then one traced run for the peak
+    assert tracing == [False, True] and len(setups) == 2
+    assert len(result) == 2**20 and wall >= 0 and peak >= 1
+    assert benchmark.measure(len, [1, 2], memory=False)[3] is None
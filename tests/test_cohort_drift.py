@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+from cohort_drift import CohortDrift
+from cohort_flow import CohortFlow
+
+equiflow = pytest.importorskip('equiflow')
+
+CONTINUOUS = ['age', 'baseline_hemoglobin', 'sofa_score']
+CATEGORICAL = ['gender', 'insurance', 'race', 'sepsis']
+EXCLUSIONS = ['baseline_bp_systolic', 'baseline_wbc', 'pre_transfusion_hemoglobin']
+
+
+@pytest.fixture(scope='module')
+def flow(cohort):
+    flow = CohortFlow(cohort)
+    for keep in EXCLUSIONS:
+        flow.add_exclusion(keep=keep, exclusion_reason=f"missing {keep}", new_cohort_label=f"Complete {keep}")
+    return flow
+
+
+@pytest.mark.parametrize('missingness', [True, False])
+def test_smd_matches_equiflow(flow, missingness):
+    drift = CohortDrift(flow, continuous=CONTINUOUS, categorical=CATEGORICAL, missingness=missingness)
+    dfs = [flow.data[flow.mask(i)] for i in range(len(flow) + 1)]
+    expected = equiflow.equiflow.TableDrifts(dfs, categorical=CATEGORICAL, normal=CONTINUOUS, decimals=10,
+                                             missingness=missingness).view()
+    result = drift.matrix('previous').loc[expected.index]
+    # EquiFlow rounds the level percentages (to ``decimals``) before the
+    # pseudo-inverse of a singular covariance, hence the relative tolerance
+    np.testing.assert_allclose(result.to_numpy(dtype=float), expected.to_numpy(dtype=float), rtol=1e-5, atol=1e-9)
+
+
+def test_proportions(flow):
+    drift = CohortDrift(flow, categorical=['insurance'])
+    counts = flow.data['insurance'].value_counts()
+    p = dict(zip(drift.levels, drift.proportions()[0]))
+    assert p[('insurance', 'Medicare')] == pytest.approx(counts['Medicare'] / len(flow.data))
+    drift = CohortDrift(flow, categorical=['insurance'], missingness=False)
+    p = dict(zip(drift.levels, drift.proportions()[0]))
+    assert p[('insurance', 'Medicare')] == pytest.approx(counts['Medicare'] / counts.sum())
@@ -0,0 +1,50 @@
+import os
+
+import pandas as pd
+import pytest
+
+from cohort_loader import load_cohort
+
+COLUMNS = ['subject_id', 'age', 'sofa_score', 'in_hospital_mortality', 'primary_icd_code', 'race']
+
+
+@pytest.fixture(scope='module')
+def extracts(cohort, tmp_path_factory):
+    folder = tmp_path_factory.mktemp('extracts')
+    csv_path, parquet_path = str(folder / 'cohort.csv'), str(folder / 'cohort.parquet')
+    cohort.to_csv(csv_path, index=False)
+    cohort.to_parquet(parquet_path, index=False)
+    return csv_path, parquet_path, str(folder / 'snapshots')
+
+
+def test_parquet_extract_matches_csv(extracts):
+    pytest.importorskip('pyarrow')
+    csv_path, parquet_path, cache_dir = extracts
+    from_csv = load_cohort(csv_path, columns=COLUMNS, cache_dir=cache_dir)
+    from_parquet = load_cohort(parquet_path, columns=COLUMNS, cache_dir=cache_dir)
+    pd.testing.assert_frame_equal(from_parquet, from_csv)
+
+
+@pytest.mark.parametrize('use_cache', [True, False])
+def test_codes_stay_text(extracts, use_cache):
+    csv_path, _, cache_dir = extracts
+    codes = load_cohort(csv_path, columns=['primary_icd_code'], cache_dir=cache_dir, use_cache=use_cache)
+    assert '0389' in set(codes['primary_icd_code'].astype(str))
+
+
+def test_snapshots_of_similar_names_are_kept(cohort, tmp_path):
+    pytest.importorskip('pyarrow')
+    from cohort_loader import snapshot_path
+
+    cache_dir = str(tmp_path / 'snapshots')
+    blood, blood_2024 = str(tmp_path / 'blood.csv'), str(tmp_path / 'blood-2024.csv')
+    cohort.head(50).to_csv(blood, index=False)
+    cohort.tail(50).to_csv(blood_2024, index=False)
+    other = snapshot_path(blood_2024, cache_dir=cache_dir)
+    first = snapshot_path(blood, cache_dir=cache_dir)
+    assert os.path.exists(other)
+    # A new version of blood.csv replaces only blood.csv's snapshot
+    cohort.head(60).to_csv(blood, index=False)
+    second = snapshot_path(blood, cache_dir=cache_dir)
+    assert second != first and not os.path.exists(first)
+    assert os.path.exists(other)
@@ -0,0 +1,58 @@
+import functools
+import importlib
+import sys
+
+import pytest
+
+from figure_cache import Panel, content_hash, render_panels
+
+PANELS = '''
+from panel_colors import COLOR
+
+
+def bars(ax, data, title=''):
+    ax.bar(range(len(data)), data, color=COLOR)
+    ax.set_title(title)
+'''
+
+
+@pytest.fixture
+def panels(tmp_path, monkeypatch):
+    folder = tmp_path / 'mods'
+    folder.mkdir()
+    (folder / 'panel_funcs.py').write_text(PANELS)
+    (folder / 'panel_colors.py').write_text("COLOR = 'red'\n")
+    monkeypatch.syspath_prepend(str(folder))
+
+    def load():
+        for name in ['panel_funcs', 'panel_colors']:
+            sys.modules.pop(name, None)
+        return importlib.import_module('panel_funcs')
+    yield load, folder
+    for name in ['panel_funcs', 'panel_colors']:
+        sys.modules.pop(name, None)
+
+
+def test_function_hash_follows_its_code(panels):
+    load, folder = panels
+    before = content_hash(load().bars)
+    assert content_hash(load().bars) == before
+    (folder / 'panel_colors.py').write_text("COLOR = 'blue'\n")
+    assert content_hash(load().bars) != before
+    module = load()
+    assert content_hash(functools.partial(module.bars, title='a')) != \
+        content_hash(functools.partial(module.bars, title='b'))
+
+
+def test_edited_panel_is_rendered_again(panels, tmp_path):
+    pytest.importorskip('matplotlib')
+    load, folder = panels
+    outputs, cache_dir = str(tmp_path / 'figure.png'), str(tmp_path / 'cache')
+
+    def render():
+        return render_panels([Panel(load().bars, [1, 2, 3], {'title': 'x'})], outputs, (1, 1),
+                             panel_size=(2, 2), dpi=50, cache_dir=cache_dir, max_workers=1)
+    assert render() == 1
+    assert render() == 0
+    (folder / 'panel_funcs.py').write_text(PANELS.replace("ax.set_title(title)", "ax.set_title(title.upper())"))
+    assert render() == 1
@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+import pytest
+from scipy import stats
+
+from group_stats import compare_groups
+
+CONTINUOUS = ['age', 'baseline_hemoglobin', 'los_icu_days', 'sofa_score']
+NONNORMAL = ['los_icu_days', 'sofa_score']
+CATEGORICAL = ['gender', 'insurance', 'sepsis']
+GROUPS = [1, 0]
+
+
+@pytest.fixture(scope='module')
+def comparison(cohort):
+    return compare_groups(cohort, 'early_transfusion', continuous=CONTINUOUS, categorical=CATEGORICAL,
+                          nonnormal=NONNORMAL, groups=GROUPS, labels={1: 'Early', 0: 'Late'})
+
+
+def _groups(cohort, col):
+    return [cohort.loc[cohort['early_transfusion'] == g, col].dropna() for g in GROUPS]
+
+
+@pytest.mark.parametrize('col', CONTINUOUS)
+def test_continuous_matches_scipy(cohort, comparison, col):
+    a, b = _groups(cohort, col)
+    row = comparison.loc[(col, '')]
+    if col in NONNORMAL:
+        expected = stats.mannwhitneyu(a, b, use_continuity=True, alternative='two-sided', method='asymptotic')
+    else:
+        expected = stats.ttest_ind(a, b, equal_var=False)
+    assert row['statistic'] == pytest.approx(expected.statistic, rel=1e-9)
+    assert row['p_value'] == pytest.approx(expected.pvalue, rel=1e-9)
+    assert row['n_Early'] == len(a)
+    assert row['mean_Early'] == pytest.approx(a.mean(), rel=1e-12)
+    assert row['std_Late'] == pytest.approx(b.std(), rel=1e-12)
+    assert row['median_Late'] == pytest.approx(b.median(), rel=1e-12)
+    assert row['q3_Early'] == pytest.approx(a.quantile(0.75), rel=1e-12)
+
+
+@pytest.mark.parametrize('col', CATEGORICAL)
+def test_categorical_matches_scipy(cohort, comparison, col):
+    table = pd.crosstab(cohort['early_transfusion'], cohort[col]).loc[GROUPS]
+    chi2, p, _, _ = stats.chi2_contingency(table.to_numpy())
+    rows = comparison.loc[col]
+    assert rows['statistic'].iloc[0] == pytest.approx(chi2, rel=1e-9)
+    assert rows['p_value'].iloc[0] == pytest.approx(p, rel=1e-9)
+    np.testing.assert_array_equal(rows['count_Early'].to_numpy(), table.iloc[0].to_numpy())
+    np.testing.assert_array_equal(rows['count_Late'].to_numpy(), table.iloc[1].to_numpy())
+
+
+def test_expects_two_groups(cohort):
+    with pytest.raises(ValueError):
+        compare_groups(cohort, 'insurance', continuous=['age'])
@@ -0,0 +1,91 @@
+import os
+
+import pandas as pd
+import pytest
+
+pytest.importorskip('pyarrow')
+
+from incremental import IncrementalCohort  # noqa: E402
+
+SPEC = dict(columns=['age', 'los_icu_days', 'gender'], categorical=['gender'], nonnormal=['los_icu_days'],
+            groupby='early_transfusion')
+EXCLUSIONS = [('baseline_wbc', "missing WBC", "Complete WBC"),
+              ('diuretic_type', "missing diuretic type", "Complete diuretic type")]
+
+
+def new_cohort():
+    return IncrementalCohort(key='hadm_id', exclusions=EXCLUSIONS, table_spec=SPEC)
+
+
+def parts(path):
+    return sorted(name for name in os.listdir(path) if name.endswith('.parquet'))
+
+
+def assert_same(cohort, data):
+    scratch = new_cohort()
+    scratch.refresh(data)
+    pd.testing.assert_frame_equal(cohort.counts(), scratch.counts())
+    pd.testing.assert_frame_equal(cohort.table.tableone, scratch.table.tableone)
+    pd.testing.assert_frame_equal(cohort.plots.tableone, scratch.plots.tableone)
+    assert sorted(cohort.frame['hadm_id']) == sorted(data['hadm_id'])
+
+
+def test_refresh_save_load(cohort, tmp_path):
+    state = str(tmp_path / 'state')
+    first = cohort.iloc[:1500]
+    inc = new_cohort()
+    inc.refresh(first)
+    inc.save(state)
+    assert parts(state) == ['rows-000001.parquet']
+
+    # Unchanged extract: nothing is written but the state
+    inc = IncrementalCohort.load(state)
+    assert inc.refresh(first) == ([], [], [])
+    inc.save(state)
+    assert parts(state) == ['rows-000001.parquet']
+
+    # 100 changed, 200 removed, 500 added: one new part with the 600 new versions
+    second = pd.concat([cohort.iloc[200:1500], cohort.iloc[1500:]])
+    second.loc[second.index[:100], 'age'] += 1
+    inc = IncrementalCohort.load(state)
+    delta = inc.refresh(second)
+    assert (len(delta.added), len(delta.changed), len(delta.removed)) == (500, 100, 200)
+    inc.save(state)
+    assert parts(state) == ['rows-000001.parquet', 'rows-000002.parquet']
+    assert len(pd.read_parquet(os.path.join(state, 'rows-000002.parquet'))) == 600
+    assert_same(IncrementalCohort.load(state), second)
+
+
+def test_compaction(cohort, tmp_path):
+    state = str(tmp_path / 'state')
+    inc = new_cohort()
+    inc.refresh(cohort.iloc[:1000])
+    inc.save(state)
+    # The same 600 rows change twice: old versions then outnumber current ones
+    for shift in [1, 2]:
+        data = cohort.iloc[:1000].copy()
+        data.loc[data.index[:600], 'age'] += shift
+        inc = IncrementalCohort.load(state)
+        inc.refresh(data)
+        inc.save(state)
+    assert len(parts(state)) == 1
+    assert_same(IncrementalCohort.load(state), data)
+
+
+def test_resume_rebuilds_on_new_settings(cohort, tmp_path):
+    state = str(tmp_path / 'state')
+    settings = dict(key='hadm_id', exclusions=EXCLUSIONS, table_spec=SPEC)
+    saved = IncrementalCohort.resume(state, **settings)
+    saved.refresh(cohort)
+    saved.save(state)
+    assert len(IncrementalCohort.resume(state, **settings).hashes) == len(cohort)
+    # Changed exclusions or table spec: the saved state is not reused
+    for changed in [dict(settings, exclusions=EXCLUSIONS[:1]),
+                    dict(settings, table_spec=dict(SPEC, columns=['age', 'gender']))]:
+        resumed = IncrementalCohort.resume(state, **changed)
+        assert len(resumed.hashes) == 0
+        resumed.refresh(cohort)
+        resumed.save(state)
+        scratch = IncrementalCohort(**changed)
+        scratch.refresh(cohort)
+        pd.testing.assert_frame_equal(IncrementalCohort.load(state).counts(), scratch.counts())
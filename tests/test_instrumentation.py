@@ -0,0 +1,34 @@
+import time
+
+import pytest
+
+import instrumentation
+
+
+def test_configure_keeps_unspecified_settings(monkeypatch, tmp_path):
+    monkeypatch.setattr(instrumentation, '_config', dict(instrumentation._config, profile={'train'},
+                                                         profiler='sampling'))
+    instrumentation.configure(trace=str(tmp_path / 'trace.jsonl'))
+    assert instrumentation._config['profile'] == {'train'}
+    assert instrumentation._config['profiler'] == 'sampling'
+    assert instrumentation._config['trace'] == str(tmp_path / 'trace.jsonl')
+    instrumentation.configure(profile=['*'])
+    assert instrumentation._config['profile'] == {'*'}
+
+
+def test_stage_memory_is_per_stage():
+    np = pytest.importorskip('numpy')
+    if instrumentation._rss_mb() is None:
+        pytest.skip("RSS is not readable on this platform")
+    with instrumentation.stage('allocate', emit=False) as big:
+        block = np.ones(200 * 2**20 // 8)
+        time.sleep(0.05)
+        del block
+    with instrumentation.stage('small', emit=False) as small:
+        time.sleep(0.05)
+    for record in (big, small):
+        assert record.peak_rss_mb >= max(record.rss_mb, record.rss_start_mb)
+        assert record.process_peak_rss_mb >= record.peak_rss_mb - 1
+    # The freed block shows in the first stage's peak only
+    assert big.rss_delta_mb > 150
+    assert small.rss_delta_mb < 50
@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from cohort_flow import CohortFlow
+from lazy_backend import LazyCohort
+
+pytest.importorskip('pyarrow')
+
+EXCLUSIONS = [
+    ('baseline_bp_systolic', "missing BP Systolic data", "Complete BP Systolic data"),
+    ([('age', '>=', 18), ('age', '<', 90)], "age outside 18-89", "Adults under 90"),
+    ([('gender', '==', 'F')], "male", "Female"),
+    ('baseline_wbc', "missing WBC", "Complete WBC"),
+]
+BACKENDS = ['arrow', 'duckdb', 'polars']
+
+
+@pytest.fixture(scope='module')
+def snapshot(cohort, tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('lazy') / 'cohort.parquet')
+    cohort.to_parquet(path, index=False)
+    return path
+
+
+@pytest.fixture(scope='module', params=BACKENDS)
+def lazy(request, snapshot):
+    if request.param != 'arrow':
+        pytest.importorskip(request.param)
+    return LazyCohort(snapshot, backend=request.param)
+
+
+def test_step_counts_match_cohort_flow(cohort, lazy):
+    masks = {1: (cohort['age'] >= 18) & (cohort['age'] < 90), 2: cohort['gender'] == 'F'}
+    flow = CohortFlow(cohort)
+    for i, (keep, reason, label) in enumerate(EXCLUSIONS):
+        flow.add_exclusion(keep=masks.get(i, keep), exclusion_reason=reason, new_cohort_label=label)
+    pd.testing.assert_frame_equal(lazy.step_counts(EXCLUSIONS), flow.counts(), check_dtype=False)
+
+
+def test_count_and_value_counts_match_pandas(cohort, lazy):
+    assert lazy.count() == len(cohort)
+    assert lazy.count([('sepsis', '==', 1), ('age', '>', 60)]) == ((cohort['sepsis'] == 1) & (cohort['age'] > 60)).sum()
+    result = lazy.value_counts('insurance')
+    expected = cohort['insurance'].value_counts().sort_index()
+    np.testing.assert_array_equal(result.index.astype(str), expected.index.astype(str))
+    np.testing.assert_array_equal(result.to_numpy(), expected.to_numpy())
+
+
+def test_summarize_matches_pandas(cohort, lazy):
+    result = lazy.summarize(['age', 'sofa_score'], by='gender')
+    for (gender, col), row in result.iterrows():
+        values = cohort.loc[cohort['gender'] == gender, col].dropna()
+        assert row['n'] == len(values)
+        assert row['mean'] == pytest.approx(values.mean(), rel=1e-9)
+        assert row['std'] == pytest.approx(values.std(), rel=1e-9)
+        assert row['median'] == pytest.approx(values.median(), rel=1e-9)
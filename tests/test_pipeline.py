@@ -0,0 +1,53 @@
+import importlib
+import os
+import sys
+
+import pytest
+
+from pipeline import Node, Pipeline
+
+STAGES = '''
+def double(out_dir, x):
+    import helper
+    return helper.scale(x)
+
+
+def fail(out_dir, x):
+    with open(f"{out_dir}/partial.txt", "w") as f:
+        f.write("partial")
+    raise RuntimeError("stage failed")
+'''
+
+
+@pytest.fixture
+def stages(tmp_path, monkeypatch):
+    folder = tmp_path / 'mods'
+    folder.mkdir()
+    (folder / 'pipeline_stages.py').write_text(STAGES)
+    (folder / 'helper.py').write_text("def scale(x):\n    return 2 * x\n")
+    monkeypatch.syspath_prepend(str(folder))
+    for name in ['pipeline_stages', 'helper']:
+        sys.modules.pop(name, None)
+    yield importlib.import_module('pipeline_stages'), folder
+    for name in ['pipeline_stages', 'helper']:
+        sys.modules.pop(name, None)
+
+
+def test_key_follows_imported_module_source(stages, tmp_path):
+    module, folder = stages
+    nodes = [Node('double', module.double, params={'x': 3})]
+    before = Pipeline(nodes, cache_dir=str(tmp_path / 'cache')).key('double')
+    assert Pipeline(nodes, cache_dir=str(tmp_path / 'cache')).key('double') == before
+    # A change in a module the stage imports lazily changes the key
+    (folder / 'helper.py').write_text("def scale(x):\n    return 3 * x\n")
+    assert Pipeline(nodes, cache_dir=str(tmp_path / 'cache')).key('double') != before
+
+
+def test_failed_node_leaves_no_partial_output(stages, tmp_path):
+    module, _ = stages
+    cache_dir = tmp_path / 'cache'
+    pipeline = Pipeline([Node('fail', module.fail, params={'x': 1})], output_dir=str(tmp_path / 'out'),
+                        cache_dir=str(cache_dir), max_workers=1)
+    with pytest.raises(RuntimeError):
+        pipeline.run()
+    assert os.listdir(cache_dir) == []
@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('sklearn')
+
+from scipy import sparse  # noqa: E402
+from sklearn.linear_model import LogisticRegression  # noqa: E402
+
+from model_selection import bin_target  # noqa: E402
+from preprocessing import (build_features, clean, feature_matrix, make_transformer, split_columns,  # noqa: E402
+                           transform)
+
+
+def test_encoder_fitted_on_all_rows_matches_fit_on_train(cohort, tmp_path):
+    # Standardized numeric columns, so the Newton solver converges to precision
+    data = cohort.copy()
+    numeric = data.select_dtypes(include=[np.number]).columns.drop('number_of_transfusions')
+    data[numeric] = (data[numeric] - data[numeric].mean()) / data[numeric].std()
+    features = build_features(data, cache_dir=str(tmp_path))
+    y = bin_target(features.target.clip(min=0))[2]
+    X = clean(data).drop(columns=['number_of_transfusions'])
+
+    # Every admission of the rarest race group (and a third of the others) is held out
+    race = X['race'].to_numpy()
+    rare = X['race'].value_counts().index[-1]
+    test = (race == rare) | (np.arange(len(X)) % 3 == 0)
+    train = ~test
+
+    # Encoder fitted inside the training split only (same float32 numeric block)
+    transformer = make_transformer(*split_columns(X)).fit(X[train])
+    assert f"cat__race_{rare}" in features.feature_names
+    assert f"cat__race_{rare}" not in transformer.get_feature_names_out()
+    numeric, onehot = transform(transformer, X)
+    X_inside = sparse.hstack([onehot, sparse.csr_matrix(numeric)], format='csr')
+    inside = LogisticRegression(solver='newton-cholesky', tol=1e-8).fit(X_inside[train], y[train])
+
+    # Encoder fitted on all rows (as build_features): the held-out level is an all-zero training column
+    X_all = feature_matrix(features)
+    shared = LogisticRegression(solver='newton-cholesky', tol=1e-8).fit(X_all[train], y[train])
+    assert shared.coef_[0, features.feature_names.index(f"cat__race_{rare}")] == pytest.approx(0, abs=1e-8)
+    np.testing.assert_allclose(shared.predict_proba(X_all[test]),
+                               inside.predict_proba(X_inside[test]), atol=1e-6)
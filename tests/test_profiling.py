@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from profiling import DataProfile
+
+
+def test_chunked_csv_matches_frame(cohort, tmp_path):
+    path = str(tmp_path / 'cohort.csv')
+    # ICD-9 codes first: the first chunks only have all-digit codes
+    cohort.sort_values('primary_icd_code').to_csv(path, index=False)
+    chunked = DataProfile.from_csv(path, chunksize=250)
+    whole = DataProfile.from_frame(pd.read_csv(path, dtype={'primary_icd_code': str}))
+
+    assert 'primary_icd_code' in chunked.counts
+    assert chunked.counts['primary_icd_code'] == whole.counts['primary_icd_code']
+    assert chunked.counts['primary_icd_code']['0389'] == (cohort['primary_icd_code'] == '0389').sum()
+    assert chunked.numeric == whole.numeric
+    np.testing.assert_allclose(chunked.moments.mean, whole.moments.mean)
+    np.testing.assert_allclose(chunked.moments.std, whole.moments.std)
+
+
+def test_column_missing_in_first_chunk_becomes_text():
+    first = pd.DataFrame({'age': [60.0, 70.0], 'note': [np.nan, np.nan]})
+    later = pd.DataFrame({'age': [80.0], 'note': ['bleeding']})
+    profile = DataProfile(schema=None).update(first).update(later)
+    assert profile.numeric == ['age'] and profile.counts['note'] == {'bleeding': 1}
+    assert profile.moments.mean[0] == pytest.approx(70.0)
+
+    merged = DataProfile(schema=None).update(first).merge(DataProfile(schema=None).update(later))
+    assert merged.numeric == ['age'] and merged.counts['note'] == {'bleeding': 1}
+
+    with pytest.raises(ValueError):
+        DataProfile(schema=None).update(pd.DataFrame({'note': [1.0]})).update(later[['note']])
+
+
+def test_csv_sample_of_n_rows(cohort, tmp_path):
+    path = str(tmp_path / 'cohort.csv')
+    cohort.to_csv(path, index=False)
+    seen = []
+
+    def prepare(rows):
+        seen.append(rows)
+        return rows
+    sampled = DataProfile.from_csv(path, chunksize=250, sample=300, seed=1, prepare=prepare)
+    assert sampled.n_rows == 300
+    [rows] = seen
+    # Rows drawn from the whole file, each at most once
+    assert rows['hadm_id'].is_unique and rows['hadm_id'].isin(cohort['hadm_id']).all()
+    assert rows['hadm_id'].isin(cohort['hadm_id'].iloc[1750:]).any()
+    # More than the file has: every row
+    whole = DataProfile.from_csv(path, chunksize=250, sample=10_000)
+    assert whole.n_rows == len(cohort)
+    np.testing.assert_allclose(whole.moments.mean, DataProfile.from_csv(path).moments.mean)
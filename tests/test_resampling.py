@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+from scipy import stats
+
+from resampling import compare_outcomes, resample_effect
+
+
+@pytest.fixture(scope='module')
+def groups(cohort):
+    early = cohort['early_transfusion'] == 1
+    return cohort[early], cohort[~early]
+
+
+@pytest.mark.parametrize('outcome, statistic', [('los_icu_days', 'mean'), ('los_icu_days', 'median'),
+                                                ('in_hospital_mortality', 'mean')])
+def test_matches_scipy(groups, outcome, statistic):
+    a, b = (g[outcome].dropna().to_numpy(dtype=float) for g in groups)
+    result = resample_effect(a, b, statistic=statistic, n_resamples=4000, seed=1)
+
+    stat = np.mean if statistic == 'mean' else np.median
+
+    def effect(x, y, axis=-1):
+        return stat(x, axis=axis) - stat(y, axis=axis)
+
+    boot = stats.bootstrap((a, b), effect, n_resamples=4000, method='percentile', random_state=2)
+    perm = stats.permutation_test((a, b), effect, n_resamples=4000, random_state=3)
+    assert result['effect'] == pytest.approx(effect(a, b))
+    spread = boot.confidence_interval.high - boot.confidence_interval.low
+    assert result['ci_low'] == pytest.approx(boot.confidence_interval.low, abs=0.1 * spread)
+    assert result['ci_high'] == pytest.approx(boot.confidence_interval.high, abs=0.1 * spread)
+    assert result['p_perm'] == pytest.approx(perm.pvalue, abs=0.03)
+
+
+def test_independent_of_chunks_and_workers(groups):
+    a, b = (g['los_icu_days'].to_numpy(dtype=float) for g in groups)
+    one = resample_effect(a, b, n_resamples=500, max_bytes=2**20)
+    assert resample_effect(a, b, n_resamples=500, max_bytes=2**20, max_workers=2) == one
+
+
+def test_rejects_bad_arguments(cohort):
+    with pytest.raises(ValueError):
+        resample_effect([1.0, 2.0], [3.0, 4.0], n_resamples=0)
+    with pytest.raises(ValueError):
+        resample_effect([1.0, 2.0], [3.0, 4.0], statistic='mode')
+    with pytest.raises(ValueError):
+        compare_outcomes(cohort, 'early_transfusion', {'los_icu_days': 'mean'}, n_resamples=0)
+    for a, b in [([], [0.0, 1.0]), ([1.0, 0.0], [np.nan]), ([1.5], [])]:
+        with pytest.raises(ValueError, match='non-missing'):
+            resample_effect(a, b, n_resamples=10)
@@ -0,0 +1,101 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip('pyarrow')
+pytest.importorskip('sklearn')
+
+from cohort_loader import load_cohort  # noqa: E402
+from scoring import Scorer, export_model, score_csv  # noqa: E402
+
+
+@pytest.fixture(scope='module')
+def scorer(cohort, tmp_path_factory):
+    from sklearn.linear_model import LogisticRegression
+
+    from preprocessing import build_features, feature_matrix
+
+    path = tmp_path_factory.mktemp('model')
+    features = build_features(cohort, cache_dir=str(path / 'features'), use_cache=False)
+    y = (features.target > 1).astype(int)
+    model = LogisticRegression(max_iter=1000).fit(feature_matrix(features), y)
+    export_model(model, features.transformer, str(path / 'model'))
+    return Scorer(str(path / 'model'))
+
+
+def test_score_csv_matches_score_frame(scorer, cohort, tmp_path):
+    # Only all-digit ICD-9 codes: read with inferred types, this chunk would parse them as int
+    data = cohort[cohort['primary_icd_code'].isin(['0389', '2851', '5789'])]
+    csv_path = str(tmp_path / 'extract.csv')
+    data.to_csv(csv_path, index=False)
+
+    out_path = str(tmp_path / 'scores.parquet')
+    n_rows = score_csv(scorer, csv_path, out_path, chunksize=100)
+    batch = pd.read_parquet(out_path)
+    expected = scorer.score_frame(load_cohort(csv_path, cache_dir=str(tmp_path / 'snapshots'))).reset_index(drop=True)
+
+    assert n_rows == len(data)
+    assert batch['prediction'].notna().any()
+    pd.testing.assert_frame_equal(batch, expected, check_dtype=False)
+
+
+def test_score_records_matches_score_frame(scorer, cohort):
+    data = cohort.dropna(subset=scorer.cat_cols + scorer.num_cols).head(50)
+    records = data.astype(object).where(data.notna(), None).to_dict('records')
+    online = scorer.score_records(records)
+    batch = scorer.score_frame(data)
+    assert [r['prediction'] for r in online] == batch['prediction'].tolist()
+    np.testing.assert_allclose([[r['probabilities'][c] for c in scorer.classes] for r in online],
+                               batch[[f'prob_{c}' for c in scorer.classes]].to_numpy(), atol=1e-6)
+
+
+def test_malformed_request_gets_400(scorer):
+    import asyncio
+    import json
+
+    from scoring import MicroBatcher, _handle
+
+    async def request(raw):
+        batcher = MicroBatcher(scorer)
+        server = await asyncio.start_server(lambda r, w: _handle(r, w, batcher), '127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        async with server:
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.write(raw)
+            await writer.drain()
+            response = await reader.read()
+            writer.close()
+        return response
+
+    for raw in [b'GARBAGE\r\n\r\n', b'POST /score HTTP/1.1\r\nContent-Length: abc\r\n\r\n',
+                b'GET /health HTTP/1.1\r\n\xff\xfe\r\n\r\n']:
+        status, _, body = asyncio.run(request(raw)).partition(b'\r\n\r\n')
+        assert status.startswith(b'HTTP/1.1 400')
+        assert 'Malformed request' in json.loads(body)['error']
+
+
+def test_non_object_body_gets_400(scorer):
+    import asyncio
+    import json
+
+    from scoring import MicroBatcher, _handle
+
+    async def post(body):
+        batcher = MicroBatcher(scorer)
+        batch_task = asyncio.create_task(batcher.run())
+        server = await asyncio.start_server(lambda r, w: _handle(r, w, batcher), '127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        async with server:
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.write(b'POST /score HTTP/1.1\r\nConnection: close\r\n'
+                         + f'Content-Length: {len(body)}\r\n\r\n'.encode() + body)
+            await writer.drain()
+            response = await reader.read()
+            writer.close()
+        batch_task.cancel()
+        return response
+
+    for body in [b'[1, 2]', b'"abc"', b'[{}, null]']:
+        status, _, payload = asyncio.run(post(body)).partition(b'\r\n\r\n')
+        assert status.startswith(b'HTTP/1.1 400')
+        assert 'JSON object' in json.loads(payload)['error']
@@ -0,0 +1,83 @@
+import os
+
+import numpy as np
+import pytest
+
+import stats_cache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    saved = dict(stats_cache._config)
+    stats_cache.configure(cache_dir=str(tmp_path / 'stats'), enabled=True)
+    stats_cache.counts.clear()
+    yield tmp_path / 'stats'
+    stats_cache._config.update(saved)
+    stats_cache._size['bytes'] = None
+
+
+def test_hit_returns_stored_result(cache):
+    calls = []
+
+    @stats_cache.memoize
+    def total(x):
+        calls.append(x)
+        return float(np.sum(x))
+
+    x = np.arange(10.0)
+    assert total(x) == total(x.copy()) == 45.0
+    assert len(calls) == 1
+    assert (stats_cache.counts['hits'], stats_cache.counts['misses']) == (1, 1)
+
+
+def test_version_is_module_source():
+    # A change anywhere in group_stats (e.g. a helper of compare_groups) changes the key
+    import inspect
+
+    import group_stats
+    assert stats_cache._version(group_stats.compare_groups) == inspect.getsource(group_stats)
+
+
+def test_evicts_only_past_the_limit(cache, monkeypatch):
+    scans = []
+    entries = stats_cache._entries
+    monkeypatch.setattr(stats_cache, '_entries', lambda d: scans.append(d) or entries(d))
+    stats_cache.configure(max_mb=100_000 / 2**20)
+
+    # Entries of about 8 kB: one scan for the running size, then one per eviction
+    full = stats_cache.memoize(lambda x: np.full(1000, x, dtype=np.float64), name='full')
+    for i in range(12):
+        full(i)
+    assert len(scans) == 1 and stats_cache.counts['evictions'] == 0
+    full(12)
+    assert len(scans) == 2 and stats_cache.counts['evictions'] > 0
+    sizes = [os.path.getsize(os.path.join(d, f)) for d, _, fs in os.walk(cache) for f in fs if f.endswith('.pkl')]
+    assert sum(sizes) <= 75_000
+    assert full(12)[0] == 12 and stats_cache.counts['hits'] == 1
+
+
+def test_unreadable_entry_is_a_miss(cache):
+    @stats_cache.memoize
+    def total(x):
+        return float(np.sum(x))
+
+    x = np.arange(5.0)
+    assert total(x) == 10.0
+    [entry] = [os.path.join(d, f) for d, _, files in os.walk(cache) for f in files if f.endswith('.pkl')]
+    # As left by another library version: unpickling raises AttributeError
+    with open(entry, 'wb') as f:
+        f.write(b"cstats_cache\nno_such_name\n.")
+    assert total(x) == 10.0
+    assert stats_cache.counts['misses'] == 2
+    with open(entry, 'rb') as f:
+        assert stats_cache.pickle.load(f) == 10.0
+
+
+def test_concurrent_writes_of_one_key(cache):
+    from concurrent.futures import ThreadPoolExecutor
+
+    path = str(cache / 'ab' / 'abcd.pkl')
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        sizes = list(pool.map(lambda i: stats_cache._write(path, np.zeros(200_000)), range(32)))
+    assert len(set(sizes)) == 1
+    assert stats_cache._read(path)[1].shape == (200_000,)
@@ -0,0 +1,96 @@
+import numpy as np
+import pandas as pd
+import pytest
+from scipy import stats
+
+from streaming_tableone import Moments, QuantileSketch, StreamingTableOne, kruskal_weighted
+
+SPEC = dict(columns=['age', 'baseline_hemoglobin', 'los_icu_days', 'sofa_score', 'gender', 'insurance', 'sepsis'],
+            categorical=['gender', 'insurance', 'sepsis'], nonnormal=['los_icu_days', 'sofa_score'],
+            groupby='timing')
+
+
+@pytest.fixture(scope='module')
+def data(cohort):
+    return cohort.assign(timing=cohort['early_transfusion'].map({1: 'Early', 0: 'Late'}))
+
+
+def chunks(df, size):
+    return [df.iloc[i:i + size] for i in range(0, len(df), size)]
+
+
+def test_matches_tableone(data):
+    tableone = pytest.importorskip('tableone')
+    expected = tableone.TableOne(data.copy(), pval=True, missing=False, overall=True, **SPEC).tableone
+    # Built from merged partial tables of 300-row chunks
+    table = StreamingTableOne(**SPEC)
+    for chunk in chunks(data, 300):
+        table.merge(StreamingTableOne(**SPEC).update(chunk))
+    assert table.tableone.index.equals(expected.index)
+    np.testing.assert_array_equal(table.tableone.to_numpy(), expected.astype(str).to_numpy())
+
+
+def test_moments_match_numpy(data):
+    x = data[['age', 'baseline_hemoglobin']].to_numpy(dtype=float)
+    moments = Moments(2)
+    for part in np.array_split(x, 7):
+        moments.update(part)
+    np.testing.assert_allclose(moments.mean, np.nanmean(x, axis=0))
+    np.testing.assert_allclose(moments.std, np.nanstd(x, axis=0, ddof=1))
+
+    removed = Moments(2)
+    removed.update(x[:500])
+    moments.subtract(removed)
+    np.testing.assert_allclose(moments.mean, np.nanmean(x[500:], axis=0))
+    np.testing.assert_allclose(moments.std, np.nanstd(x[500:], axis=0, ddof=1))
+
+
+def test_sketch_quantiles(data):
+    values = data['los_icu_days'].dropna().to_numpy()
+    q = [0.05, 0.25, 0.5, 0.75, 0.95]
+    exact = QuantileSketch(k=4096)
+    exact.update(values)
+    np.testing.assert_allclose(exact.quantile(q), pd.Series(values).quantile(q).to_numpy())
+
+    # Compacted sketches (merged from chunks): rank error of a few percent
+    sketch = QuantileSketch(k=128)
+    for part in np.array_split(values, 9):
+        partial = QuantileSketch(k=128)
+        partial.update(part)
+        sketch.merge(partial)
+    ranks = np.searchsorted(np.sort(values), sketch.quantile(q)) / len(values)
+    np.testing.assert_allclose(ranks, q, atol=0.03)
+
+
+def test_retract(data):
+    values = data['los_icu_days'].dropna().to_numpy()
+    q = [0.25, 0.5, 0.75]
+    sketch = QuantileSketch(k=4096)
+    sketch.update(values)
+    sketch.retract(values[:600])
+    np.testing.assert_allclose(sketch.quantile(q), pd.Series(values[600:]).quantile(q).to_numpy())
+
+    # Retracting whole chunks gives the table of the remaining rows
+    table = StreamingTableOne(**SPEC).update(data)
+    table.retract(data.iloc[:700])
+    expected = StreamingTableOne(**SPEC).update(data.iloc[700:])
+    assert table.tableone.equals(expected.tableone)
+
+
+def test_kruskal_unit_weights_match_scipy(data):
+    samples = [g['sofa_score'].dropna().to_numpy(dtype=float) for _, g in data.groupby('insurance')]
+    h, p = kruskal_weighted([(s, np.ones(len(s))) for s in samples])
+    expected = stats.kruskal(*samples)
+    assert h == pytest.approx(expected.statistic)
+    assert p == pytest.approx(expected.pvalue)
+
+
+def test_from_csv_matches_frame(data, tmp_path):
+    spec = dict(SPEC, columns=SPEC['columns'] + ['primary_icd_code'],
+                categorical=SPEC['categorical'] + ['primary_icd_code'])
+    path = str(tmp_path / 'cohort.csv')
+    # ICD-9 codes first: the first chunks only have all-digit codes
+    data.sort_values('primary_icd_code').to_csv(path, index=False)
+    table = StreamingTableOne.from_csv(path, chunksize=250, **spec)
+    assert table.tableone.equals(StreamingTableOne(**spec).update(data).tableone)
+    assert ('primary_icd_code, n (%)', '0389') in table.tableone.index
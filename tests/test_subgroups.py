@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+import pytest
+from scipy import stats
+
+from group_stats import compare_groups
+from subgroups import OVERALL, compare_subgroups
+
+CONTINUOUS = ['age', 'baseline_hemoglobin', 'los_icu_days', 'sofa_score']
+NONNORMAL = ['los_icu_days', 'sofa_score']
+CATEGORICAL = ['gender', 'sepsis']
+BY = ['insurance', 'gender']
+GROUPS = [1, 0]
+LABELS = {1: 'Early', 0: 'Late'}
+
+
+@pytest.fixture(scope='module')
+def table(cohort):
+    return compare_subgroups(cohort, 'early_transfusion', BY, continuous=CONTINUOUS, categorical=CATEGORICAL,
+                             nonnormal=NONNORMAL, groups=GROUPS, labels=LABELS, max_workers=2)
+
+
+def _subgroups(cohort):
+    yield OVERALL, 'All', cohort
+    for col in BY:
+        for level, sub in cohort.groupby(col):
+            yield col, level, sub
+
+
+def test_matches_compare_groups(cohort, table):
+    columns = [c for c in table.columns if c not in ('stratifier', 'subgroup', 'variable', 'level', 'type', 'test')]
+    for stratifier, level, sub in _subgroups(cohort):
+        expected = compare_groups(sub, 'early_transfusion', continuous=CONTINUOUS, categorical=CATEGORICAL,
+                                  nonnormal=NONNORMAL, groups=GROUPS, labels=LABELS)
+        result = table[(table['stratifier'] == stratifier) & (table['subgroup'] == level)]
+        result = result.set_index(['variable', 'level'])[columns]
+        # Levels absent from a subgroup are kept there, with zero counts
+        empty = result.index.difference(expected.index)
+        assert (result.loc[empty, ['count_Early', 'count_Late']] == 0).all().all()
+        result, expected = result.drop(empty), expected.loc[result.index.drop(empty), columns]
+        np.testing.assert_allclose(result.to_numpy(dtype=float), expected.to_numpy(dtype=float),
+                                   rtol=1e-9, err_msg=f"{stratifier} = {level}")
+
+
+@pytest.mark.parametrize('col', NONNORMAL)
+def test_mannwhitney_matches_scipy(cohort, table, col):
+    for level, sub in cohort.groupby('insurance'):
+        a, b = [sub.loc[sub['early_transfusion'] == g, col].dropna() for g in GROUPS]
+        expected = stats.mannwhitneyu(a, b, use_continuity=True, alternative='two-sided', method='asymptotic')
+        row = table[(table['stratifier'] == 'insurance') & (table['subgroup'] == level)
+                    & (table['variable'] == col)].iloc[0]
+        assert row['statistic'] == pytest.approx(expected.statistic, rel=1e-12)
+        assert row['p_value'] == pytest.approx(expected.pvalue, rel=1e-9)
+
+
+def test_serial_matches_parallel(cohort, table):
+    serial = compare_subgroups(cohort, 'early_transfusion', BY, continuous=CONTINUOUS, categorical=CATEGORICAL,
+                               nonnormal=NONNORMAL, groups=GROUPS, labels=LABELS, max_workers=1)
+    pd.testing.assert_frame_equal(serial, table)
@@ -0,0 +1,61 @@
+import importlib
+import json
+import os
+import sys
+
+from streaming_tableone import StreamingTableOne
+from tableone_shards import spec_hash, summarize_shards
+
+SPEC = dict(columns=['age', 'los_icu_days', 'gender'], categorical=['gender'], nonnormal=['los_icu_days'],
+            groupby='early_transfusion')
+
+
+def add_flag(df):
+    df['early_transfusion'] = df['early_transfusion'].map({1: 'Early', 0: 'Late'})
+    return df
+
+
+def add_flag_renamed(df):
+    df['early_transfusion'] = df['early_transfusion'].map({1: 'Early (<=6h)', 0: 'Late (>6h)'})
+    return df
+
+
+def test_spec_hash_follows_prepare_source():
+    assert spec_hash(SPEC, add_flag) == spec_hash(SPEC, add_flag)
+    assert spec_hash(SPEC, add_flag) != spec_hash(SPEC, add_flag_renamed)
+
+
+def test_spec_hash_follows_modules_prepare_uses(tmp_path, monkeypatch):
+    (tmp_path / 'shard_prepare.py').write_text(
+        "from shard_labels import LABELS\n\n\n"
+        "def prepare(df):\n    df['early_transfusion'] = df['early_transfusion'].map(LABELS)\n    return df\n")
+    (tmp_path / 'shard_labels.py').write_text("LABELS = {1: 'Early', 0: 'Late'}\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.delitem(sys.modules, 'shard_prepare', raising=False)
+    before = spec_hash(SPEC, importlib.import_module('shard_prepare').prepare)
+    # Only the keyword table the prepare step delegates to changes
+    (tmp_path / 'shard_labels.py').write_text("LABELS = {1: 'Early (<=6h)', 0: 'Late (>6h)'}\n")
+    assert spec_hash(SPEC, sys.modules['shard_prepare'].prepare) != before
+    for name in ['shard_prepare', 'shard_labels']:
+        sys.modules.pop(name, None)
+
+
+def test_shards_merge_and_cache(cohort, tmp_path):
+    paths = []
+    for i, shard in enumerate([cohort.iloc[:700], cohort.iloc[700:1300], cohort.iloc[1300:]]):
+        paths.append(str(tmp_path / f"site{i}.csv"))
+        shard.to_csv(paths[-1], index=False)
+    cache_dir = str(tmp_path / 'partials')
+
+    merged, _, stale = summarize_shards(paths, SPEC, prepare=add_flag, cache_dir=cache_dir, max_workers=2)
+    assert len(stale) == 3
+    # Shard hashes are persisted next to the partials
+    with open(os.path.join(cache_dir, 'hashes.json')) as f:
+        assert set(json.load(f)) == {os.path.abspath(p) for p in paths}
+
+    whole = StreamingTableOne(**SPEC)
+    whole.update(add_flag(cohort.copy()))
+    assert merged.tableone.equals(whole.tableone)
+
+    again, _, stale = summarize_shards(paths, SPEC, prepare=add_flag, cache_dir=cache_dir)
+    assert stale == [] and again.tableone.equals(merged.tableone)
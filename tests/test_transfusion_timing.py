@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+import pytest
+from scipy import stats
+
+from transfusion_timing import TimingIndex, cutoff_sweep
+
+TIME = 'time_to_first_transfusion_hours'
+CUTOFFS = [1.0, 2.5, 6.0, 12.0, 24.0, 48.0]
+
+
+@pytest.fixture(scope='module', params=['complete', 'missing'])
+def data(request, cohort):
+    if request.param == 'complete':
+        return cohort
+    # Missing times, outcomes and LOS at different rows
+    data = cohort.copy()
+    data.loc[data.index[::7], TIME] = np.nan
+    data.loc[data.index[::11], 'in_hospital_mortality'] = np.nan
+    data.loc[data.index[::13], 'los_icu_days'] = np.nan
+    return data
+
+
+@pytest.fixture(scope='module')
+def sweep(data):
+    return cutoff_sweep(data, CUTOFFS, continuous=['los_icu_days'])
+
+
+def _split(data, cutoff, col):
+    times = data[TIME]
+    known = times.notna() & data[col].notna()
+    early = known & (times <= cutoff)
+    return data.loc[early, col], data.loc[known & ~early, col]
+
+
+@pytest.mark.parametrize('cutoff', CUTOFFS)
+def test_mortality_matches_scipy(data, sweep, cutoff):
+    early, late = _split(data, cutoff, 'in_hospital_mortality')
+    table = np.array([[early.sum(), len(early) - early.sum()], [late.sum(), len(late) - late.sum()]])
+    chi2, p, _, _ = stats.chi2_contingency(table)
+    row = sweep.loc[cutoff]
+    assert row['n_early'] == (data[TIME] <= cutoff).sum()
+    assert row['mortality_early'] == pytest.approx(early.mean() * 100, rel=1e-12)
+    assert row['mortality_chi2'] == pytest.approx(chi2, rel=1e-9)
+    assert row['mortality_p_value'] == pytest.approx(p, rel=1e-9)
+
+
+@pytest.mark.parametrize('cutoff', CUTOFFS)
+def test_los_matches_scipy(data, sweep, cutoff):
+    early, late = _split(data, cutoff, 'los_icu_days')
+    expected = stats.mannwhitneyu(early, late, use_continuity=True, alternative='two-sided', method='asymptotic')
+    row = sweep.loc[cutoff]
+    assert row['los_icu_days_u'] == pytest.approx(expected.statistic, rel=1e-12)
+    assert row['los_icu_days_p_value'] == pytest.approx(expected.pvalue, rel=1e-9)
+    assert row['los_icu_days_mean_late'] == pytest.approx(late.mean(), rel=1e-12)
+
+
+def test_share_within_is_ecdf(data):
+    hours = np.array([0.0, 0.5, 3.0, 6.0, 6.5, 24.0, 1000.0])
+    index = TimingIndex(data[TIME], data['gender'])
+    times = data[TIME].dropna()
+    np.testing.assert_allclose(index.share_within(hours), stats.ecdf(times).cdf.evaluate(hours))
+    for group, sub in data.groupby('gender'):
+        expected = [(sub[TIME].dropna() <= h).mean() for h in hours]
+        np.testing.assert_allclose(index.share_within(hours, group), expected)
+    table = index.table(hours)
+    assert list(table.columns) == ['All'] + sorted(data['gender'].unique())
+    pd.testing.assert_series_equal(table['All'], pd.Series(index.share_within(hours) * 100, index=table.index,
+                                                           name='All'))